@@ -0,0 +1,2 @@
+"""Benchmarks for the users service."""
+# services/users/benchmarks/__init__.py
@@ -0,0 +1,104 @@
+"""Measure JSON encoders and response compression on a large listing.
+
+Run from services/users with:
+
+    python -m benchmarks.encoding --rows 100000
+"""
+# services/users/benchmarks/encoding.py
+
+import argparse
+import json
+import time
+
+from flask import json as flask_json
+
+from benchmarks.serialization import seed
+from project import compression, create_app, db
+from project.api.models import User
+from project.encoding import BACKENDS, FastJSONEncoder, load_backend
+
+
+def best_cpu(func, repeat):
+    """Return the best CPU seconds of func over a number of runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        func()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def encoders():
+    """Yield (name, encoder class) for the stdlib and installed backends."""
+    yield 'stdlib', FastJSONEncoder
+    for name in BACKENDS:
+        try:
+            backend = load_backend(name)
+        except ImportError:
+            continue
+        yield name, type('Encoder', (FastJSONEncoder,), {
+            'backend': staticmethod(backend)})
+
+
+def bench_encoders(repeat):
+    """Print the cost of encoding the listing as dicts with each encoder."""
+    data = {
+        'status': 'success',
+        'data': {'users': [user.to_json() for user in User.query.all()]}
+    }
+    print('{:<16}{:>14}{:>12}'.format('encoder', 'bytes', 'cpu ms'))
+    for name, encoder in encoders():
+        body = flask_json.dumps(data, cls=encoder, separators=(',', ':'))
+        assert json.loads(body) == json.loads(flask_json.dumps(data))
+        cpu = best_cpu(lambda: flask_json.dumps(
+            data, cls=encoder, separators=(',', ':')), repeat)
+        print('{:<16}{:>14,}{:>12.1f}'.format(
+            name, len(body.encode('utf-8')), cpu * 1000))
+
+
+def bench_compression(client, repeat):
+    """Print the size and CPU cost of GET /users in each encoding."""
+    encodings = ['identity', 'gzip']
+    if compression.brotli is not None:
+        encodings.append('br')
+    print('{:<16}{:>14}{:>12}'.format('encoding', 'bytes', 'cpu ms'))
+    for encoding in encodings:
+        headers = {'Accept-Encoding': encoding}
+        response = client.get('/users', headers=headers)
+        assert response.headers.get('Content-Encoding', 'identity') == \
+            encoding
+        cpu = best_cpu(lambda: client.get('/users', headers=headers), repeat)
+        print('{:<16}{:>14,}{:>12.1f}'.format(
+            encoding, len(response.data), cpu * 1000))
+
+
+def main():
+    """Seed the database and run both comparisons."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database', default='sqlite://')
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config.from_object('project.config.TestingConfig')
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    # Measure every request in full rather than from the response cache
+    app.config['RESPONSE_CACHE_BACKEND'] = 'null'
+    from project.api.cache import response_cache
+    response_cache.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.rows)
+        print('rows: {:,}\n'.format(args.rows))
+        bench_encoders(args.repeat)
+        print()
+        bench_compression(app.test_client(), args.repeat)
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
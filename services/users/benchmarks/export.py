@@ -0,0 +1,79 @@
+"""Show that the user export streams in flat memory as the table grows.
+
+Run from services/users with:
+
+    python -m benchmarks.export --rows 10000,100000,1000000
+"""
+# services/users/benchmarks/export.py
+
+import argparse
+import time
+import tracemalloc
+
+from project import create_app, db
+from project.api import export
+from project.api.models import User
+
+
+def seed_more(start, stop, chunk=50000):
+    """Insert synthetic users numbered start to stop, a chunk at a time."""
+    for first in range(start, stop, chunk):
+        db.session.execute(User.__table__.insert(), [
+            {
+                'username': 'user{}'.format(i),
+                'email': 'user{}@example.com'.format(i),
+                'password': '$2b$04$' + 'x' * 53,
+                'active': True,
+                'admin': i % 50 == 0,
+            }
+            for i in range(first, min(first + chunk, stop))
+        ])
+        db.session.commit()
+
+
+def measure(fmt, compress):
+    """Return (bytes, seconds, peak traced bytes) of one full export."""
+    size = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    for chunk in export.export_users(fmt, compress=compress):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main():
+    """Grow the table and export it at each size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='10000,100000,1000000',
+                        help='Comma-separated table sizes.')
+    parser.add_argument('--database', default='sqlite:////tmp/export.db')
+    args = parser.parse_args()
+    sizes = sorted(int(rows) for rows in args.rows.split(','))
+
+    app = create_app()
+    app.config.from_object('project.config.TestingConfig')
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print('{:>10}  {:<12}{:>14}{:>10}{:>12}'.format(
+            'rows', 'format', 'bytes', 'seconds', 'peak KiB'))
+        seeded = 0
+        for rows in sizes:
+            seed_more(seeded, rows)
+            seeded = rows
+            for fmt, compress in (('csv', False), ('ndjson', False),
+                                  ('ndjson', True)):
+                size, elapsed, peak = measure(fmt, compress)
+                print('{:>10,}  {:<12}{:>14,}{:>10.2f}{:>12,}'.format(
+                    rows, fmt + ('.gz' if compress else ''), size, elapsed,
+                    peak // 1024))
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
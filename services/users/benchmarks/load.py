@@ -0,0 +1,157 @@
+"""Load benchmark for the users endpoints, run by `manage.py bench`.
+
+Seeds a dataset, then drives each endpoint at a fixed concurrency
+through the full WSGI application and reports throughput and latency.
+Results can be written as JSON and compared against a stored baseline.
+"""
+# services/users/benchmarks/load.py
+
+import json
+import random
+import threading
+import time
+
+from project import db
+from project.api import queries
+from project.api.passwords import hash_password
+from project.api.principals import principals
+
+from benchmarks.stats import HEADER, format_row, summarize
+
+BENCH_PASSWORD = 'benchmark-password'
+
+
+def seed(users, batch_size=1000):
+    """Recreate the schema and insert a synthetic dataset.
+
+    Every user shares one password hash so seeding does not pay for
+    bcrypt once per row. Returns the ids of the seeded users.
+    """
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    principals.clear()
+    pw_hash = hash_password(BENCH_PASSWORD)
+    ids = []
+    for start in range(0, users, batch_size):
+        rows = [
+            {
+                'username': 'bench{}'.format(i),
+                'email': 'bench{}@example.com'.format(i),
+                'password': pw_hash
+            }
+            for i in range(start, min(users, start + batch_size))
+        ]
+        ids.extend(queries.insert_users(rows))
+        db.session.commit()
+    db.session.remove()
+    return ids
+
+
+def login_body(index):
+    """Return the JSON body that logs in a seeded user."""
+    return json.dumps({
+        'email': 'bench{}@example.com'.format(index),
+        'password': BENCH_PASSWORD
+    })
+
+
+def get_token(client):
+    """Log in as the first seeded user and return an auth header."""
+    response = client.post(
+        '/auth/login', data=login_body(0), content_type='application/json')
+    token = json.loads(response.data.decode())['auth_token']
+    return {'Authorization': 'Bearer {token}'.format(token=token)}
+
+
+def make_endpoints(ids, headers):
+    """Map endpoint names to functions that issue one request."""
+    return {
+        'GET /users': lambda client: client.get('/users'),
+        'GET /users/<id>': lambda client: client.get(
+            '/users/{}'.format(random.choice(ids))),
+        'POST /auth/login': lambda client: client.post(
+            '/auth/login', data=login_body(random.randrange(len(ids))),
+            content_type='application/json'),
+        'GET /auth/status': lambda client: client.get(
+            '/auth/status', headers=headers),
+    }
+
+
+def drive(app, request, concurrency, duration):
+    """Issue requests from concurrent threads for a fixed duration."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        client = app.test_client()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = request(client)
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                failed += 1
+            else:
+                local.append(elapsed)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - start, errors[0])
+
+
+def run(app, users=1000, concurrency=8, duration=5.0, endpoints=None):
+    """Seed the database and benchmark the selected endpoints."""
+    with app.app_context():
+        ids = seed(users)
+        headers = get_token(app.test_client())
+    available = make_endpoints(ids, headers)
+    results = {}
+    for name in endpoints or available:
+        results[name] = drive(app, available[name], concurrency, duration)
+    return {
+        'meta': {
+            'database': app.config.get('SQLALCHEMY_DATABASE_URI').split(
+                ':')[0],
+            'users': users,
+            'concurrency': concurrency,
+            'duration': duration,
+            'bcrypt_log_rounds': app.config.get('BCRYPT_LOG_ROUNDS'),
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance=0.1):
+    """List regressions of report against a baseline report.
+
+    An endpoint regresses when its throughput drops, or its p95 latency
+    rises, by more than the tolerance.
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        if result['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append('{name}: {rps:.1f} req/s < {base:.1f}'.format(
+                name=name, rps=result['rps'], base=base['rps']))
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append('{name}: p95 {p95:.2f} ms > {base:.2f}'.format(
+                name=name, p95=result['p95_ms'], base=base['p95_ms']))
+    return regressions
+
+
+def print_report(report):
+    """Print a report as a table."""
+    print(HEADER)
+    for name, result in report['results'].items():
+        print(format_row(name, result))
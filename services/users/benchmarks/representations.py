@@ -0,0 +1,70 @@
+"""Compare JSON and MessagePack responses for the listing endpoints.
+
+Run from services/users with:
+
+    python -m benchmarks.representations --rows 100000
+"""
+# services/users/benchmarks/representations.py
+
+import argparse
+import gzip
+import json
+
+from benchmarks.encoding import best_cpu
+from benchmarks.serialization import seed
+from project import create_app, db, negotiation
+
+FORMATS = (
+    ('json', 'application/json', json.loads),
+    ('msgpack', 'application/msgpack',
+     lambda body: negotiation.msgpack.unpackb(body, raw=False)),
+)
+
+
+def bench_listing(client, path, repeat):
+    """Print the server cost, size and client decode cost of each format."""
+    print(path)
+    print('{:<10}{:>14}{:>14}{:>12}{:>12}'.format(
+        'format', 'bytes', 'gzip bytes', 'server ms', 'decode ms'))
+    for name, mimetype, decode in FORMATS:
+        headers = {'Accept': mimetype}
+        response = client.get(path, headers=headers)
+        assert response.mimetype == mimetype
+        body = response.data
+        server = best_cpu(lambda: client.get(path, headers=headers), repeat)
+        client_cpu = best_cpu(lambda: decode(body), repeat)
+        print('{:<10}{:>14,}{:>14,}{:>12.1f}{:>12.1f}'.format(
+            name, len(body), len(gzip.compress(body, 6)), server * 1000,
+            client_cpu * 1000))
+
+
+def main():
+    """Seed the database and compare the formats on each listing."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database', default='sqlite://')
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config.from_object('project.config.TestingConfig')
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    # Measure every request in full rather than from the response cache
+    app.config['RESPONSE_CACHE_BACKEND'] = 'null'
+    from project.api.cache import response_cache
+    response_cache.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.rows)
+        print('rows: {:,}\n'.format(args.rows))
+        client = app.test_client()
+        bench_listing(client, '/users', args.repeat)
+        print()
+        bench_listing(client, '/users?limit=1000', args.repeat)
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compare the ORM to_json listing with the Core bulk serializer.
+
+Run from services/users with:
+
+    python -m benchmarks.serialization --rows 100000
+"""
+# services/users/benchmarks/serialization.py
+
+import argparse
+import json
+import time
+
+from project import create_app, db
+from project.api import queries
+from project.api.models import User
+from project.api.serializers import dump_envelope, dump_users
+
+
+def seed(rows):
+    """Insert synthetic users without paying for bcrypt."""
+    db.session.execute(User.__table__.insert(), [
+        {
+            'username': 'user{}'.format(i),
+            'email': 'user{}@example.com'.format(i),
+            'password': '$2b$04$' + 'x' * 53,
+            'active': True,
+            'admin': i % 50 == 0,
+        }
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def orm_listing():
+    """The original listing: hydrate User objects and build dicts."""
+    return json.dumps({
+        'status': 'success',
+        'data': {'users': [user.to_json() for user in User.query.all()]}
+    })
+
+
+def core_listing():
+    """The fast listing: Core tuples and a single bulk serializer."""
+    return dump_envelope(
+        '{{"users": {users}}}'.format(users=dump_users(queries.fetch_users())))
+
+
+def measure(func, rows, repeat):
+    """Return the best rows/sec over a number of runs."""
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return rows / best
+
+
+def main():
+    """Run the benchmark and print rows/sec for both paths."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database', default='sqlite://')
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config.from_object('project.config.TestingConfig')
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.rows)
+        assert json.loads(orm_listing()) == json.loads(core_listing())
+        orm = measure(orm_listing, args.rows, args.repeat)
+        core = measure(core_listing, args.rows, args.repeat)
+        print('rows:          {}'.format(args.rows))
+        print('orm to_json:   {:,.0f} rows/sec'.format(orm))
+        print('core + bulk:   {:,.0f} rows/sec'.format(core))
+        print('speedup:       {:.1f}x'.format(core / orm))
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
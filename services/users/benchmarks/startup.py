@@ -0,0 +1,86 @@
+"""Measure worker boot time and per-request overhead per entry point.
+
+Each entry point is imported in a fresh interpreter, as a gunicorn
+worker would, and then serves requests through the WSGI stack. Run
+from services/users with:
+
+    python -m benchmarks.startup --runs 5 --requests 2000
+"""
+# services/users/benchmarks/startup.py
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.stats import percentile
+
+# Runs in the child interpreter; prints one JSON line of timings
+CHILD = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+app = importlib.import_module(sys.argv[1]).app
+boot = time.perf_counter() - start
+modules = len(sys.modules)
+client = app.test_client()
+client.get(sys.argv[2])
+timings = []
+for _ in range(int(sys.argv[3])):
+    start = time.perf_counter()
+    client.get(sys.argv[2])
+    timings.append(time.perf_counter() - start)
+print(json.dumps({'boot': boot, 'modules': modules, 'requests': timings}))
+'''
+
+# name: (module, extra environment)
+ENTRY_POINTS = {
+    'wsgi': ('wsgi', {}),
+    'manage': ('manage', {}),
+    'manage+coverage': ('manage', {'FLASK_COVERAGE': '1'}),
+}
+
+
+def measure(module, env, url, requests):
+    """Boot an entry point in a new interpreter and time its requests."""
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD, module, url, str(requests)],
+        env=dict(os.environ, **env), cwd=os.getcwd())
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def main():
+    """Measure every entry point and print a summary table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--url', default='/users/ping')
+    parser.add_argument('--output', help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    results = {}
+    print('{:<18}{:>10}{:>10}{:>12}{:>12}'.format(
+        'entry point', 'modules', 'boot ms', 'p50 us', 'p99 us'))
+    for name, (module, env) in ENTRY_POINTS.items():
+        runs = [measure(module, env, args.url, args.requests)
+                for _ in range(args.runs)]
+        timings = sorted(t for run in runs for t in run['requests'])
+        results[name] = {
+            'modules': runs[0]['modules'],
+            'boot_seconds': statistics.median(run['boot'] for run in runs),
+            'p50_seconds': percentile(timings, 0.5),
+            'p99_seconds': percentile(timings, 0.99),
+        }
+        print('{:<18}{:>10}{:>10.0f}{:>12.0f}{:>12.0f}'.format(
+            name, results[name]['modules'],
+            results[name]['boot_seconds'] * 1e3,
+            results[name]['p50_seconds'] * 1e6,
+            results[name]['p99_seconds'] * 1e6))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
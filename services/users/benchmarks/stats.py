@@ -0,0 +1,37 @@
+"""Latency statistics shared by the benchmarks."""
+# services/users/benchmarks/stats.py
+
+import math
+
+
+def percentile(samples, fraction):
+    """Return the nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1,
+                max(0, int(math.ceil(fraction * len(samples))) - 1))
+    return samples[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Summarize request latencies (seconds) from one benchmark run."""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def format_row(name, result):
+    """Format one result as a table row."""
+    return '{:<28} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>7}'.format(
+        name, result['rps'], result['p50_ms'], result['p95_ms'],
+        result['p99_ms'], result['errors'])
+
+
+HEADER = '{:<28} {:>9} {:>9} {:>9} {:>9} {:>7}'.format(
+    'endpoint', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors')
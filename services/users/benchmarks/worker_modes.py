@@ -0,0 +1,163 @@
+"""Compare gunicorn worker models on the users endpoints.
+
+Starts gunicorn with gunicorn_conf.py once per worker mode, drives each
+endpoint over HTTP at a fixed concurrency and prints throughput and
+latency. Run from services/users against a seeded database:
+
+    DATABASE_URL=postgres://... python -m benchmarks.worker_modes \\
+        --modes sync,gthread,gevent --concurrency 32 --duration 10
+
+The response cache is off unless RESPONSE_CACHE_BACKEND is set, so each
+mode is measured doing the work rather than serving cache hits.
+"""
+# services/users/benchmarks/worker_modes.py
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.stats import HEADER, format_row, summarize
+from project.config import ProductionConfig
+
+ENDPOINTS = ('/users/ping', '/users', '/users/1', '/auth/status')
+
+
+class LocalConfig(ProductionConfig):
+    """Production settings for a host without Redis, and maybe on SQLite.
+
+    Each worker keeps its own logouts and rate limits, which none of the
+    benchmarked requests depend on. SQLite has no connection queue, so
+    the queue pool settings are left out.
+    """
+
+    SHARED_STORE_URL = 'memory://'
+    SHARED_STORE_REQUIRED = False
+    SQLALCHEMY_POOL_SIZE = None
+    SQLALCHEMY_MAX_OVERFLOW = None
+    SQLALCHEMY_POOL_TIMEOUT = None
+
+
+def free_port():
+    """Return a free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=30):
+    """Wait until the server answers."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError('Server did not start: {}'.format(url))
+
+
+def login(base, email, password):
+    """Log in and return an Authorization header."""
+    request = urllib.request.Request(
+        base + '/auth/login',
+        data=json.dumps({'email': email, 'password': password}).encode(),
+        headers={'Content-Type': 'application/json'}
+    )
+    token = json.loads(urllib.request.urlopen(request).read())['auth_token']
+    return {'Authorization': 'Bearer {token}'.format(token=token)}
+
+
+def drive(url, headers, concurrency, duration):
+    """Request a URL from concurrent threads for a fixed duration."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                request = urllib.request.Request(url, headers=headers)
+                urllib.request.urlopen(request, timeout=30).read()
+                local.append(time.perf_counter() - start)
+            except (urllib.error.URLError, ConnectionError):
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - start, errors[0])
+
+
+def run_mode(mode, args):
+    """Start gunicorn in one worker mode and benchmark every endpoint."""
+    port = free_port()
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=mode,
+               GUNICORN_BIND='127.0.0.1:{}'.format(port),
+               APP_SETTINGS=args.settings)
+    env.setdefault('RESPONSE_CACHE_BACKEND', 'null')
+    if args.workers:
+        env['GUNICORN_WORKERS'] = str(args.workers)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_conf.py',
+         args.app], env=env, stderr=subprocess.DEVNULL)
+    base = 'http://127.0.0.1:{}'.format(port)
+    results = {}
+    try:
+        wait_for(base + '/users/ping')
+        headers = login(base, args.email, args.password)
+        for endpoint in ENDPOINTS:
+            results[endpoint] = drive(
+                base + endpoint, headers, args.concurrency, args.duration)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    return results
+
+
+def main():
+    """Benchmark each requested worker mode and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='sync,gthread,gevent')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--app', default='wsgi:app')
+    parser.add_argument(
+        '--settings', default='project.config.ProductionConfig',
+        help='APP_SETTINGS for the server; benchmarks.worker_modes.'
+             'LocalConfig runs without Redis.')
+    parser.add_argument('--email', default='ben@benmail.com')
+    parser.add_argument('--password', default='12345678')
+    parser.add_argument('--output', help='Write results as JSON here.')
+    args = parser.parse_args()
+
+    report = {}
+    for mode in args.modes.split(','):
+        report[mode] = run_mode(mode, args)
+        print('\n[{mode}]'.format(mode=mode))
+        print(HEADER)
+        for endpoint, result in report[mode].items():
+            print(format_row(endpoint, result))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,4 +8,9 @@ done
 
 echo "PostgresSQL started"
 
-gunicorn -b 0.0.0.0:5000 manage:app
+# shared directory for metrics from every gunicorn worker
+export prometheus_multiproc_dir=${prometheus_multiproc_dir:-/tmp/prometheus}
+rm -rf "$prometheus_multiproc_dir"
+mkdir -p "$prometheus_multiproc_dir"
+
+gunicorn -c gunicorn_conf.py wsgi:app
@@ -0,0 +1,31 @@
+"""Gunicorn settings for the production users service."""
+# services/users/gunicorn_conf.py
+
+import os
+
+from project.config import ProductionConfig
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = ProductionConfig.GUNICORN_WORKER_CLASS
+workers = ProductionConfig.GUNICORN_WORKERS
+threads = ProductionConfig.GUNICORN_THREADS
+worker_connections = ProductionConfig.GUNICORN_WORKER_CONNECTIONS
+keepalive = ProductionConfig.GUNICORN_KEEPALIVE
+timeout = ProductionConfig.GUNICORN_TIMEOUT
+graceful_timeout = ProductionConfig.GUNICORN_GRACEFUL_TIMEOUT
+
+
+def post_fork(server, worker):
+    """Make psycopg2 cooperative when running gevent workers."""
+    if worker_class == 'gevent' and (
+            ProductionConfig.SQLALCHEMY_DATABASE_URI or '').startswith(
+                'postgres'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live metrics from the multiprocess store."""
+    if 'prometheus_multiproc_dir' in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,26 +1,47 @@
 """Command line function to manage users."""
 # services/users/manage.py
+import json
+import os
+import sys
 import unittest
-import coverage
 
-from flask.cli import FlaskGroup
+# Coverage must start before the project is imported; `cov` re-runs
+# this script with FLASK_COVERAGE set rather than tracing every command
+COV = None
+if os.environ.get('FLASK_COVERAGE'):
+    import coverage
+    COV = coverage.coverage(
+        branch=True,
+        include='project/*',
+        omit=[
+            'project/tests/*',
+            'project/config.py'
+        ]
+    )
+    COV.start()
 
-from project import create_app, db
-from project.api.models import User
+import click  # noqa: E402
+from flask.cli import FlaskGroup  # noqa: E402
+from flask_migrate import Migrate  # noqa: E402
 
-app = create_app()
-cli = FlaskGroup(create_app=create_app)
+from project import create_app, db  # noqa: E402
+from project.api import bulk, export  # noqa: E402
+from project.api.cache import response_cache  # noqa: E402
+from project.api.passwords import PasswordPool, calibrate  # noqa: E402
+from project.api.principals import principals, revocations  # noqa: E402
 
-# Coverage
-cov_entity = coverage.coverage(
-    branch=True,
-    include='project/*',
-    omit=[
-        'project/tests/*',
-        'project/config.py'
-    ]
-)
-cov_entity.start()
+migrate = Migrate()
+
+
+def create_cli_app(script_info=None):
+    """Create the app with the extensions only the CLI needs."""
+    cli_app = create_app(script_info)
+    migrate.init_app(cli_app, db)
+    return cli_app
+
+
+app = create_cli_app()
+cli = FlaskGroup(create_app=create_cli_app)
 
 
 @cli.command()
@@ -29,46 +50,155 @@ def recreate_db():
     db.drop_all()
     db.create_all()
     db.session.commit()
+    principals.clear()
+    revocations.clear()
+    response_cache.clear()
 
 
 @cli.command()
 def seed_db():
     """Seed the database."""
-    db.session.add(User(
-        username='ben',
-        email='ben@benmail.com',
-        password='12345678'
-    ))
-    db.session.add(User(
-        username='jimbob',
-        email='jimbob@email.com',
-        password='herearesomerandomwords'
-    ))
-    db.session.commit()
+    records = [
+        {
+            'username': 'ben',
+            'email': 'ben@benmail.com',
+            'password': '12345678'
+        },
+        {
+            'username': 'jimbob',
+            'email': 'jimbob@email.com',
+            'password': 'herearesomerandomwords'
+        },
+    ]
+    for result in bulk.import_users(enumerate(records, 1)):
+        if result['status'] != 'created':
+            print(json.dumps(result))
+
+
+@cli.command('import-users')
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(bulk.FORMATS),
+              help='Input format; guessed from the file name if omitted.')
+@click.option('--batch-size', type=int, default=None,
+              help='Rows hashed and inserted per batch.')
+@click.option('--workers', type=int, default=os.cpu_count(),
+              help='Processes used to hash passwords.')
+def import_users(source, fmt, batch_size, workers):
+    """Import users from an NDJSON or CSV file, or - for stdin."""
+    fmt = fmt or ('csv' if source.name.endswith('.csv') else 'ndjson')
+    pool = PasswordPool(size=workers)
+    summary = {'created': 0, 'conflict': 0, 'invalid': 0}
+    try:
+        records = bulk.parse(source, fmt)
+        for result in bulk.import_users(records, batch_size, pool):
+            summary[result['status']] += 1
+            if result['status'] != 'created':
+                print(json.dumps(result))
+    finally:
+        pool.shutdown()
+    print('Created: {created}, conflicts: {conflict}, invalid: {invalid}'
+          .format(**summary))
+
+
+@cli.command('export-users')
+@click.argument('output', type=click.File('wb'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(export.FORMATS),
+              help='Output format; guessed from the file name if omitted.')
+@click.option('--gzip', 'compress', is_flag=True, default=None,
+              help='Gzip the output; the default for names ending in .gz.')
+@click.option('--batch-size', type=int, default=None,
+              help='Rows read from the database per batch.')
+def export_users(output, fmt, compress, batch_size):
+    """Export every user as CSV or NDJSON to a file, or - for stdout."""
+    name = output.name if isinstance(output.name, str) else ''
+    if compress is None:
+        compress = name.endswith('.gz')
+    if name.endswith('.gz'):
+        name = name[:-3]
+    fmt = fmt or ('csv' if name.endswith('.csv') else 'ndjson')
+    for chunk in export.export_users(fmt, batch_size, compress):
+        output.write(chunk if compress else chunk.encode('utf-8'))
+
+
+@cli.command('calibrate-bcrypt')
+@click.option('--target', default=0.25,
+              help='Longest acceptable verify time, in seconds.')
+@click.option('--max-rounds', default=20, help='Highest cost to try.')
+def calibrate_bcrypt(target, max_rounds):
+    """Pick the bcrypt cost that verifies within a target on this host."""
+    rounds, timings = calibrate(target, max_rounds=max_rounds)
+    for cost, seconds in sorted(timings.items()):
+        print('{:>2} rounds: {:8.1f} ms'.format(cost, seconds * 1000))
+    print('BCRYPT_LOG_ROUNDS={}'.format(rounds))
 
 
 @cli.command()
-def test():
+@click.option('--users', default=1000, help='Number of users to seed.')
+@click.option('--concurrency', default=8, help='Concurrent clients.')
+@click.option('--duration', default=5.0, help='Seconds per endpoint.')
+@click.option('--endpoint', 'endpoints', multiple=True,
+              help='Endpoint to run, e.g. "GET /users"; default all.')
+@click.option('--database', default='sqlite:////tmp/users_bench.db',
+              help='Database URL. It is dropped and recreated!')
+@click.option('--output', type=click.Path(), help='Write JSON results.')
+@click.option('--baseline', type=click.File(),
+              help='JSON results to compare against.')
+@click.option('--tolerance', default=0.1,
+              help='Allowed fractional regression against the baseline.')
+def bench(users, concurrency, duration, endpoints, database, output,
+          baseline, tolerance):
+    """Benchmark the main endpoints through the WSGI stack."""
+    from benchmarks import load
+    bench_app = create_app()
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = database
+    # Every simulated client shares one address; measure the endpoints
+    bench_app.config['RATELIMIT_ENABLED'] = False
+    report = load.run(bench_app, users, concurrency, duration, endpoints)
+    load.print_report(report)
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+    if baseline:
+        regressions = load.compare(report, json.load(baseline), tolerance)
+        for regression in regressions:
+            print('REGRESSION {}'.format(regression))
+        if regressions:
+            sys.exit(1)
+
+
+@cli.command()
+@click.option('--workers', default=1,
+              help='Run the test modules in this many processes, each on '
+                   'its own copy of the test database.')
+def test(workers):
     """Runs the tests without code coverage."""
+    if workers > 1:
+        from project.config import TestingConfig
+        from project.tests import runner
+        success = runner.run(
+            TestingConfig.SQLALCHEMY_DATABASE_URI, workers, verbosity=2)
+        sys.exit(0 if success else 1)
     tests = unittest.TestLoader().discover('project/tests', pattern='test*.py')
     result = unittest.TextTestRunner(verbosity=2).run(tests)
-    if result.wasSuccessful():
-        return 0
-    return 1
+    # click ignores the return value, so the exit status must be explicit
+    sys.exit(0 if result.wasSuccessful() else 1)
 
 
 @cli.command()
 def cov():
     """Run the unit tests with coverage."""
+    if COV is None:
+        os.environ['FLASK_COVERAGE'] = '1'
+        os.execvp(sys.executable, [sys.executable] + sys.argv)
     tests = unittest.TestLoader().discover('project/tests')
     result = unittest.TextTestRunner(verbosity=2).run(tests)
     if result.wasSuccessful():
-        cov_entity.stop()
-        cov_entity.save()
+        COV.stop()
+        COV.save()
         print('Coverage Summary:')
-        cov_entity.report()
-        cov_entity.html_report()
-        cov_entity.erase()
+        COV.report()
+        COV.html_report()
+        COV.erase()
         return 0
     return 1
 
@@ -0,0 +1,35 @@
+"""create users table
+
+Revision ID: 6a1f0c2d9b3e
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1f0c2d9b3e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('username', sa.String(length=128), nullable=False),
+        sa.Column('email', sa.String(length=128), nullable=False),
+        sa.Column('password', sa.String(length=255), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=False),
+        sa.Column('admin', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username')
+    )
+
+
+def downgrade():
+    op.drop_table('users')
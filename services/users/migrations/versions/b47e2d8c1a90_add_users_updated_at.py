@@ -0,0 +1,31 @@
+"""add users updated_at
+
+Revision ID: b47e2d8c1a90
+Revises: 6a1f0c2d9b3e
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47e2d8c1a90'
+down_revision = '6a1f0c2d9b3e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'users',
+        sa.Column('updated_at', sa.DateTime(), nullable=False,
+                  server_default=sa.text("timezone('utc', now())"))
+    )
+    op.create_index(
+        op.f('ix_users_updated_at'), 'users', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_users_updated_at'), table_name='users')
+    op.drop_column('users', 'updated_at')
@@ -0,0 +1,34 @@
+"""add users search indexes
+
+Revision ID: c93a5e7f1b42
+Revises: b47e2d8c1a90
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c93a5e7f1b42'
+down_revision = 'b47e2d8c1a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE INDEX ix_users_username_lower '
+               'ON users (lower(username) text_pattern_ops)')
+    op.execute('CREATE INDEX ix_users_email_lower '
+               'ON users (lower(email) text_pattern_ops)')
+    op.execute('CREATE INDEX ix_users_username_trgm '
+               'ON users USING gin (lower(username) gin_trgm_ops)')
+    op.execute('CREATE INDEX ix_users_email_trgm '
+               'ON users USING gin (lower(email) gin_trgm_ops)')
+
+
+def downgrade():
+    op.drop_index('ix_users_email_trgm', table_name='users')
+    op.drop_index('ix_users_username_trgm', table_name='users')
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.drop_index('ix_users_username_lower', table_name='users')
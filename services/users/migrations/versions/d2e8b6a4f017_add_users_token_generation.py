@@ -0,0 +1,32 @@
+"""add users token_generation
+
+Revision ID: d2e8b6a4f017
+Revises: c93a5e7f1b42
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2e8b6a4f017'
+down_revision = 'c93a5e7f1b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'users',
+        sa.Column('token_generation', sa.Integer(), nullable=False,
+                  server_default='0')
+    )
+    op.create_index(
+        'ix_users_token_generation', 'users', ['token_generation'],
+        unique=False, postgresql_where=sa.text('token_generation > 0'))
+
+
+def downgrade():
+    op.drop_index('ix_users_token_generation', table_name='users')
+    op.drop_column('users', 'token_generation')
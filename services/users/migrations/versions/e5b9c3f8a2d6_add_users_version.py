@@ -0,0 +1,52 @@
+"""add users_version
+
+Revision ID: e5b9c3f8a2d6
+Revises: d2e8b6a4f017
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b9c3f8a2d6'
+down_revision = 'd2e8b6a4f017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users_version',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False,
+                  server_default=sa.text(
+                      "timezone('utc', clock_timestamp())")),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('INSERT INTO users_version (id, version) VALUES (1, 0)')
+    op.execute(
+        "CREATE OR REPLACE FUNCTION bump_users_version() RETURNS trigger "
+        "AS $$ "
+        "BEGIN "
+        "UPDATE users_version SET version = version + 1, "
+        "updated_at = timezone('utc', clock_timestamp()); "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql")
+    op.execute('CREATE TRIGGER users_version_bump '
+               'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON users '
+               'FOR EACH STATEMENT EXECUTE PROCEDURE bump_users_version()')
+    op.alter_column(
+        'users', 'updated_at',
+        server_default=sa.text("timezone('utc', clock_timestamp())"))
+
+
+def downgrade():
+    op.alter_column(
+        'users', 'updated_at',
+        server_default=sa.text("timezone('utc', now())"))
+    op.execute('DROP TRIGGER users_version_bump ON users')
+    op.execute('DROP FUNCTION bump_users_version()')
+    op.drop_table('users_version')
@@ -2,18 +2,13 @@
 # services/users/project/__init__.py
 import os
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_debugtoolbar import DebugToolbarExtension
 from flask_cors import CORS
-from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt
+
+from project.database import PooledSQLAlchemy
 
 
 # instantiate the db
-db = SQLAlchemy()
-toolbar = DebugToolbarExtension()
-migrate = Migrate()
-bcrypt = Bcrypt()
+db = PooledSQLAlchemy()
 
 
 def create_app(script_info=None):
@@ -28,11 +23,37 @@ def create_app(script_info=None):
     app_settings = os.getenv('APP_SETTINGS')
     app.config.from_object(app_settings)
 
+    # fast JSON encoding; compression is registered first so it runs last,
+    # after JSON bodies are re-encoded for MessagePack clients
+    from project import compression, encoding, negotiation
+    encoding.init_app(app)
+    compression.init_app(app)
+    negotiation.init_app(app)
+
     # set up extensions
     db.init_app(app)
-    toolbar.init_app(app)
-    migrate.init_app(app, db)
-    bcrypt.init_app(app)
+    # dev-only extensions are imported only when enabled
+    if app.config.get('DEBUG_TB_ENABLED'):
+        from flask_debugtoolbar import DebugToolbarExtension
+        DebugToolbarExtension(app)
+    from project.api.principals import principals, revocations
+    principals.init_app(app)
+    revocations.init_app(app)
+    from project.api.denylist import denylist
+    denylist.init_app(app)
+    from project.api import ratelimit
+    ratelimit.init_app(app)
+    from project.api.passwords import bulk_pool, password_pool
+    password_pool.init_app(app)
+    bulk_pool.init_app(app, 'BULK_PASSWORD_POOL')
+    from project.api.cache import response_cache
+    response_cache.init_app(app)
+    from project.api import replicas
+    replicas.init_app(app)
+
+    # collect metrics, served at /users/metrics
+    from project import metrics
+    metrics.init_app(app)
 
     # register blueprints
     from project.api.users import users_blueprint
@@ -1,17 +1,25 @@
 """Routes for authentication."""
 # services/users/project/api/auth.py
 
-from flask import Blueprint, jsonify, request
-from sqlalchemy import exc, or_
+from flask import Blueprint, g, jsonify, request
+from sqlalchemy import exc
 
+from project.api import queries
+from project.api.denylist import denylist
 from project.api.models import User
-from project import db, bcrypt
+from project import db
+from project.api.passwords import (
+    PoolSaturated, check_password, hash_password, needs_rehash
+)
+from project.api.ratelimit import rate_limited
+from project.api.replicas import read_only
 from project.api.utils import authenticate
 
 auth_blueprint = Blueprint('auth', __name__)
 
 
 @auth_blueprint.route('/auth/register', methods=['POST'])
+@rate_limited
 def register_user():
     """Register a user."""
     post_data = request.get_json()
@@ -25,35 +33,29 @@ def register_user():
     email = post_data.get('email')
     password = post_data.get('password')
     try:
-        # Check for existing user
-        user = User.query.filter(
-            or_(User.username == username, User.email == email)).first()
-        if not user:
-            new_user = User(
-                username=username,
-                email=email,
-                password=password
-            )
-            db.session.add(new_user)
+        user_id, conflict = queries.create_user(username, email, password)
+        if not conflict:
             db.session.commit()
             # Generate auth token
-            auth_token = new_user.encode_auth_token(new_user.id)
+            auth_token = User.encode_auth_token(user_id)
             response_object = {
                 'status': 'success',
                 'message': 'Successfully registered.',
                 'auth_token': auth_token.decode()
             }
-            return jsonify(response_object), 200
+            return jsonify(response_object), 201
         else:
             response_object['message'] = 'Sorry. That user already exists.'
+            response_object['field'] = conflict
             return jsonify(response_object), 400
     # Handle errors
-    except (exc.IntegrityError, ValueError) as e:
+    except (exc.IntegrityError, ValueError):
         db.session.rollback()
         return jsonify(response_object), 400
 
 
 @auth_blueprint.route('/auth/login', methods=['POST'])
+@rate_limited
 def login_user():
     """Login a user."""
     post_data = request.get_json()
@@ -68,8 +70,11 @@ def login_user():
     try:
         # Fetch user
         user = User.query.filter_by(email=email).first()
-        if user and bcrypt.check_password_hash(user.password, password):
-            auth_token = user.encode_auth_token(user.id)
+        if user and check_password(user.password, password):
+            if needs_rehash(user.password):
+                rehash_password(user, password)
+            auth_token = user.encode_auth_token(
+                user.id, user.admin, user.active, user.token_generation)
             if auth_token:
                 response_object = {
                     'status': 'success',
@@ -81,15 +86,32 @@ def login_user():
             response_object['message'] = 'User does not exist.'
             return jsonify(response_object), 404
     # Handle errors
+    except PoolSaturated:
+        raise
     except Exception as e:
         response_object['message'] = 'Try again.'
         return jsonify(response_object), 500
 
 
+def rehash_password(user, password):
+    """Store a password again with the configured bcrypt cost."""
+    # The old hash still verifies, so a failed rehash waits for the next
+    # login rather than failing this one
+    try:
+        user.password = hash_password(password)
+        db.session.commit()
+    except PoolSaturated:
+        pass
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+
+
 @auth_blueprint.route('/auth/logout', methods=['GET'])
 @authenticate
 def logout_user(resp):
     """Logout user."""
+    if 'jti' in g.token:
+        denylist.revoke(g.token['jti'], g.token['exp'])
     response_object = {
         'status': 'success',
         'message': 'Successfully logged out.'
@@ -99,6 +121,7 @@ def logout_user(resp):
 
 @auth_blueprint.route('/auth/status', methods=['GET'])
 @authenticate
+@read_only
 def get_user_status(resp):
     """Get user status."""
     user = User.query.filter_by(id=resp).first()
@@ -0,0 +1,139 @@
+"""Bulk import of users from NDJSON or CSV."""
+# services/users/project/api/bulk.py
+
+import csv
+import json
+from itertools import islice
+
+from flask import current_app
+
+from project import db
+from project.api import queries
+from project.api.passwords import bulk_pool
+
+FORMATS = ('ndjson', 'csv')
+MIMETYPES = {
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'text/csv': 'csv',
+}
+FIELDS = ('username', 'email', 'password')
+
+
+def _decode(lines):
+    """Decode lines read from a binary stream.
+
+    Bytes that are not UTF-8 are kept as surrogates, so the row they are
+    in is reported as invalid rather than failing the whole import.
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'surrogateescape')
+        yield line
+
+
+def parse_ndjson(lines):
+    """Yield (row number, record) for each non-blank NDJSON line."""
+    for number, line in enumerate(_decode(lines), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record
+
+
+def parse_csv(lines):
+    """Yield (row number, record) for each CSV row after the header."""
+    reader = csv.DictReader(_decode(lines))
+    for number, record in enumerate(reader, 1):
+        yield number, record
+
+
+def parse(lines, fmt):
+    """Parse records from lines in the given format."""
+    if fmt == 'csv':
+        return parse_csv(lines)
+    return parse_ndjson(lines)
+
+
+def validate(record):
+    """Return an error message for an invalid record, or None."""
+    if not isinstance(record, dict):
+        return 'Invalid record.'
+    for field in FIELDS:
+        if not record.get(field):
+            return 'Missing {field}.'.format(field=field)
+        if not isinstance(record[field], str):
+            return 'Invalid {field}.'.format(field=field)
+        try:
+            record[field].encode('utf-8')
+        except UnicodeEncodeError:
+            return 'Invalid {field}.'.format(field=field)
+    return None
+
+
+def import_batch(batch, pool):
+    """Hash and insert one batch of parsed records.
+
+    Returns a result dict for every record in the batch, in order.
+    """
+    results = {}
+    valid = []
+    for number, record in batch:
+        message = validate(record)
+        if message:
+            results[number] = {
+                'row': number, 'status': 'invalid', 'message': message}
+        else:
+            valid.append((number, record))
+    if valid:
+        hashes = pool.hash_many(
+            [record['password'] for _, record in valid],
+            current_app.config.get('BCRYPT_LOG_ROUNDS')
+        )
+        rows = [
+            {
+                'username': record['username'],
+                'email': record['email'],
+                'password': pw_hash
+            }
+            for (_, record), pw_hash in zip(valid, hashes)
+        ]
+        for (number, _), outcome in zip(valid, queries.insert_users(rows)):
+            if isinstance(outcome, int):
+                results[number] = {
+                    'row': number, 'status': 'created', 'id': outcome}
+            else:
+                results[number] = {
+                    'row': number, 'status': 'conflict', 'field': outcome}
+        db.session.commit()
+    return [results[number] for number, _ in batch]
+
+
+def import_users(records, batch_size=None, pool=None):
+    """Import parsed records in batches, yielding a result for each one.
+
+    Each batch is hashed in parallel by the bulk password pool and written
+    with a single INSERT, then committed, so memory use is bounded by the
+    batch size however long the input stream is.
+    """
+    batch_size = batch_size or current_app.config.get(
+        'USERS_IMPORT_BATCH_SIZE')
+    pool = pool or bulk_pool
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        for result in import_batch(batch, pool):
+            yield result
+
+
+def summarize(results):
+    """Count results by status."""
+    summary = {'created': 0, 'conflict': 0, 'invalid': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return summary
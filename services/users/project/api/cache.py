@@ -0,0 +1,155 @@
+"""Response cache for the user read endpoints."""
+# services/users/project/api/cache.py
+
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event
+
+from project.cache import get_store, make_backend
+from project.api.models import User
+from project.negotiation import wants_msgpack
+
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Link',
+                  'Cache-Control')
+
+
+class ResponseCache:
+    """Cache of rendered responses, invalidated by namespace generations.
+
+    Keys embed a generation counter per namespace ('users' for listings,
+    'user:<id>' for one user). Invalidating a namespace bumps its counter,
+    so stale entries are never read again and age out of the backend.
+    """
+
+    def __init__(self, backend=None, ttl=300):
+        """Initialize object."""
+        self.backend = backend
+        self.ttl = ttl
+
+    def init_app(self, app):
+        """Create the backend named by the app configuration."""
+        kind = app.config.get('RESPONSE_CACHE_BACKEND', 'lru')
+        self.backend = make_backend(
+            kind, get_store(app) if kind == 'shared' else None,
+            app.config.get('RESPONSE_CACHE_SIZE', 1024))
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+
+    @property
+    def enabled(self):
+        """Determine if a backend is configured."""
+        return self.backend is not None
+
+    def key(self, namespace, path):
+        """Build the cache key for a path in the current generation."""
+        generations = self.backend.get_many(
+            ['generation', 'generation:' + namespace])
+        return '{0}:{1}:{2}:{3}'.format(
+            generations[0] or 0, generations[1] or 0, namespace, path)
+
+    def get(self, key):
+        """Return a cached (body, status, headers) entry, or None."""
+        return self.backend.get(key)
+
+    def set(self, key, response, ttl=None):
+        """Cache a rendered response, for ttl seconds if given."""
+        headers = [(name, value) for name, value in response.headers
+                   if name in CACHED_HEADERS]
+        self.backend.set(
+            key, (response.get_data(), response.status_code, headers),
+            min(ttl, self.ttl) if ttl else self.ttl)
+
+    def invalidate(self, *namespaces):
+        """Invalidate every entry in the given namespaces."""
+        if self.enabled:
+            for namespace in namespaces:
+                self.backend.incr('generation:' + namespace)
+
+    def invalidate_users(self, user_ids=()):
+        """Invalidate the listings and the entries of the given users."""
+        self.invalidate('users', *(
+            'user:{0}'.format(user_id) for user_id in user_ids))
+
+    def clear(self):
+        """Invalidate every entry."""
+        if self.enabled:
+            self.backend.incr('generation')
+
+
+response_cache = ResponseCache()
+
+
+def cached(namespace):
+    """Serve a GET view from the response cache.
+
+    namespace is a string, or a function of the view arguments returning
+    one (or None to bypass the cache). Only complete 200 responses are
+    stored; those read from a replica, which may lag behind a write, only
+    for DATABASE_REPLICA_PIN_SECONDS. Conditional requests are answered
+    from the cached validators.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            name = namespace(**kwargs) if callable(namespace) else namespace
+            if (request.method != 'GET' or name is None or
+                    not response_cache.enabled):
+                return f(*args, **kwargs)
+            # MessagePack responses carry their own ETag, so cache apart
+            key = response_cache.key(name, '{0}{1}'.format(
+                request.full_path, ':msgpack' if wants_msgpack() else ''))
+            entry = response_cache.get(key)
+            if entry is not None:
+                body, status, headers = entry
+                response = current_app.response_class(
+                    body, status=status, headers=headers)
+                return response.make_conditional(request)
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                ttl = None
+                if g.get('replica_read'):
+                    ttl = current_app.config.get(
+                        'DATABASE_REPLICA_PIN_SECONDS')
+                response_cache.set(key, response, ttl)
+            return response
+        return decorated_function
+    return decorator
+
+
+def user_namespace(user_id):
+    """Return the cache namespace of a user given as a URL segment."""
+    try:
+        return 'user:{0}'.format(int(user_id))
+    except ValueError:
+        return None
+
+
+def mark_users_changed(session, user_ids=()):
+    """Record that users changed, to invalidate once the session commits."""
+    session.info.setdefault('changed_users', set()).update(user_ids)
+
+
+@event.listens_for(SignallingSession, 'after_flush')
+def _record_user_changes(session, flush_context):
+    """Collect the users written by an ORM flush."""
+    for instances in (session.new, session.dirty, session.deleted):
+        changed = [instance.id for instance in instances
+                   if isinstance(instance, User)]
+        if changed:
+            mark_users_changed(session, changed)
+
+
+@event.listens_for(SignallingSession, 'after_commit')
+def _invalidate_committed(session):
+    """Invalidate cached responses for users changed by the transaction."""
+    changed = session.info.get('changed_users')
+    if changed is not None:
+        response_cache.invalidate_users(changed)
+
+
+@event.listens_for(SignallingSession, 'after_transaction_end')
+def _forget_changes(session, transaction):
+    """Forget the recorded changes once the outermost transaction ends."""
+    if transaction.parent is None:
+        session.info.pop('changed_users', None)
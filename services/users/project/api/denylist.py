@@ -0,0 +1,184 @@
+"""Denylist of logged out tokens, checked without the database."""
+# services/users/project/api/denylist.py
+
+import hashlib
+import math
+import threading
+import time
+
+from flask import current_app
+
+from project.cache import get_store, require_shared_store
+
+
+class BloomFilter:
+    """Fixed-size set membership test with false positives but no misses."""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        """Initialize object."""
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(
+            self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        """Yield the bit positions of a key, by double hashing."""
+        digest = hashlib.sha256(key.encode('utf-8')).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:16], 'big') | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, key):
+        """Add a key."""
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        """Determine if a key may have been added."""
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key))
+
+
+class Denylist:
+    """Token ids (jti) revoked before their expiry, shared by all workers.
+
+    Each worker holds the revoked ids with their expiry times behind a
+    bloom filter, so checking a token that was never revoked costs a
+    few hashes. Revocations are appended to a numbered log in the shared
+    store; workers read the entries they have not seen at most every
+    sync_seconds. Entries are dropped once their token expires.
+
+    A log entry is written just after its number is taken, so a number
+    whose entry is missing is retried for pending_seconds before it is
+    taken to have expired. Every live revocation is also kept in a
+    sorted set by expiry, which a worker starting from nothing reads
+    instead of the whole log.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001, sync_seconds=1,
+                 prune_seconds=60, pending_seconds=10, timer=time.time):
+        """Initialize object."""
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_seconds = sync_seconds
+        self.prune_seconds = prune_seconds
+        self.pending_seconds = pending_seconds
+        self.timer = timer
+        self._lock = threading.Lock()
+        self.clear()
+
+    def init_app(self, app):
+        """Size the denylist from the app configuration."""
+        self.capacity = app.config.get(
+            'DENYLIST_BLOOM_CAPACITY', self.capacity)
+        self.error_rate = app.config.get(
+            'DENYLIST_BLOOM_ERROR_RATE', self.error_rate)
+        self.sync_seconds = app.config.get(
+            'DENYLIST_SYNC_SECONDS', self.sync_seconds)
+        self.prune_seconds = app.config.get(
+            'DENYLIST_PRUNE_SECONDS', self.prune_seconds)
+        if app.config.get('SHARED_STORE_REQUIRED'):
+            require_shared_store(app, 'The logout denylist')
+        self.clear()
+
+    def clear(self):
+        """Forget every revoked token known to this worker."""
+        with self._lock:
+            self._entries = {}
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+            self._seq = 0
+            self._pending = {}
+            self._next_sync = 0
+            self._next_prune = 0
+
+    def revoke(self, jti, exp):
+        """Deny a token id until its expiry time, in every worker."""
+        now = self.timer()
+        ttl = int(math.ceil(exp - now))
+        if ttl <= 0:
+            return
+        store = get_store(current_app)
+        entry = '{0} {1}'.format(jti, exp).encode()
+        # Added before the number is taken, so a worker that reads the
+        # live set after the counter sees every numbered entry
+        store.zadd('denylist:live', {entry: exp})
+        seq = store.incr('denylist:seq')
+        store.set('denylist:{0}'.format(seq), entry, ex=ttl)
+        store.zremrangebyscore('denylist:live', '-inf', now)
+        with self._lock:
+            self._add(jti, exp)
+
+    def is_revoked(self, jti):
+        """Determine if a token id was revoked."""
+        if jti is None:
+            return False
+        now = self.timer()
+        if now >= self._next_sync:
+            self.sync(now)
+        if jti not in self._bloom:
+            return False
+        exp = self._entries.get(jti)
+        return exp is not None and exp > now
+
+    def sync(self, now=None):
+        """Read revocations made by other workers from the shared store."""
+        now = self.timer() if now is None else now
+        store = get_store(current_app)
+        with self._lock:
+            self._next_sync = now + self.sync_seconds
+            latest = int(store.get('denylist:seq') or 0)
+            if self._seq == 0 and latest:
+                for value in store.zrangebyscore(
+                        'denylist:live', now, '+inf'):
+                    self._add_entry(value)
+                self._seq = latest
+            seqs = sorted(self._pending) + list(
+                range(self._seq + 1, latest + 1))
+            for start in range(0, len(seqs), 1000):
+                batch = seqs[start:start + 1000]
+                for seq, value in zip(batch, store.mget(
+                        ['denylist:{0}'.format(seq) for seq in batch])):
+                    if value is not None:
+                        self._pending.pop(seq, None)
+                        self._add_entry(value)
+                    # Not written yet, or gone with its expired token
+                    elif now - self._pending.setdefault(
+                            seq, now) >= self.pending_seconds:
+                        del self._pending[seq]
+            self._seq = max(self._seq, latest)
+            if now >= self._next_prune:
+                self._prune(now)
+
+    def _add_entry(self, value):
+        """Record a revoked token id read from the shared store."""
+        jti, exp = value.decode().split(' ')
+        self._add(jti, float(exp))
+
+    def _add(self, jti, exp):
+        """Record a revoked token id."""
+        self._entries[jti] = exp
+        self._bloom.add(jti)
+        if len(self._entries) > self._bloom.capacity:
+            self._prune(self.timer())
+
+    def _prune(self, now):
+        """Drop expired entries and rebuild the bloom filter to match."""
+        self._entries = {
+            jti: exp for jti, exp in self._entries.items() if exp > now}
+        self._bloom = BloomFilter(
+            max(self.capacity, 2 * len(self._entries)), self.error_rate)
+        for jti in self._entries:
+            self._bloom.add(jti)
+        self._next_prune = now + self.prune_seconds
+
+    def __len__(self):
+        """Return the number of revoked tokens held."""
+        return len(self._entries)
+
+
+denylist = Denylist()
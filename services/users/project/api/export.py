@@ -0,0 +1,76 @@
+"""Streaming export of the users table as CSV or NDJSON."""
+# services/users/project/api/export.py
+
+import csv
+import io
+import zlib
+
+from flask import current_app
+
+from project.api import queries
+from project.api.serializers import dump_user
+
+FORMATS = ('ndjson', 'csv')
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Every column but the password hash and the token generation
+EXPORT_COLUMNS = queries.PUBLIC_COLUMNS + ('updated_at',)
+
+
+def render_ndjson(batches, columns=EXPORT_COLUMNS):
+    """Yield one chunk of NDJSON lines per batch of rows."""
+    for rows in batches:
+        yield ''.join(dump_user(row, columns) + '\n' for row in rows)
+
+
+def render_csv(batches, columns=EXPORT_COLUMNS):
+    """Yield a CSV header, then one chunk of CSV lines per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(
+            [value.isoformat() if hasattr(value, 'isoformat') else value
+             for value in row]
+            for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+RENDERERS = {
+    'ndjson': render_ndjson,
+    'csv': render_csv,
+}
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip text chunks as they are produced, yielding compressed bytes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_users(fmt, batch_size=None, compress=False):
+    """Yield the users table in a format, a batch of rows at a time.
+
+    Rows come from a server-side cursor and each batch is written out
+    before the next is read, so memory use depends on the batch size and
+    not on the number of users. Yields text, or gzipped bytes when
+    compress is set.
+    """
+    batches = queries.stream_user_batches(
+        batch_size=batch_size or current_app.config.get(
+            'USERS_STREAM_BATCH_SIZE'),
+        columns=EXPORT_COLUMNS)
+    chunks = RENDERERS[fmt](batches)
+    if compress:
+        return gzip_chunks(chunks, current_app.config.get('COMPRESS_LEVEL'))
+    return chunks
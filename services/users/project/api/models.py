@@ -2,9 +2,48 @@
 # services/users/project/api/model.py
 
 import datetime
+import uuid
 import jwt
 from flask import current_app
-from project import db, bcrypt
+from sqlalchemy import DDL, event, inspect
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import DateTime
+from project import db
+from project.metrics import JWT_FAILURES
+from project.api.passwords import hash_password
+
+
+class utcnow(FunctionElement):
+    """The database's current time in UTC, as a naive timestamp."""
+
+    type = DateTime()
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    """Compile utcnow for databases that keep the time in UTC."""
+    return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+    """Compile utcnow for Postgres, whose clock carries a time zone.
+
+    clock_timestamp() is the time of the write itself; now() would be the
+    start of a transaction that may commit long after later writers.
+    """
+    return "timezone('utc', clock_timestamp())"
+
+
+@compiles(utcnow, 'sqlite')
+def _utcnow_sqlite(element, compiler, **kw):
+    """Compile utcnow for SQLite, whose CURRENT_TIMESTAMP is in seconds.
+
+    %f is seconds with milliseconds; the padding makes the fraction read
+    back as microseconds.
+    """
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
 
 
 # model
@@ -18,14 +57,26 @@ class User(db.Model):
     password = db.Column(db.String(255), nullable=False)
     active = db.Column(db.Boolean(), default=True, nullable=False)
     admin = db.Column(db.Boolean(), default=False, nullable=False)
+    # Set by the database, as in migration b47e2d8c1a90, so every writer
+    # shares one clock
+    updated_at = db.Column(
+        db.DateTime(), server_default=utcnow(), onupdate=utcnow(),
+        nullable=False, index=True)
+    # Bumped whenever active or admin change, revoking stateless tokens
+    token_generation = db.Column(
+        db.Integer(), default=0, server_default='0', nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_users_token_generation', 'token_generation',
+                 postgresql_where=db.text('token_generation > 0'),
+                 sqlite_where=db.text('token_generation > 0')),
+    )
 
     def __init__(self, username, email, password):
         """Initialize object."""
         self.username = username
         self.email = email
-        self.password = bcrypt.generate_password_hash(
-            password, current_app.config.get('BCRYPT_LOG_ROUNDS')
-        ).decode()
+        self.password = hash_password(password)
 
     def to_json(self):
         """Return object as json."""
@@ -37,8 +88,13 @@ class User(db.Model):
             'admin': self.admin
         }
 
-    def encode_auth_token(self, user_id):
-        """Generate the auth token."""
+    @staticmethod
+    def encode_auth_token(user_id, admin=False, active=True, generation=0):
+        """Generate the auth token.
+
+        With JWT_STATELESS_CLAIMS the token also carries the user's admin
+        and active flags and token generation.
+        """
         try:
             payload = {
                 'exp': datetime.datetime.utcnow() + datetime.timedelta(
@@ -46,8 +102,15 @@ class User(db.Model):
                     seconds=current_app.config.get('TOKEN_EXPIRATION_SECONDS')
                 ),
                 'iat': datetime.datetime.utcnow(),
-                'sub': user_id
+                'sub': user_id,
+                'jti': uuid.uuid4().hex
             }
+            if current_app.config.get('JWT_STATELESS_CLAIMS'):
+                payload.update({
+                    'adm': admin,
+                    'act': active,
+                    'gen': generation
+                })
             return jwt.encode(
                 payload,
                 current_app.config.get('SECRET_KEY'),
@@ -63,13 +126,100 @@ class User(db.Model):
 
         :param auth_token: - :return: integer|string
         """
+        payload = User.decode_auth_payload(auth_token)
+        if isinstance(payload, str):
+            return payload
+        return payload['sub']
+
+    @staticmethod
+    def decode_auth_payload(auth_token):
+        """
+        Decode an authentication token and return all of its claims.
+
+        :param auth_token: - :return: dict|string
+        """
         try:
-            payload = jwt.decode(
+            return jwt.decode(
                 auth_token,
                 current_app.config.get('SECRET_KEY')
             )
-            return payload['sub']
         except jwt.ExpiredSignatureError:
+            JWT_FAILURES.labels('expired').inc()
             return 'Signature expired. Please log in again.'
-        except jwt.InvalidTokenError:
+        except jwt.InvalidTokenError as e:
+            JWT_FAILURES.labels(type(e).__name__).inc()
             return 'Invalid token. Please log in again.'
+
+
+@event.listens_for(User, 'before_update')
+def _bump_token_generation(mapper, connection, target):
+    """Revoke stateless tokens when a user's active or admin flag changes."""
+    state = inspect(target)
+    if (state.attrs.active.history.has_changes() or
+            state.attrs.admin.history.has_changes()):
+        target.token_generation = (target.token_generation or 0) + 1
+
+
+# Search indexes: lower() for prefix matches and trigram for substrings.
+# Postgres only; mirrored by the matching migration.
+SEARCH_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX ix_users_username_lower '
+    'ON users (lower(username) text_pattern_ops)',
+    'CREATE INDEX ix_users_email_lower '
+    'ON users (lower(email) text_pattern_ops)',
+    'CREATE INDEX ix_users_username_trgm '
+    'ON users USING gin (lower(username) gin_trgm_ops)',
+    'CREATE INDEX ix_users_email_trgm '
+    'ON users USING gin (lower(email) gin_trgm_ops)',
+)
+
+for statement in SEARCH_INDEXES:
+    event.listen(User.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+
+
+# One row versioning the users collection. Triggers on users bump it in
+# the writing transaction, so a reader gets the version matching the rows
+# in its snapshot, on the primary or on a replica, from a single row.
+users_version = db.Table(
+    'users_version', db.metadata,
+    db.Column('id', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('version', db.BigInteger, nullable=False),
+    db.Column('updated_at', db.DateTime(), server_default=utcnow(),
+              nullable=False)
+)
+
+
+@event.listens_for(users_version, 'after_create')
+def _insert_users_version(target, connection, **kw):
+    """Create the version row."""
+    connection.execute(target.insert().values(id=1, version=0))
+
+
+# Postgres bumps the row once per statement; the row lock also orders the
+# timestamps of concurrent writers by commit. Mirrored by the migration.
+USERS_VERSION_TRIGGER = (
+    "CREATE OR REPLACE FUNCTION bump_users_version() RETURNS trigger AS $$ "
+    "BEGIN "
+    "UPDATE users_version SET version = version + 1, "
+    "updated_at = timezone('utc', clock_timestamp()); "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+    'CREATE TRIGGER users_version_bump '
+    'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON users '
+    'FOR EACH STATEMENT EXECUTE PROCEDURE bump_users_version()',
+)
+
+for statement in USERS_VERSION_TRIGGER:
+    event.listen(User.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+
+# SQLite only has row triggers; % is doubled for DDL's string formatting
+for operation in ('INSERT', 'UPDATE', 'DELETE'):
+    event.listen(User.__table__, 'after_create', DDL(
+        'CREATE TRIGGER users_version_{0} AFTER {1} ON users BEGIN '
+        'UPDATE users_version SET version = version + 1, '
+        "updated_at = strftime('%%Y-%%m-%%d %%H:%%M:%%f000', 'now'); "
+        'END'.format(operation.lower(), operation)
+    ).execute_if(dialect='sqlite'))
@@ -0,0 +1,285 @@
+"""Bounded process pool for bcrypt hashing and verification."""
+# services/users/project/api/passwords.py
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, wait
+
+import bcrypt
+from flask import current_app, jsonify
+
+from project.metrics import BCRYPT_LATENCY
+
+
+class PoolSaturated(Exception):
+    """Raised when too much password work is already queued."""
+
+
+def _hash(password, rounds):
+    """Hash a password; runs inside a pool process."""
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode()
+
+
+def _hash_chunk(passwords, rounds):
+    """Hash several passwords; runs inside a pool process."""
+    return [_hash(password, rounds) for password in passwords]
+
+
+def _check(pw_hash, password):
+    """Verify a password against a hash; runs inside a pool process."""
+    return bcrypt.checkpw(password, pw_hash)
+
+
+def _to_bytes(value):
+    """Encode a password or hash as bytes."""
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return value
+
+
+class PasswordPool:
+    """Run bcrypt work in a dedicated, bounded pool of processes.
+
+    Hashing is CPU bound and holds the GIL, so running it in the request
+    thread stalls every other request the worker is serving. The pool
+    moves that work to separate processes and caps how much of it may be
+    in flight; callers beyond the cap are rejected with PoolSaturated
+    rather than queueing behind it. A size of 0 runs the work inline.
+    """
+
+    def __init__(self, size=0, max_pending=32, timeout=10):
+        """Initialize object."""
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.configure(size, max_pending, timeout)
+
+    def init_app(self, app, prefix='PASSWORD_POOL'):
+        """Configure the pool from the app configuration."""
+        self.configure(
+            app.config.get(prefix + '_SIZE', 0),
+            app.config.get(prefix + '_MAX_PENDING', 32),
+            app.config.get(prefix + '_TIMEOUT', 10)
+        )
+        app.register_error_handler(PoolSaturated, handle_saturated)
+
+    def configure(self, size, max_pending, timeout):
+        """Resize the pool; the executor is recreated on next use."""
+        self.shutdown()
+        self.size = size
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(size, 1) + max_pending)
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero the timing metrics."""
+        with self._stats_lock:
+            self._stats = {
+                kind: {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+                for kind in ('hash', 'verify')
+            }
+            self._stats['rejected'] = 0
+
+    def stats(self):
+        """Return a snapshot of the timing metrics."""
+        with self._stats_lock:
+            snapshot = {
+                kind: dict(self._stats[kind]) for kind in ('hash', 'verify')
+            }
+            snapshot['rejected'] = self._stats['rejected']
+        return snapshot
+
+    def shutdown(self):
+        """Stop the pool processes, if any are running."""
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _get_executor(self):
+        """Return the executor, creating it after a fork if needed."""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.size)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _release(self, future=None):
+        """Give back a slot once its work has really finished."""
+        self._slots.release()
+
+    def _run(self, kind, func, *args):
+        """Run a password function within the pool limits.
+
+        A pool task that times out cannot be stopped once it has started,
+        so its slot is only given back when the task is done; otherwise
+        the cap would not bound the work the processes are running.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._stats['rejected'] += 1
+            raise PoolSaturated()
+        start = time.perf_counter()
+        if self.size > 0:
+            try:
+                future = self._get_executor().submit(func, *args)
+            except Exception:
+                self._release()
+                raise
+            future.add_done_callback(self._release)
+            try:
+                result = future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                with self._stats_lock:
+                    self._stats['rejected'] += 1
+                raise PoolSaturated()
+        else:
+            try:
+                result = func(*args)
+            finally:
+                self._release()
+        elapsed = time.perf_counter() - start
+        BCRYPT_LATENCY.labels(kind).observe(elapsed)
+        with self._stats_lock:
+            stats = self._stats[kind]
+            stats['count'] += 1
+            stats['seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+        return result
+
+    def hash(self, password, rounds):
+        """Return the bcrypt hash of a password as text."""
+        if not password:
+            raise ValueError('Password must be non-empty.')
+        return self._run('hash', _hash, _to_bytes(password), rounds)
+
+    def hash_many(self, passwords, rounds):
+        """Hash a batch of passwords, spread across the pool processes.
+
+        The batch takes a single slot and runs in chunks on every process,
+        so callers should give batches a pool of their own rather than
+        the one serving logins. The timeout applies to the whole batch.
+        """
+        if not all(passwords):
+            raise ValueError('Password must be non-empty.')
+        passwords = [_to_bytes(password) for password in passwords]
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._stats['rejected'] += 1
+            raise PoolSaturated()
+        start = time.perf_counter()
+        if self.size > 0:
+            size = max(1, -(-len(passwords) // (self.size * 4)))
+            try:
+                executor = self._get_executor()
+                futures = [
+                    executor.submit(_hash_chunk, passwords[i:i + size], rounds)
+                    for i in range(0, len(passwords), size)
+                ]
+            except Exception:
+                self._release()
+                raise
+            remaining = [len(futures)]
+            remaining_lock = threading.Lock()
+
+            def release(future):
+                with remaining_lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        self._release()
+
+            for future in futures:
+                future.add_done_callback(release)
+            pending = wait(futures, timeout=self.timeout).not_done
+            if pending:
+                for future in pending:
+                    future.cancel()
+                with self._stats_lock:
+                    self._stats['rejected'] += 1
+                raise PoolSaturated()
+            hashes = [
+                pw_hash for future in futures for pw_hash in future.result()]
+        else:
+            try:
+                hashes = _hash_chunk(passwords, rounds)
+            finally:
+                self._release()
+        elapsed = time.perf_counter() - start
+        for _ in passwords:
+            BCRYPT_LATENCY.labels('hash').observe(elapsed / len(passwords))
+        with self._stats_lock:
+            stats = self._stats['hash']
+            stats['count'] += len(passwords)
+            stats['seconds'] += elapsed
+        return hashes
+
+    def check(self, pw_hash, password):
+        """Return True if the password matches the hash."""
+        if not password:
+            return False
+        return self._run(
+            'verify', _check, _to_bytes(pw_hash), _to_bytes(password))
+
+
+password_pool = PasswordPool()
+# Bulk imports hash in their own processes, so a batch never holds up a login
+bulk_pool = PasswordPool()
+
+
+def hash_password(password):
+    """Hash a password with the configured number of rounds."""
+    return password_pool.hash(
+        password, current_app.config.get('BCRYPT_LOG_ROUNDS'))
+
+
+def check_password(pw_hash, password):
+    """Verify a password against a stored hash."""
+    return password_pool.check(pw_hash, password)
+
+
+def hash_rounds(pw_hash):
+    """Return the cost a bcrypt hash was made with, as in $2b$12$..."""
+    try:
+        return int(pw_hash[4:6])
+    except (TypeError, ValueError):
+        return None
+
+
+def needs_rehash(pw_hash):
+    """Return True if a hash was made with other than the configured cost."""
+    return hash_rounds(pw_hash) != current_app.config.get('BCRYPT_LOG_ROUNDS')
+
+
+def calibrate(target, min_rounds=4, max_rounds=20, timer=time.perf_counter):
+    """Return the highest cost whose verify time is within a target.
+
+    Each extra round doubles the work, so rounds are timed from the
+    cheapest up and timing stops at the first one over the target.
+    Returns (rounds, {rounds: seconds}); never less than min_rounds.
+    """
+    password = b'calibrate-bcrypt'
+    timings = {}
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        pw_hash = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+        start = timer()
+        bcrypt.checkpw(password, pw_hash)
+        timings[rounds] = timer() - start
+        if timings[rounds] > target:
+            break
+        chosen = rounds
+    return chosen, timings
+
+
+def handle_saturated(error):
+    """Reject a request when the password pool is saturated."""
+    response = jsonify({
+        'status': 'fail',
+        'message': 'Server busy. Please try again.'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
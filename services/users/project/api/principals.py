@@ -0,0 +1,198 @@
+"""Cache of verified principals used by the authenticate decorator."""
+# services/users/project/api/principals.py
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+
+from project import db
+from project.api import queries
+from project.api.models import User
+from project.cache import get_store
+
+Principal = namedtuple('Principal', ['id', 'active', 'admin'])
+
+
+class PrincipalCache:
+    """Bounded LRU cache of principals whose entries expire after a TTL.
+
+    Each worker process holds its own entries, tagged with the user's
+    generation in the shared store, the way ResponseCache keys its
+    entries. Invalidating a user, or clearing the cache, bumps a
+    generation there, so the change reaches every worker, and commands
+    run from the CLI, at once rather than after the TTL.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60, timer=time.monotonic,
+                 store=None):
+        """Initialize object."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Size the cache from the app configuration."""
+        self.maxsize = app.config.get('PRINCIPAL_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('PRINCIPAL_CACHE_TTL', self.ttl)
+        self.store = get_store(app)
+
+    def generation(self, user_id):
+        """Return the shared generation of a user's cached principal."""
+        if self.store is None:
+            return None
+        return tuple(int(value or 0) for value in self.store.mget([
+            'principal:generation',
+            'principal:generation:{0}'.format(user_id)]))
+
+    def get(self, user_id, generation=None):
+        """Return a cached principal, or None if missing or out of date."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            principal, expires, cached_generation = entry
+            if expires <= self.timer() or cached_generation != generation:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def set(self, principal, generation=None):
+        """Cache a principal, evicting the least recently used entry.
+
+        Pass the generation read before the principal was loaded, so a
+        change committed in between is not cached under the new one.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[principal.id] = (
+                principal, self.timer() + self.ttl, generation)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Drop the cached principal for a user in every worker."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if self.store is not None:
+            self.store.incr('principal:generation:{0}'.format(user_id))
+
+    def clear(self):
+        """Drop every cached principal in every worker."""
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.incr('principal:generation')
+
+    def __len__(self):
+        """Return the number of cached principals."""
+        return len(self._entries)
+
+
+class RevocationView:
+    """Token generation of each user whose stateless tokens were revoked.
+
+    Only users with a non-zero generation are held, so the view stays
+    small. Each worker reloads it every refresh_seconds; changes made
+    in this process apply at once.
+    """
+
+    def __init__(self, refresh_seconds=5, timer=time.monotonic):
+        """Initialize object."""
+        self.refresh_seconds = refresh_seconds
+        self.timer = timer
+        self._generations = {}
+        self._expires = 0
+
+    def init_app(self, app):
+        """Set the refresh interval from the app configuration."""
+        self.refresh_seconds = app.config.get(
+            'JWT_REVOCATION_REFRESH_SECONDS', self.refresh_seconds)
+
+    def refresh(self):
+        """Reload the view from the database."""
+        table = User.__table__
+        rows = db.session.execute(
+            select([table.c.id, table.c.token_generation]).where(
+                table.c.token_generation > 0)
+        ).fetchall()
+        self._generations = dict(rows)
+        self._expires = self.timer() + self.refresh_seconds
+
+    def generation(self, user_id):
+        """Return a user's current token generation."""
+        if self._expires <= self.timer():
+            self.refresh()
+        return self._generations.get(user_id, 0)
+
+    def update(self, user_id, generation):
+        """Record a generation changed in this process."""
+        self._generations[user_id] = generation
+
+    def clear(self):
+        """Drop the view, reloading it on next use."""
+        self._generations = {}
+        self._expires = 0
+
+    def __len__(self):
+        """Return the number of users in the view."""
+        return len(self._generations)
+
+
+principals = PrincipalCache()
+revocations = RevocationView()
+
+
+def get_principal(user_id):
+    """Return the principal for a user id, loading it on a cache miss."""
+    generation = principals.generation(user_id)
+    principal = principals.get(user_id, generation)
+    if principal is None:
+        row = db.session.execute(
+            queries.select_users(Principal._fields).where(
+                User.__table__.c.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        principal = Principal(*row)
+        principals.set(principal, generation)
+    return principal
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_principal(mapper, connection, target):
+    """Invalidate the cached principal whenever a user row changes."""
+    principals.invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_principals', set()).add(target.id)
+    if target.token_generation:
+        revocations.update(target.id, target.token_generation)
+
+
+@event.listens_for(SignallingSession, 'after_commit')
+def _invalidate_committed(session):
+    """Invalidate again once committed, in case another worker reloaded.
+
+    A worker reading between the flush and the commit could still cache
+    the old row under the generation bumped at the flush.
+    """
+    for user_id in session.info.pop('changed_principals', ()):
+        principals.invalidate(user_id)
+
+
+@event.listens_for(SignallingSession, 'after_transaction_end')
+def _forget_changed_principals(session, transaction):
+    """Forget the changed users once the outermost transaction ends."""
+    if transaction.parent is None:
+        session.info.pop('changed_principals', None)
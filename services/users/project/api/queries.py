@@ -0,0 +1,263 @@
+"""Core queries for the users table."""
+# services/users/project/api/queries.py
+
+from sqlalchemy import Integer, any_, bindparam, exc, func, or_, select
+from sqlalchemy.dialects import postgresql
+
+from project import db
+from project.api.cache import mark_users_changed
+from project.api.models import User, users_version as version_table
+from project.api.passwords import hash_password
+
+# Columns that may be shown to any caller; never includes the password hash
+PUBLIC_COLUMNS = ('id', 'username', 'email', 'active', 'admin')
+SINGLE_USER_COLUMNS = ('id', 'username', 'email', 'active')
+
+
+def select_users(columns=PUBLIC_COLUMNS):
+    """Build a Core select of the given users columns."""
+    table = User.__table__
+    return select([table.c[name] for name in columns])
+
+
+def users_version():
+    """Return (version, last modified) for the whole users collection.
+
+    Triggers bump the users_version row in every transaction that writes
+    users, so one row versions the collection without scanning it.
+    """
+    return tuple(db.session.execute(
+        select([version_table.c.version, version_table.c.updated_at])
+    ).first())
+
+
+def fetch_users(after=0, limit=None, columns=PUBLIC_COLUMNS):
+    """Fetch users as lightweight row tuples ordered by id."""
+    query = select_users(columns).order_by(User.__table__.c.id)
+    if after:
+        query = query.where(User.__table__.c.id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    return db.session.execute(query).fetchall()
+
+
+def fetch_user(user_id, columns=SINGLE_USER_COLUMNS):
+    """Fetch a single user row, or None if it does not exist."""
+    query = select_users(columns).where(User.__table__.c.id == user_id)
+    return db.session.execute(query).first()
+
+
+def fetch_users_by_id(user_ids, columns=PUBLIC_COLUMNS):
+    """Fetch the users with any of the given ids in a single query.
+
+    On Postgres the ids travel as one array parameter, so every batch
+    size shares a single prepared statement and plan.
+    """
+    if not user_ids:
+        return []
+    id_column = User.__table__.c.id
+    if db.engine.dialect.name == 'postgresql':
+        condition = id_column == any_(bindparam(
+            'user_ids', list(user_ids), type_=postgresql.ARRAY(Integer)))
+    else:
+        condition = id_column.in_(user_ids)
+    query = select_users(columns).where(condition)
+    return db.session.execute(query).fetchall()
+
+
+def escape_like(term, escape='\\'):
+    """Escape the LIKE wildcards in a search term."""
+    for char in (escape, '%', '_'):
+        term = term.replace(char, escape + char)
+    return term
+
+
+def search_query(term, prefix=False, after=0, limit=None,
+                 columns=PUBLIC_COLUMNS):
+    """Build a select of the users whose username or email has a term.
+
+    Matching is case-insensitive. prefix=True only matches at the start,
+    which the lower() indexes serve; substring matches use the trigram
+    indexes.
+    """
+    table = User.__table__
+    pattern = '{0}{1}%'.format(
+        '' if prefix else '%', escape_like(term.lower()))
+    query = select_users(columns).where(or_(
+        func.lower(table.c.username).like(pattern, escape='\\'),
+        func.lower(table.c.email).like(pattern, escape='\\')
+    )).order_by(table.c.id)
+    if after:
+        query = query.where(table.c.id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def search_users(term, prefix=False, after=0, limit=None,
+                 columns=PUBLIC_COLUMNS):
+    """Fetch matching users ordered by id; see search_query."""
+    return db.session.execute(
+        search_query(term, prefix, after, limit, columns)).fetchall()
+
+
+def stream_user_batches(after=0, batch_size=1000, columns=PUBLIC_COLUMNS):
+    """Yield lists of user rows read from a server-side cursor.
+
+    On Postgres stream_results opens a named cursor, so only one batch
+    is held in memory however many rows there are.
+    """
+    query = select_users(columns).order_by(User.__table__.c.id)
+    if after:
+        query = query.where(User.__table__.c.id > after)
+    query = query.execution_options(stream_results=True)
+    result = db.session.execute(query)
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        result.close()
+
+
+def stream_users(after=0, batch_size=1000, columns=PUBLIC_COLUMNS):
+    """Yield user rows read from a server-side cursor in batches."""
+    for rows in stream_user_batches(after, batch_size, columns):
+        for row in rows:
+            yield row
+
+
+def find_conflicts(rows):
+    """Return the column that already holds each row's username or email.
+
+    The result maps the index of every conflicting row to 'email' or
+    'username', found with a single query for the whole batch.
+    """
+    table = User.__table__
+    emails = {row['email'] for row in rows}
+    usernames = {row['username'] for row in rows}
+    existing = db.session.execute(
+        select([table.c.username, table.c.email]).where(
+            table.c.email.in_(emails) | table.c.username.in_(usernames))
+    ).fetchall()
+    taken_emails = {row.email for row in existing}
+    taken_usernames = {row.username for row in existing}
+    conflicts = {}
+    for index, row in enumerate(rows):
+        if row['email'] in taken_emails:
+            conflicts[index] = 'email'
+        elif row['username'] in taken_usernames:
+            conflicts[index] = 'username'
+    return conflicts
+
+
+def insert_users(rows):
+    """Insert a batch of users with a single multi-row INSERT.
+
+    Each row is a dict holding username, email and an already hashed
+    password. Returns a list with the new id, or the name of the column
+    that conflicted, for every row in order.
+    """
+    if not rows:
+        return []
+    table = User.__table__
+    values = [
+        {
+            'username': row['username'],
+            'email': row['email'],
+            'password': row['password'],
+            'active': True,
+            'admin': False
+        }
+        for row in rows
+    ]
+    if db.engine.dialect.name == 'postgresql':
+        inserted = db.session.execute(
+            postgresql.insert(table).values(values)
+            .on_conflict_do_nothing()
+            .returning(table.c.id, table.c.username, table.c.email)
+        ).fetchall()
+        ids = {(row.username, row.email): row.id for row in inserted}
+        results = []
+        for row in rows:
+            # Only the first of several identical rows was inserted
+            results.append(ids.pop((row['username'], row['email']), None))
+        if inserted:
+            mark_users_changed(db.session, [row.id for row in inserted])
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            conflicts = find_conflicts(rows)
+            for index in missing:
+                results[index] = conflicts.get(index, 'username')
+        return results
+    # Portable fallback: check the whole batch up front, then insert
+    conflicts = find_conflicts(rows)
+    results = [None] * len(rows)
+    seen_emails, seen_usernames = set(), set()
+    to_insert = []
+    for index, row in enumerate(rows):
+        if index in conflicts:
+            results[index] = conflicts[index]
+        elif row['email'] in seen_emails:
+            results[index] = 'email'
+        elif row['username'] in seen_usernames:
+            results[index] = 'username'
+        else:
+            to_insert.append(index)
+        seen_emails.add(row['email'])
+        seen_usernames.add(row['username'])
+    if to_insert:
+        db.session.execute(
+            table.insert(), [values[index] for index in to_insert])
+        ids = dict(db.session.execute(
+            select([table.c.username, table.c.id]).where(
+                table.c.username.in_(
+                    [rows[index]['username'] for index in to_insert]))
+        ).fetchall())
+        for index in to_insert:
+            results[index] = ids[rows[index]['username']]
+        mark_users_changed(db.session, [results[i] for i in to_insert])
+    return results
+
+
+def insert_user(username, email, pw_hash):
+    """Insert one user in a single round trip.
+
+    Returns (id, None) for a new user, or (None, column) naming the
+    column that conflicted. The conflicting column is only looked up on
+    the failure path.
+    """
+    table = User.__table__
+    values = {
+        'username': username,
+        'email': email,
+        'password': pw_hash,
+        'active': True,
+        'admin': False
+    }
+    if db.engine.dialect.name == 'postgresql':
+        user_id = db.session.execute(
+            postgresql.insert(table).values(values)
+            .on_conflict_do_nothing()
+            .returning(table.c.id)
+        ).scalar()
+    else:
+        try:
+            user_id = db.session.execute(
+                table.insert().values(values)).inserted_primary_key[0]
+        except exc.IntegrityError:
+            db.session.rollback()
+            user_id = None
+    if user_id is None:
+        return None, find_conflicts([values]).get(0, 'username')
+    mark_users_changed(db.session, [user_id])
+    return user_id, None
+
+
+def create_user(username, email, password):
+    """Validate, hash and insert a new user; see insert_user."""
+    if not username or not email:
+        raise ValueError('Username and email must be non-empty.')
+    return insert_user(username, email, hash_password(password))
@@ -0,0 +1,111 @@
+"""Token bucket rate limits for the password endpoints."""
+# services/users/project/api/ratelimit.py
+
+import math
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+
+from project.cache import get_store, require_shared_store
+from project.metrics import RATE_LIMITED
+
+
+def take(state, now, rate, burst, cost=1):
+    """Take cost tokens, one or none, from a bucket holding at least one.
+
+    state is (tokens, updated) or None for a full bucket. Returns
+    (allowed, new state, seconds until a token is available).
+    """
+    tokens, updated = state if state is not None else (burst, now)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return True, (tokens - cost, now), 0
+    return False, (tokens, now), (1 - tokens) / rate
+
+
+def hit(key, rate, burst, timer=time.time, cost=1):
+    """Take a token from a bucket in the shared store.
+
+    With cost=0 the bucket is only checked. Returns 0 if the request may
+    proceed, else the seconds to wait.
+    """
+    store = get_store(current_app)
+    with store.lock('lock:' + key, timeout=1):
+        value = store.get(key)
+        state = tuple(map(float, value.split())) if value else None
+        allowed, state, retry_after = take(
+            state, timer(), rate, burst, cost)
+        # The bucket is full again, and can be forgotten, after this long
+        ttl = int(math.ceil((burst - state[0]) / rate)) + 1
+        store.set(key, '{0} {1}'.format(*state).encode(), ex=ttl)
+    return retry_after
+
+
+def client_ip():
+    """Return the client address as seen by nginx.
+
+    nginx sets X-Real-IP and appends the peer address to X-Forwarded-For,
+    so only the last X-Forwarded-For entry can be trusted.
+    """
+    real_ip = request.headers.get('X-Real-IP')
+    if real_ip:
+        return real_ip.strip()
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    if forwarded_for:
+        return forwarded_for.split(',')[-1].strip()
+    return request.remote_addr or 'unknown'
+
+
+def limits():
+    """Yield (name, key, rate, burst) for the limits of this request."""
+    config = current_app.config
+    yield ('ip', 'ratelimit:ip:{0}'.format(client_ip()),
+           config.get('RATELIMIT_IP_RATE'), config.get('RATELIMIT_IP_BURST'))
+    post_data = request.get_json(silent=True)
+    account = post_data.get('email') if isinstance(post_data, dict) else None
+    if isinstance(account, str) and account:
+        yield ('account', 'ratelimit:account:{0}'.format(account.lower()),
+               config.get('RATELIMIT_ACCOUNT_RATE'),
+               config.get('RATELIMIT_ACCOUNT_BURST'))
+
+
+def rate_limited(f):
+    """Reject a request with 429 once the client or account is over limit.
+
+    Runs before the view, so rejected requests cost no database query
+    and no hashing. The client address pays for every request; the
+    account only for failed ones, so its owner's own logins do not use
+    up its bucket.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_app.config.get('RATELIMIT_ENABLED'):
+            return f(*args, **kwargs)
+        buckets = list(limits())
+        for name, key, rate, burst in buckets:
+            retry_after = hit(key, rate, burst,
+                              cost=0 if name == 'account' else 1)
+            if retry_after:
+                RATE_LIMITED.labels(name).inc()
+                response = jsonify({
+                    'status': 'fail',
+                    'message': 'Too many requests. Please try again later.'
+                })
+                response.headers['Retry-After'] = str(
+                    int(math.ceil(retry_after)))
+                return response, 429
+        response = make_response(f(*args, **kwargs))
+        if 400 <= response.status_code < 500:
+            for name, key, rate, burst in buckets:
+                if name == 'account':
+                    hit(key, rate, burst)
+        return response
+    return decorated_function
+
+
+def init_app(app):
+    """Refuse buckets that each worker would keep to itself."""
+    if (app.config.get('RATELIMIT_ENABLED') and
+            app.config.get('SHARED_STORE_REQUIRED')):
+        require_shared_store(app, 'Rate limiting')
@@ -0,0 +1,111 @@
+"""Read replica routing with read-your-writes pinning."""
+# services/users/project/api/replicas.py
+
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from project import db
+from project.cache import get_store, require_shared_store
+
+PIN_COOKIE = 'users_primary'
+
+
+def pin_key(user_id):
+    """Return the store key pinning a user to the primary."""
+    return 'pin:user:{0}'.format(user_id)
+
+
+def use_replica(user_id=None):
+    """Determine if reads may go to a replica.
+
+    Clients that wrote within DATABASE_REPLICA_PIN_SECONDS, recognized
+    by a cookie or by their user id, stay on the primary.
+    """
+    if db.get_replicas() is None:
+        return False
+    try:
+        if float(request.cookies.get(PIN_COOKIE, 0)) > time.time():
+            return False
+    except ValueError:
+        pass
+    if user_id is not None:
+        return get_store(current_app).get(pin_key(user_id)) is None
+    return True
+
+
+def read_from(replica, f, *args, **kwargs):
+    """Call f with its queries on a replica when replica is True.
+
+    A replica that fails is marked down by its ReplicaSet and the call is
+    retried once on the primary. g.replica_read records where the data
+    came from.
+    """
+    with db.reading(replica) as engine:
+        g.replica_read = engine is not None
+        try:
+            return f(*args, **kwargs)
+        except DBAPIError as e:
+            if engine is None or not (
+                    e.connection_invalidated or
+                    isinstance(e, OperationalError)):
+                raise
+    db.session.rollback()
+    g.replica_read = False
+    with db.reading(False):
+        return f(*args, **kwargs)
+
+
+def read_only(f):
+    """Run a view's queries on a read replica when allowed."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        return read_from(
+            use_replica(g.get('user_id')), f, *args, **kwargs)
+    return decorated_function
+
+
+@event.listens_for(SignallingSession, 'after_commit')
+def _pin_writer(session):
+    """Pin the client and the users it changed to the primary."""
+    changed = session.info.get('changed_users')
+    if (changed is None or not has_request_context() or
+            db.get_replicas() is None):
+        return
+    g.pin_primary = True
+    window = current_app.config.get('DATABASE_REPLICA_PIN_SECONDS')
+    store = get_store(current_app)
+    for user_id in set(changed) | {g.get('user_id')} - {None}:
+        store.set(pin_key(user_id), b'1', ex=window)
+
+
+def _reset_request_state():
+    """Forget the routing state of any earlier request on this context."""
+    g.user_id = None
+    g.pin_primary = False
+    g.replica_read = False
+
+
+def _set_pin_cookie(response):
+    """Send the pin cookie after a request that wrote."""
+    if g.get('pin_primary'):
+        window = current_app.config.get('DATABASE_REPLICA_PIN_SECONDS')
+        response.set_cookie(
+            PIN_COOKIE, str(time.time() + window), max_age=window,
+            httponly=True)
+    return response
+
+
+def init_app(app):
+    """Send the pin cookie on responses to writes.
+
+    Pins must be seen by every worker, so replicas need a shared store.
+    """
+    if app.config.get('DATABASE_REPLICA_URLS'):
+        require_shared_store(app, 'DATABASE_REPLICA_URLS')
+    app.before_request(_reset_request_state)
+    app.after_request(_set_pin_cookie)
@@ -0,0 +1,68 @@
+"""Bulk JSON serializers for user rows."""
+# services/users/project/api/serializers.py
+
+from json.encoder import encode_basestring_ascii
+
+from project.api.queries import PUBLIC_COLUMNS
+
+
+def _encode_bool(value):
+    """Encode a boolean as JSON."""
+    return 'true' if value else 'false'
+
+
+def _encode_datetime(value):
+    """Encode a datetime as a JSON ISO 8601 string."""
+    return '"{0}"'.format(value.isoformat())
+
+
+# JSON encoder for each public column, so rows never become dicts
+ENCODERS = {
+    'id': str,
+    'username': encode_basestring_ascii,
+    'email': encode_basestring_ascii,
+    'active': _encode_bool,
+    'admin': _encode_bool,
+    'updated_at': _encode_datetime,
+}
+
+_templates = {}
+
+
+def _template(columns):
+    """Return the cached format string for a row with these columns."""
+    template = _templates.get(columns)
+    if template is None:
+        template = '{{' + ', '.join(
+            '"{name}": {{}}'.format(name=name) for name in columns) + '}}'
+        _templates[columns] = template
+    return template
+
+
+def dump_user(row, columns=PUBLIC_COLUMNS):
+    """Serialize a single user row to a JSON object."""
+    return _template(columns).format(
+        *[ENCODERS[name](value) for name, value in zip(columns, row)])
+
+
+def dump_users(rows, columns=PUBLIC_COLUMNS):
+    """Serialize user rows, or None for null, to a JSON array in one pass."""
+    template = _template(columns)
+    encoders = [ENCODERS[name] for name in columns]
+    return '[' + ', '.join(
+        'null' if row is None else
+        template.format(*[encode(value) for encode, value in zip(
+            encoders, row)])
+        for row in rows
+    ) + ']'
+
+
+def pack_users(rows, columns=PUBLIC_COLUMNS):
+    """Map user rows, or None, to the objects packed into MessagePack."""
+    return [None if row is None else dict(zip(columns, row)) for row in rows]
+
+
+def dump_envelope(data, status='success'):
+    """Wrap pre-serialized JSON data in the standard response envelope."""
+    return '{{"status": {status}, "data": {data}}}\n'.format(
+        status=encode_basestring_ascii(status), data=data)
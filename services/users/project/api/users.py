@@ -1,16 +1,35 @@
 """Routes for User Services as part of Users Blueprint."""
 # services/users/project/api/users.py
 
-from flask import Blueprint, jsonify, request, render_template
+import json
+from functools import partial
+
+from flask import (
+    Blueprint, Response, current_app, g, jsonify, render_template, request,
+    stream_with_context, url_for
+)
 from sqlalchemy import exc
 
 from project import db
-from project.api.models import User
-from project.api.utils import authenticate, is_admin
+from project.database import pool_stats
+from project.api import bulk, export, queries
+from project.api.cache import cached, user_namespace
+from project.api.replicas import read_only
+from project.api.serializers import (
+    dump_envelope, dump_user, dump_users, pack_users
+)
+from project.api.utils import (
+    add_validators, authenticate, is_admin, is_not_modified, make_etag,
+    not_modified
+)
+from project.negotiation import msgpack_response, wants_msgpack
 
 
 users_blueprint = Blueprint('users', __name__, template_folder='./templates')
 
+# Ids are a 32-bit integer column; larger values make Postgres fail
+MAX_USER_ID = 2 ** 31 - 1
+
 
 @users_blueprint.route('/users/ping', methods=['GET'])
 def ping_pong():
@@ -21,7 +40,29 @@ def ping_pong():
     })
 
 
+@users_blueprint.route('/users/pool', methods=['GET'])
+@authenticate
+def get_pool_stats(resp):
+    """Get database connection pool statistics for this worker."""
+    if not is_admin(resp):
+        response_object = {
+            'status': 'fail',
+            'message': 'You do not have permission to do that.'
+        }
+        return jsonify(response_object), 401
+    data = pool_stats(db.engine)
+    replicas = db.get_replicas()
+    if replicas is not None:
+        data['replicas'] = replicas.stats()
+    return jsonify({
+        'status': 'success',
+        'data': data
+    })
+
+
 @users_blueprint.route('/users/<user_id>', methods=['GET'])
+@cached(user_namespace)
+@read_only
 def get_single_user(user_id):
     """Get single user details."""
     response_object = {
@@ -29,34 +70,222 @@ def get_single_user(user_id):
         'message': 'User does not exist.'
     }
     try:
-        user = User.query.filter_by(id=int(user_id)).first()
+        user = queries.fetch_user(
+            int(user_id), queries.SINGLE_USER_COLUMNS + ('updated_at',))
         if not user:
             return jsonify(response_object), 404
         else:
-            response_object = {
-                'status': 'success',
-                'data': {
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email,
-                    'active': user.active
-                }
-            }
-            return jsonify(response_object), 200
+            etag = make_etag('user', user.id, user.updated_at.isoformat())
+            if is_not_modified(etag, user.updated_at):
+                return not_modified(etag, user.updated_at)
+            row = tuple(user)[:-1]
+            if wants_msgpack():
+                response = msgpack_response(
+                    dict(zip(queries.SINGLE_USER_COLUMNS, row)))
+            else:
+                response = json_response(dump_envelope(
+                    dump_user(row, queries.SINGLE_USER_COLUMNS)))
+            return add_validators(response, etag, user.updated_at), 200
     except ValueError:
         return jsonify(response_object), 404
 
 
 @users_blueprint.route('/users', methods=['GET'])
+@cached('users')
+@read_only
 def get_all_users():
-    """Get all users."""
+    """Get all users, a keyset page of users or a streamed listing."""
+    version, last_modified = queries.users_version()
+    etag = make_etag('users', version, request.full_path)
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified)
+    response, status = list_users()
+    if status == 200:
+        add_validators(response, etag, last_modified)
+    return response, status
+
+
+def list_users():
+    """Build the listing, keyset page or stream requested."""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return stream_users(), 200
+    if 'ids' in request.args:
+        try:
+            user_ids = [int(value) for value in
+                        request.args['ids'].split(',') if value.strip()]
+        except ValueError:
+            user_ids = None
+        return lookup_users(user_ids)
+    if 'limit' not in request.args and 'after' not in request.args:
+        return users_response(queries.fetch_users()), 200
+    return paginate(
+        queries.fetch_users, 'users.get_all_users',
+        current_app.config.get('USERS_PAGE_SIZE_MAX'))
+
+
+@users_blueprint.route('/users/lookup', methods=['POST'])
+@read_only
+def post_lookup_users():
+    """Resolve a list of user ids too long for a query string."""
+    post_data = request.get_json(silent=True)
+    user_ids = post_data.get('ids') if isinstance(post_data, dict) else None
+    if not isinstance(user_ids, list) or not all(
+            isinstance(user_id, int) and not isinstance(user_id, bool)
+            for user_id in user_ids):
+        user_ids = None
+    return lookup_users(user_ids)
+
+
+def lookup_users(user_ids):
+    """Resolve user ids with one query, in request order.
+
+    Ids without a user are null in the list and are also listed under
+    missing.
+    """
+    max_ids = current_app.config.get('USERS_LOOKUP_MAX')
     response_object = {
-        'status': 'success',
-        'data': {
-            'users': [user.to_json() for user in User.query.all()]
+        'status': 'fail',
+        'message': 'Invalid ids.'
+    }
+    if not user_ids or not all(
+            1 <= user_id <= MAX_USER_ID for user_id in user_ids):
+        return jsonify(response_object), 400
+    if len(user_ids) > max_ids:
+        response_object['message'] = (
+            'Too many ids; at most {max_ids} per request.'.format(
+                max_ids=max_ids))
+        return jsonify(response_object), 400
+    rows = {row.id: row for row in queries.fetch_users_by_id(set(user_ids))}
+    missing = [user_id for user_id in user_ids if user_id not in rows]
+    return users_response(
+        [rows.get(user_id) for user_id in user_ids], missing=missing), 200
+
+
+def paginate(fetch, endpoint, max_limit, **url_args):
+    """Build a keyset page of users from the limit and after arguments.
+
+    fetch is called with after and limit; the link to the next page
+    carries url_args as well.
+    """
+    response_object = {
+        'status': 'fail',
+        'message': 'Invalid pagination parameters.'
+    }
+    try:
+        limit = int(request.args.get('limit', max_limit))
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return jsonify(response_object), 400
+    if limit < 1 or after < 0:
+        return jsonify(response_object), 400
+    limit = min(limit, max_limit)
+    # Fetch one extra row to find out whether there is a next page
+    users = fetch(after=after, limit=limit + 1)
+    next_url = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_url = url_for(
+            endpoint, limit=limit, after=users[-1].id, **url_args)
+    response = users_response(users, next=next_url)
+    if next_url:
+        response.headers['Link'] = '<{url}>; rel="next"'.format(url=next_url)
+    return response, 200
+
+
+@users_blueprint.route('/users/search', methods=['GET'])
+@cached('users')
+@read_only
+def search_users():
+    """Search users by username or email, a keyset page at a time."""
+    term = request.args.get('q', '').strip()
+    match = request.args.get('match', 'substring')
+    if not term or match not in ('prefix', 'substring'):
+        response_object = {
+            'status': 'fail',
+            'message': 'Invalid search parameters.'
         }
+        return jsonify(response_object), 400
+    fetch = partial(
+        queries.search_users, term, prefix=match == 'prefix')
+    return paginate(
+        fetch, 'users.search_users',
+        current_app.config.get('USERS_SEARCH_PAGE_SIZE_MAX'),
+        q=term, match=match)
+
+
+def stream_users():
+    """Stream all users from a server-side cursor in batches.
+
+    The rows are read after the view has returned, outside read_only, so
+    the generator opens its own reading() block on the same side.
+    """
+    replica = g.get('replica_read', False)
+    rows = queries.stream_users(
+        after=request.args.get('after', 0, type=int),
+        batch_size=current_app.config.get('USERS_STREAM_BATCH_SIZE')
+    )
+
+    def generate():
+        with db.reading(replica) as engine:
+            g.replica_read = engine is not None
+            yield '{"status": "success", "data": {"users": ['
+            separator = ''
+            for row in rows:
+                yield separator + dump_user(row)
+                separator = ', '
+            yield ']}}\n'
+
+    return Response(
+        stream_with_context(generate()), mimetype='application/json')
+
+
+@users_blueprint.route('/users/export', methods=['GET'])
+@authenticate
+def export_users(resp):
+    """Stream every user as CSV or NDJSON, gzipped if the client accepts."""
+    response_object = {
+        'status': 'fail',
+        'message': 'You do not have permission to do that.'
     }
-    return jsonify(response_object), 200
+    if not is_admin(resp):
+        return jsonify(response_object), 401
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        response_object['message'] = 'Invalid export format.'
+        return jsonify(response_object), 400
+    compress = request.accept_encodings['gzip'] > 0
+    response = Response(
+        stream_with_context(export.export_users(fmt, compress=compress)),
+        mimetype=export.MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = (
+        'attachment; filename=users.{fmt}'.format(fmt=fmt))
+    response.vary.add('Accept-Encoding')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def json_response(body):
+    """Build a JSON response from an already serialized body."""
+    return Response(body, mimetype='application/json')
+
+
+def users_response(rows, **extra):
+    """Build the envelope for a list of user rows and any extra values.
+
+    Clients that prefer MessagePack get the rows packed directly, without
+    serializing them to JSON first. Rows that are None are null.
+    """
+    if wants_msgpack():
+        data = {'users': pack_users(rows)}
+        data.update(extra)
+        return msgpack_response(data)
+    data = '{{"users": {users}{extra}}}'.format(
+        users=dump_users(rows),
+        extra=''.join(', "{name}": {value}'.format(
+            name=name, value=json.dumps(value))
+            for name, value in extra.items()))
+    return json_response(dump_envelope(data))
 
 
 @users_blueprint.route('/users', methods=['POST'])
@@ -77,11 +306,8 @@ def add_user(resp):
     email = post_data.get('email')
     password = post_data.get('password')
     try:
-        user = User.query.filter_by(email=email).first()
-        if not user:
-            db.session.add(
-                User(username=username, email=email, password=password)
-            )
+        user_id, conflict = queries.create_user(username, email, password)
+        if not conflict:
             db.session.commit()
             response_object = {
                 'status': 'success',
@@ -89,21 +315,50 @@ def add_user(resp):
             }
             return jsonify(response_object), 201
         else:
-            response_object['message'] = 'Sorry. That email already exists.'
+            response_object['message'] = (
+                'Sorry. That {field} already exists.'.format(field=conflict))
+            response_object['field'] = conflict
             return jsonify(response_object), 400
-    except (exc.IntegrityError, ValueError) as e:
+    except (exc.IntegrityError, ValueError):
         db.session.rollback()
         return jsonify(response_object), 400
 
 
+@users_blueprint.route('/users/bulk', methods=['POST'])
+@authenticate
+def bulk_add_users(resp):
+    """Add users in bulk from a streamed NDJSON or CSV body."""
+    response_object = {
+        'status': 'fail',
+        'message': 'Invalid payload.'
+    }
+    if not is_admin(resp):
+        response_object['message'] = 'You do not have permission to do that.'
+        return jsonify(response_object), 401
+    fmt = bulk.MIMETYPES.get(request.mimetype)
+    if fmt is None:
+        response_object['message'] = 'Unsupported content type.'
+        return jsonify(response_object), 415
+    results = list(bulk.import_users(bulk.parse(request.stream, fmt)))
+    data = bulk.summarize(results)
+    data['results'] = results
+    response_object = {
+        'status': 'success',
+        'data': data
+    }
+    return jsonify(response_object), 200
+
+
 @users_blueprint.route('/', methods=['GET', 'POST'])
+@cached('users')
 def index():
     """Route for main page."""
     if request.method == 'POST':
         username = request.form['username']
         email = request.form['email']
         password = request.form['password']
-        db.session.add(User(username=username, email=email, password=password))
-        db.session.commit()
-    users = User.query.all()
+        user_id, conflict = queries.create_user(username, email, password)
+        if not conflict:
+            db.session.commit()
+    users = queries.fetch_users()
     return render_template('index.html', users=users)
@@ -1,11 +1,17 @@
 """Utilities for Users service."""
 # services/users/project/api/utils.py
 
+import hashlib
 from functools import wraps
 
-from flask import request, jsonify
+from flask import Response, current_app, g, request, jsonify
 
+from project.api.denylist import denylist
 from project.api.models import User
+from project.api.principals import Principal, get_principal, revocations
+from project.api.replicas import read_from, use_replica
+from project.metrics import JWT_FAILURES
+from project.negotiation import wants_msgpack
 
 
 def authenticate(f):
@@ -20,18 +26,72 @@ def authenticate(f):
         if not auth_header:
             return jsonify(response_object), 403
         auth_token = auth_header.split(' ')[1]
-        resp = User.decode_auth_token(auth_token)
-        if isinstance(resp, str):
-            response_object['message'] = resp
+        payload = User.decode_auth_payload(auth_token)
+        if isinstance(payload, str):
+            response_object['message'] = payload
             return jsonify(response_object), 401
-        user = User.query.filter_by(id=resp).first()
-        if not user or not user.active:
+        if denylist.is_revoked(payload.get('jti')):
+            JWT_FAILURES.labels('logged_out').inc()
+            response_object['message'] = 'Token revoked. Please log in again.'
             return jsonify(response_object), 401
+        resp = payload['sub']
+        g.user_id = resp
+        g.token = payload
+        if current_app.config.get('JWT_STATELESS_CLAIMS') and \
+                'gen' in payload:
+            principal = principal_from_claims(payload)
+        else:
+            principal = read_from(use_replica(resp), get_principal, resp)
+        if not principal or not principal.active:
+            return jsonify(response_object), 401
+        g.principal = principal
         return f(resp, *args, **kwargs)
     return decorated_function
 
 
+def principal_from_claims(payload):
+    """Build the principal carried by a stateless token, or None if revoked."""
+    if payload['gen'] < revocations.generation(payload['sub']):
+        JWT_FAILURES.labels('revoked').inc()
+        return None
+    return Principal(payload['sub'], payload['act'], payload['adm'])
+
+
 def is_admin(user_id):
     """Determine if a user is an administrator."""
-    user = User.query.filter_by(id=user_id).first()
-    return user.admin
+    principal = g.get('principal')
+    if principal is None or principal.id != user_id:
+        principal = get_principal(user_id)
+    return principal is not None and principal.admin
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the values that identify a representation."""
+    if wants_msgpack():
+        parts += ('msgpack',)
+    return hashlib.sha1(
+        ':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def is_not_modified(etag, last_modified=None):
+    """Determine if the client's cached copy is still current."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= \
+            request.if_modified_since
+    return False
+
+
+def add_validators(response, etag, last_modified=None):
+    """Set the ETag and Last-Modified headers on a response."""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """Return an empty 304 response carrying the validators."""
+    return add_validators(Response(status=304), etag, last_modified)
@@ -0,0 +1,260 @@
+"""Key-value cache backends shared by the users service."""
+# services/users/project/cache.py
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUBackend:
+    """Bounded in-process LRU cache whose entries may expire.
+
+    Entries live in one worker process only, so writes handled by other
+    workers are not seen here until the entry expires.
+    """
+
+    def __init__(self, maxsize=1024, timer=time.monotonic):
+        """Initialize object."""
+        self.maxsize = maxsize
+        self.timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """Return a cached value, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= self.timer():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        """Return a list of cached values, None for each missing key."""
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        """Cache a value, evicting the least recently used entries."""
+        with self._lock:
+            expires = self.timer() + ttl if ttl else None
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def incr(self, key):
+        """Increment an integer value and return the result."""
+        with self._lock:
+            value = (self.get(key) or 0) + 1
+            self._entries[key] = (value, None)
+            return value
+
+    def delete(self, key):
+        """Drop a cached value."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every cached value."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        """Return the number of cached values."""
+        return len(self._entries)
+
+
+class InMemoryStore:
+    """Thread-safe stand-in for the subset of the Redis client we use.
+
+    Lets the shared backend run in tests and development without a Redis
+    server; values behave as they would in Redis (bytes in, bytes out).
+    """
+
+    def __init__(self, timer=time.time):
+        """Initialize object."""
+        self.timer = timer
+        self._data = {}
+        self._lock = threading.RLock()
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    def _live(self, name):
+        """Return the value for a key if it has not expired."""
+        entry = self._data.get(name)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= self.timer():
+            del self._data[name]
+            return None
+        return value
+
+    def get(self, name):
+        """Get the value of a key."""
+        with self._lock:
+            return self._live(name)
+
+    def mget(self, keys):
+        """Get the values of several keys."""
+        with self._lock:
+            return [self._live(key) for key in keys]
+
+    def set(self, name, value, ex=None):
+        """Set a key, optionally expiring after ex seconds."""
+        if isinstance(value, int):
+            value = str(value).encode()
+        with self._lock:
+            expires = self.timer() + ex if ex else None
+            self._data[name] = (value, expires)
+        return True
+
+    def incr(self, name, amount=1):
+        """Increment the integer value of a key."""
+        with self._lock:
+            value = int(self._live(name) or 0) + amount
+            expires = self._data.get(name, (None, None))[1]
+            self._data[name] = (str(value).encode(), expires)
+            return value
+
+    def delete(self, *names):
+        """Delete keys."""
+        with self._lock:
+            return sum(
+                self._data.pop(name, None) is not None for name in names)
+
+    def zadd(self, name, mapping):
+        """Add members to a sorted set, with their scores."""
+        with self._lock:
+            members = self._live(name)
+            if members is None:
+                members = {}
+                self._data[name] = (members, None)
+            added = 0
+            for member, score in mapping.items():
+                if isinstance(member, str):
+                    member = member.encode()
+                added += member not in members
+                members[member] = float(score)
+            return added
+
+    def zrangebyscore(self, name, min, max):
+        """Return the members of a sorted set scored min to max, in order."""
+        with self._lock:
+            members = self._live(name) or {}
+            return [
+                member for member, score in
+                sorted(members.items(), key=lambda item: item[1])
+                if float(min) <= score <= float(max)
+            ]
+
+    def zremrangebyscore(self, name, min, max):
+        """Remove the members of a sorted set scored min to max."""
+        with self._lock:
+            members = self._live(name) or {}
+            removed = [member for member, score in members.items()
+                       if float(min) <= score <= float(max)]
+            for member in removed:
+                del members[member]
+            return len(removed)
+
+    def lock(self, name, timeout=None):
+        """Return a lock for a name; one process only, unlike Redis."""
+        # A fixed set of locks keeps memory bounded however many names
+        return self._locks[hash(name) % len(self._locks)]
+
+    def flushdb(self):
+        """Delete every key."""
+        with self._lock:
+            self._data.clear()
+
+
+class SharedBackend:
+    """Cache backend on a shared store such as Redis.
+
+    Every worker sees the same entries, so an invalidation in one worker
+    takes effect in all of them.
+    """
+
+    def __init__(self, client, prefix='users:'):
+        """Initialize object."""
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        """Return a cached value, or None."""
+        return self._load(self.client.get(self.prefix + key))
+
+    def get_many(self, keys):
+        """Return a list of cached values, None for each missing key."""
+        return [
+            self._load(value) for value in
+            self.client.mget([self.prefix + key for key in keys])
+        ]
+
+    def set(self, key, value, ttl=None):
+        """Cache a value."""
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+    def incr(self, key):
+        """Increment an integer value and return the result."""
+        return self.client.incr(self.prefix + key)
+
+    def delete(self, key):
+        """Drop a cached value."""
+        self.client.delete(self.prefix + key)
+
+    @staticmethod
+    def _load(value):
+        """Decode a stored value."""
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+
+def get_store(app):
+    """Return the shared key-value store of an app.
+
+    SHARED_STORE_URL names a Redis server; 'memory://', the default,
+    selects the in-memory stand-in, which is only shared between the
+    threads of one process.
+    """
+    store = app.extensions.get('store')
+    if store is None:
+        url = app.config.get('SHARED_STORE_URL') or 'memory://'
+        if url == 'memory://':
+            store = InMemoryStore()
+        else:
+            import redis
+            store = redis.StrictRedis.from_url(url)
+        app.extensions['store'] = store
+    return store
+
+
+def require_shared_store(app, feature):
+    """Refuse to start a feature that needs a store every worker shares.
+
+    The in-memory store is private to one process, so with several
+    workers each would keep its own copy of the feature's state.
+    """
+    url = app.config.get('SHARED_STORE_URL') or 'memory://'
+    if url == 'memory://':
+        raise RuntimeError(
+            '{feature} needs SHARED_STORE_URL to name a store shared by '
+            'every worker, such as redis://.'.format(feature=feature))
+
+
+def make_backend(kind, store=None, maxsize=1024):
+    """Create the cache backend named by kind: 'lru', 'shared' or 'null'."""
+    if kind == 'null':
+        return None
+    if kind == 'shared':
+        return SharedBackend(store if store is not None else InMemoryStore())
+    return LRUBackend(maxsize)
@@ -0,0 +1,70 @@
+"""Response compression negotiated from Accept-Encoding."""
+# services/users/project/compression.py
+
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+def _compress_gzip(data, app):
+    """Compress with gzip."""
+    return gzip.compress(data, app.config.get('COMPRESS_LEVEL', 6))
+
+
+def _compress_brotli(data, app):
+    """Compress with brotli."""
+    return brotli.compress(
+        data, quality=app.config.get('COMPRESS_BR_QUALITY', 4))
+
+
+def choose_encoding(accept_encodings):
+    """Return the preferred encoding the client accepts, or None."""
+    available = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_quality = None, 0
+    for encoding in available:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+COMPRESSORS = {
+    'br': _compress_brotli,
+    'gzip': _compress_gzip,
+}
+
+
+def compress(response):
+    """Compress a response body when it is large enough to be worthwhile."""
+    config = current_app.config
+    if (response.mimetype not in config.get('COMPRESS_MIMETYPES') or
+            response.direct_passthrough or response.is_streamed):
+        return response
+    response.vary.add('Accept-Encoding')
+    if (not 200 <= response.status_code < 300 or
+            response.status_code == 204 or
+            'Content-Encoding' in response.headers or
+            response.content_length is None or
+            response.content_length < config.get('COMPRESS_MIN_SIZE')):
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    response.set_data(
+        COMPRESSORS[encoding](response.get_data(), current_app))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ, so a strong validator would be wrong
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """Compress large responses in an encoding the client accepts."""
+    app.after_request(compress)
@@ -8,18 +8,64 @@ class BaseConfig:
 
     TESTING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_POOL_PRE_PING = True
+    SQLALCHEMY_PGBOUNCER = False
     SECRET_KEY = os.environ.get('SECRET_KEY')
     DEBUG_TB_ENABLED = False
     DEBUG_TB_INTERCEPT_REDIRECTS = False
     BCRYPT_LOG_ROUNDS = 13
     TOKEN_EXPIRATION_DAYS = 30
     TOKEN_EXPIRATION_SECONDS = 0
+    JSON_BACKEND = 'auto'
+    JSONIFY_PRETTYPRINT_REGULAR = False
+    COMPRESS_MIMETYPES = (
+        'application/json', 'application/msgpack', 'application/x-ndjson',
+        'text/csv', 'text/html', 'text/plain'
+    )
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6
+    COMPRESS_BR_QUALITY = 4
+    USERS_PAGE_SIZE_MAX = 1000
+    USERS_STREAM_BATCH_SIZE = 1000
+    USERS_SEARCH_PAGE_SIZE_MAX = 100
+    USERS_LOOKUP_MAX = 1000
+    PRINCIPAL_CACHE_SIZE = 10000
+    PRINCIPAL_CACHE_TTL = 60
+    JWT_STATELESS_CLAIMS = False
+    JWT_REVOCATION_REFRESH_SECONDS = 5
+    DENYLIST_BLOOM_CAPACITY = 100000
+    DENYLIST_BLOOM_ERROR_RATE = 0.001
+    DENYLIST_SYNC_SECONDS = 1
+    DENYLIST_PRUNE_SECONDS = 60
+    # Token buckets on /auth/login and /auth/register: tokens per second
+    # and bucket size, per client address and per account email
+    RATELIMIT_ENABLED = True
+    RATELIMIT_IP_RATE = 1.0
+    RATELIMIT_IP_BURST = 20
+    RATELIMIT_ACCOUNT_RATE = 0.1
+    RATELIMIT_ACCOUNT_BURST = 5
+    PASSWORD_POOL_SIZE = 0
+    PASSWORD_POOL_MAX_PENDING = 32
+    PASSWORD_POOL_TIMEOUT = 10
+    BULK_PASSWORD_POOL_SIZE = 0
+    BULK_PASSWORD_POOL_MAX_PENDING = 0
+    BULK_PASSWORD_POOL_TIMEOUT = 300
+    USERS_IMPORT_BATCH_SIZE = 500
+    DATABASE_REPLICA_URLS = None
+    DATABASE_REPLICA_PIN_SECONDS = 5
+    DATABASE_REPLICA_RETRY_SECONDS = 30
+    SHARED_STORE_URL = 'memory://'
+    SHARED_STORE_REQUIRED = False
+    RESPONSE_CACHE_BACKEND = 'lru'
+    RESPONSE_CACHE_SIZE = 1024
+    RESPONSE_CACHE_TTL = 60
 
 
 class DevelopmentConfig(BaseConfig):
     """Development configuration."""
 
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    DATABASE_REPLICA_URLS = os.environ.get('DATABASE_REPLICA_URLS')
     DEBUG_TB_ENABLED = True
     BCRYPT_LOG_ROUNDS = 4
 
@@ -32,9 +78,56 @@ class TestingConfig(BaseConfig):
     BCRYPT_LOG_ROUNDS = 4
     TOKEN_EXPIRATION_DAYS = 0
     TOKEN_EXPIRATION_SECONDS = 3
+    # Set by `manage.py test --workers` for databases cloned with the schema
+    TEST_SCHEMA_READY = os.environ.get('TEST_SCHEMA_READY') == '1'
 
 
 class ProductionConfig(BaseConfig):
     """Production configuration."""
 
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get('SQLALCHEMY_POOL_SIZE', 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(
+        os.environ.get('SQLALCHEMY_MAX_OVERFLOW', 10))
+    SQLALCHEMY_POOL_TIMEOUT = int(
+        os.environ.get('SQLALCHEMY_POOL_TIMEOUT', 10))
+    SQLALCHEMY_POOL_RECYCLE = int(
+        os.environ.get('SQLALCHEMY_POOL_RECYCLE', 1800))
+    SQLALCHEMY_PGBOUNCER = os.environ.get('SQLALCHEMY_PGBOUNCER') == '1'
+    # Pick with `manage.py calibrate-bcrypt`; hashes are upgraded on login
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 13))
+    DATABASE_REPLICA_URLS = os.environ.get('DATABASE_REPLICA_URLS')
+    SHARED_STORE_URL = os.environ.get('SHARED_STORE_URL')
+    # Logouts and rate limits must be seen by every worker
+    SHARED_STORE_REQUIRED = True
+    JWT_STATELESS_CLAIMS = os.environ.get('JWT_STATELESS_CLAIMS') == '1'
+    # Without a shared store each worker would cache, and invalidate, alone
+    RESPONSE_CACHE_BACKEND = os.environ.get(
+        'RESPONSE_CACHE_BACKEND', 'shared' if SHARED_STORE_URL else 'null')
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    # gunicorn settings, read by gunicorn_conf.py
+    GUNICORN_WORKER_CLASS = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    GUNICORN_WORKERS = int(
+        os.environ.get('GUNICORN_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+    # Every worker has its own pool, so share the host's CPUs between them
+    PASSWORD_POOL_SIZE = int(os.environ.get(
+        'PASSWORD_POOL_SIZE',
+        max(1, (os.cpu_count() or 1) // GUNICORN_WORKERS)))
+    # A gthread worker waiting on the pool holds one of its threads, so
+    # admit one less password request than there are threads; the last
+    # thread stays free for cheap requests and the rest get a 503
+    PASSWORD_POOL_MAX_PENDING = int(os.environ.get(
+        'PASSWORD_POOL_MAX_PENDING',
+        32 if GUNICORN_WORKER_CLASS == 'gevent' else
+        max(0, GUNICORN_THREADS - 1 - max(PASSWORD_POOL_SIZE, 1))))
+    # Bulk imports get their own processes, started on first use, and
+    # run one batch at a time per worker
+    BULK_PASSWORD_POOL_SIZE = int(os.environ.get(
+        'BULK_PASSWORD_POOL_SIZE', os.cpu_count() or 1))
+    GUNICORN_WORKER_CONNECTIONS = int(
+        os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+    GUNICORN_KEEPALIVE = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+    GUNICORN_TIMEOUT = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+    GUNICORN_GRACEFUL_TIMEOUT = int(
+        os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
@@ -0,0 +1,206 @@
+"""SQLAlchemy extension with tunable pools and read replica routing."""
+# services/users/project/database.py
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+import sqlalchemy
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import OperationalError, TimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.sql.selectable import SelectBase
+
+# Options that only make sense for a queue pool
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize object."""
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        """Check out a connection, timing the wait."""
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+class ReplicaSet:
+    """Round-robin choice among the healthy read replicas of an app.
+
+    A replica that fails with a connection error is skipped for
+    retry_seconds, after which it is tried again.
+    """
+
+    def __init__(self, urls, engines, retry_seconds=30, timer=time.monotonic):
+        """Initialize object."""
+        self.urls = tuple(urls)
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self.timer = timer
+        self._next = itertools.count()
+        self._down = {}
+        for engine in engines:
+            event.listen(engine, 'handle_error', self._handle_error)
+
+    def choose(self):
+        """Return the next healthy replica engine, or None."""
+        now = self.timer()
+        for _ in self.engines:
+            engine = self.engines[next(self._next) % len(self.engines)]
+            if self._down.get(engine, 0) <= now:
+                return engine
+        return None
+
+    def mark_down(self, engine):
+        """Stop using a replica until its retry time."""
+        self._down[engine] = self.timer() + self.retry_seconds
+
+    def _handle_error(self, context):
+        """Mark a replica down when it cannot be reached."""
+        if context.is_disconnect or isinstance(
+                context.sqlalchemy_exception, OperationalError):
+            self.mark_down(context.engine)
+
+    def stats(self):
+        """Return the health of each replica."""
+        now = self.timer()
+        return [
+            {
+                'url': repr(engine.url),
+                'healthy': self._down.get(engine, 0) <= now
+            }
+            for engine in self.engines
+        ]
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends SELECTs to a replica when one is assigned.
+
+    Anything written in the current transaction, and everything flushed,
+    stays on the primary so a request always reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        """Choose the engine for a statement."""
+        replica = self.info.get('replica')
+        if (replica is not None and isinstance(clause, SelectBase) and
+                not self._flushing and not self.info.get('changed_users')):
+            return replica
+        return super().get_bind(mapper, clause)
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with pool pre-ping, a PgBouncer mode and replicas.
+
+    Pool size, overflow, timeout and recycle come from the standard
+    SQLALCHEMY_POOL_* settings. SQLALCHEMY_POOL_PRE_PING tests each
+    connection before use so a Postgres restart does not surface as
+    errors. SQLALCHEMY_PGBOUNCER hands pooling to PgBouncer by opening
+    a fresh connection for every checkout. DATABASE_REPLICA_URLS lists
+    read replicas that reading() routes queries to.
+    """
+
+    def create_session(self, options):
+        """Create the session factory for routing sessions."""
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_replicas(self, app=None):
+        """Return the ReplicaSet for an app, or None without replicas."""
+        app = self.get_app(app)
+        urls = app.config.get('DATABASE_REPLICA_URLS') or ()
+        if isinstance(urls, str):
+            urls = [url.strip() for url in urls.split(',') if url.strip()]
+        if not urls:
+            return None
+        state = get_state(app)
+        with self._engine_lock:
+            replicas = getattr(state, 'replicas', None)
+            if replicas is None or replicas.urls != tuple(urls):
+                replicas = state.replicas = ReplicaSet(
+                    urls,
+                    [self.create_replica_engine(app, url) for url in urls],
+                    app.config.get('DATABASE_REPLICA_RETRY_SECONDS', 30))
+            return replicas
+
+    def create_replica_engine(self, app, url):
+        """Create an engine for a replica with the primary's options."""
+        info = make_url(url)
+        options = {'convert_unicode': True}
+        self.apply_pool_defaults(app, options)
+        self.apply_driver_hacks(app, info, options)
+        return sqlalchemy.create_engine(info, **options)
+
+    @contextmanager
+    def reading(self, replica=True):
+        """Route the session's SELECTs to a replica inside the block.
+
+        Pass replica=False to stay on the primary. Yields the replica
+        engine in use, or None when reading from the primary.
+        """
+        session = self.session()
+        previous = session.info.get('replica')
+        replicas = self.get_replicas() if replica else None
+        session.info['replica'] = (
+            replicas.choose() if replicas is not None else None)
+        try:
+            yield session.info.get('replica')
+        finally:
+            session.info['replica'] = previous
+
+    def apply_driver_hacks(self, app, info, options):
+        """Choose the pool class and pool options for the engine."""
+        super().apply_driver_hacks(app, info, options)
+        if app.config.get('SQLALCHEMY_PGBOUNCER'):
+            options['poolclass'] = NullPool
+        elif info.drivername.startswith('postgres'):
+            options.setdefault('poolclass', TimedQueuePool)
+            options['pool_pre_ping'] = bool(
+                app.config.get('SQLALCHEMY_POOL_PRE_PING'))
+        if options.get('poolclass') not in (None, QueuePool, TimedQueuePool):
+            for option in QUEUE_POOL_OPTIONS:
+                options.pop(option, None)
+
+
+def pool_stats(engine):
+    """Return a snapshot of an engine's connection pool usage."""
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update({
+                'checkouts': pool.checkouts,
+                'timeouts': pool.timeouts,
+                'wait_seconds': pool.wait_seconds,
+                'max_wait_seconds': pool.max_wait_seconds,
+            })
+    return stats
@@ -0,0 +1,79 @@
+"""Pluggable fast JSON encoder used by jsonify."""
+# services/users/project/encoding.py
+
+from flask.json import JSONEncoder
+
+
+def _load_orjson():
+    """Return a dumps function backed by orjson."""
+    import orjson
+
+    def dumps(obj, encoder):
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if encoder.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(
+            obj, default=encoder.default, option=option).decode('utf-8')
+    return dumps
+
+
+def _load_ujson():
+    """Return a dumps function backed by ujson."""
+    import ujson
+
+    def dumps(obj, encoder):
+        return ujson.dumps(
+            obj, ensure_ascii=encoder.ensure_ascii,
+            sort_keys=encoder.sort_keys, default=encoder.default)
+    return dumps
+
+
+# Fast backends in order of preference
+BACKENDS = {
+    'orjson': _load_orjson,
+    'ujson': _load_ujson,
+}
+
+
+class FastJSONEncoder(JSONEncoder):
+    """JSON encoder that hands compact output to a fast backend.
+
+    Pretty-printed output, and anything the backend rejects, goes
+    through the standard encoder, so the result is always valid.
+    """
+
+    backend = None
+
+    def encode(self, o):
+        """Return a JSON string for o."""
+        if self.backend is not None and self.indent is None:
+            try:
+                return self.backend(o, self)
+            except (TypeError, ValueError, OverflowError):
+                pass
+        return super().encode(o)
+
+
+def load_backend(name='auto'):
+    """Return the dumps function of a backend, or None for the stdlib.
+
+    'auto' picks the first fast backend that is installed.
+    """
+    if name == 'stdlib':
+        return None
+    names = list(BACKENDS) if name == 'auto' else [name]
+    for candidate in names:
+        try:
+            return BACKENDS[candidate]()
+        except ImportError:
+            if name != 'auto':
+                raise
+    return None
+
+
+def init_app(app):
+    """Encode the app's JSON with the backend named by JSON_BACKEND."""
+    backend = load_backend(app.config.get('JSON_BACKEND', 'auto'))
+    app.json_encoder = type(
+        'FastJSONEncoder', (FastJSONEncoder,),
+        {'backend': staticmethod(backend) if backend else None})
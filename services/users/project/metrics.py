@@ -0,0 +1,129 @@
+"""Prometheus metrics for the users service.
+
+When the ``prometheus_multiproc_dir`` environment variable is set, as it
+is under gunicorn, every worker writes its samples to that directory
+and the metrics endpoint aggregates them, so counts cover all workers
+and not just the one that answers the scrape.
+"""
+# services/users/project/metrics.py
+
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUESTS = Counter(
+    'users_http_requests_total',
+    'HTTP requests by blueprint route, method and status.',
+    ['endpoint', 'method', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'users_http_request_duration_seconds',
+    'HTTP request latency by blueprint route and method.',
+    ['endpoint', 'method']
+)
+DB_QUERIES = Histogram(
+    'users_db_queries_per_request',
+    'Database queries issued per request.',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 4, 5, 10, 20, 50, float('inf'))
+)
+DB_TIME = Histogram(
+    'users_db_seconds_per_request',
+    'Time spent in database queries per request.',
+    ['endpoint']
+)
+BCRYPT_LATENCY = Histogram(
+    'users_bcrypt_duration_seconds',
+    'Duration of bcrypt work by operation.',
+    ['operation'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+             float('inf'))
+)
+JWT_FAILURES = Counter(
+    'users_jwt_decode_failures_total',
+    'JWT decode failures by reason.',
+    ['reason']
+)
+RATE_LIMITED = Counter(
+    'users_rate_limited_total',
+    'Requests rejected by a rate limit, by limit.',
+    ['limit']
+)
+
+
+def _endpoint():
+    """Return the blueprint route label for the current request."""
+    return request.endpoint or 'unmatched'
+
+
+def _start_request():
+    """Start timing a request and counting its queries."""
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_query_seconds = 0.0
+
+
+def _note_status(response):
+    """Remember the status of the response being sent."""
+    g.metrics_status = response.status_code
+    return response
+
+
+def _record_request(exc=None):
+    """Record latency, status and database usage for a request.
+
+    This runs on teardown, which Flask reaches even when the view raised,
+    so a request that ends in an unhandled exception counts as a 500.
+    """
+    start = g.get('metrics_start')
+    if start is None:
+        return
+    status = 500 if exc is not None else g.get('metrics_status', 500)
+    endpoint = _endpoint()
+    REQUESTS.labels(endpoint, request.method, status).inc()
+    REQUEST_LATENCY.labels(endpoint, request.method).observe(
+        time.perf_counter() - start)
+    DB_QUERIES.labels(endpoint).observe(g.metrics_queries)
+    DB_TIME.labels(endpoint).observe(g.metrics_query_seconds)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    """Note when a query starts."""
+    conn.info['metrics_query_start'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    """Add a finished query to the current request's totals."""
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+        g.metrics_query_seconds += (
+            time.perf_counter() - conn.info['metrics_query_start'])
+
+
+def metrics():
+    """Render every metric in the Prometheus text format."""
+    if 'prometheus_multiproc_dir' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Collect request metrics and expose them at /users/metrics."""
+    app.before_request(_start_request)
+    app.after_request(_note_status)
+    app.teardown_request(_record_request)
+    app.add_url_rule('/users/metrics', 'metrics', metrics)
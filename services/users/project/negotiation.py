@@ -0,0 +1,61 @@
+"""MessagePack responses negotiated from Accept."""
+# services/users/project/negotiation.py
+
+import json
+
+import msgpack
+from flask import Response, has_request_context, request
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # pragma: no cover - orjson is optional
+    json_loads = json.loads
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def wants_msgpack():
+    """Determine if the client prefers MessagePack to JSON."""
+    if not has_request_context():
+        return False
+    accept = request.accept_mimetypes
+    best = accept.best_match(('application/json',) + MSGPACK_MIMETYPES)
+    return best in MSGPACK_MIMETYPES
+
+
+def msgpack_response(data, status='success'):
+    """Pack data in the standard response envelope as MessagePack.
+
+    Views that build their JSON by hand use this to pack their rows
+    directly instead of having to_msgpack parse the JSON again.
+    """
+    response = Response(
+        msgpack.packb({'status': status, 'data': data}, use_bin_type=True),
+        mimetype='application/msgpack')
+    response.vary.add('Accept')
+    return response
+
+
+def to_msgpack(response):
+    """Re-encode a JSON response as MessagePack when the client asks.
+
+    The JSON body is decoded and packed again, so envelopes, dates and
+    every other value are the same in both formats. Listings are packed
+    by the views themselves; this covers the remaining small responses.
+    Streamed responses stay JSON.
+    """
+    if (response.mimetype != 'application/json' or
+            response.direct_passthrough or response.is_streamed):
+        return response
+    response.vary.add('Accept')
+    body = response.get_data()
+    if not body or not wants_msgpack():
+        return response
+    response.set_data(msgpack.packb(json_loads(body), use_bin_type=True))
+    response.mimetype = 'application/msgpack'
+    return response
+
+
+def init_app(app):
+    """Answer JSON responses in MessagePack for clients that prefer it."""
+    app.after_request(to_msgpack)
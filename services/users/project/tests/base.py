@@ -1,15 +1,126 @@
 """Base testing file."""
 # services/users/project/tests/base.py
 
+from contextlib import contextmanager
+
 from flask_testing import TestCase
+from sqlalchemy import Integer, event, func, orm, select
 
 from project import create_app, db
+from project.api.cache import response_cache
+from project.api.denylist import denylist
+from project.api.principals import principals, revocations
+from project.cache import get_store
+from project.database import RoutingSession
 
 app = create_app()
 
+# Statements the transactional fixture adds around the test's own
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+
+_schema_built = False
+
+
+def _sqlite_connect(dbapi_connection, connection_record):
+    """Stop pysqlite from managing transactions, which breaks SAVEPOINT."""
+    dbapi_connection.isolation_level = None
+
+
+def _sqlite_begin(connection):
+    """Emit the BEGIN pysqlite no longer does."""
+    connection.execute('BEGIN')
+
+
+def build_schema(app):
+    """Create the schema once per process.
+
+    TEST_SCHEMA_READY skips this for a database cloned from one that
+    already has it.
+    """
+    global _schema_built
+    if _schema_built:
+        return
+    if db.engine.dialect.name == 'sqlite':
+        db.engine.dispose()
+        event.listen(db.engine, 'connect', _sqlite_connect)
+        event.listen(db.engine, 'begin', _sqlite_begin)
+    if not app.config.get('TEST_SCHEMA_READY'):
+        db.drop_all()
+        db.create_all()
+        db.session.commit()
+    db.session.remove()
+    _schema_built = True
+
+
+def reset_sequences(connection):
+    """Restart id sequences, which a rollback does not undo on Postgres."""
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in db.metadata.sorted_tables:
+        for column in table.primary_key.columns:
+            if column.autoincrement and isinstance(column.type, Integer):
+                connection.execute(
+                    select([func.setval(func.pg_get_serial_sequence(
+                        table.name, column.name), 1, False)]))
+
+
+class TestSession(RoutingSession):
+    """Session that works inside a SAVEPOINT from the start."""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize object."""
+        super().__init__(*args, **kwargs)
+        self.begin_nested()
+
+
+def _end_savepoint(session, transaction):
+    """Start a new SAVEPOINT when the test's one is committed or rolled back.
+
+    The SAVEPOINT stands in for the outermost transaction, so the
+    changes recorded for it are forgotten as they would be on commit.
+    """
+    if transaction.nested and transaction.parent.parent is None:
+        session.info.pop('changed_users', None)
+        session.expire_all()
+        session.begin_nested()
+
+
+class QueryCounter:
+    """Record the SQL statements executed on an engine."""
+
+    def __init__(self, engine):
+        """Initialize object."""
+        self.engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        """Start recording."""
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop recording."""
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    def __len__(self):
+        """Return the number of statements recorded."""
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context,
+                executemany):
+        """Record one statement, leaving out the fixture's SAVEPOINTs."""
+        if not statement.startswith(SAVEPOINT_STATEMENTS):
+            self.statements.append(statement)
+
 
 class BaseTestCase(TestCase):
-    """Base Test Case."""
+    """Base Test Case.
+
+    The schema is built once per process. Each test runs inside a
+    transaction on one connection that is rolled back when it ends, and
+    the session works in a SAVEPOINT that is restarted after every
+    commit or rollback, so application code can commit as usual.
+    """
 
     def create_app(self):
         """App creation for tests."""
@@ -17,11 +128,43 @@ class BaseTestCase(TestCase):
         return app
 
     def setUp(self):
-        """Setup tests."""
-        db.create_all()
-        db.session.commit()
+        """Start the transaction the test runs in."""
+        build_schema(self.app)
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        reset_sequences(self.connection)
+        self.app_session = db.session
+        db.session = orm.scoped_session(
+            orm.sessionmaker(
+                class_=TestSession, db=db, bind=self.connection, binds={},
+                query_cls=db.Query),
+            scopefunc=self.app_session.registry.scopefunc)
+        event.listen(db.session, 'after_transaction_end', _end_savepoint)
+        # Emit the first SAVEPOINT now rather than in the test's first query
+        db.session.connection()
 
     def tearDown(self):
-        """Operations for testing shutdown."""
+        """Roll back everything the test wrote."""
         db.session.remove()
-        db.drop_all()
+        db.session = self.app_session
+        self.transaction.rollback()
+        self.connection.close()
+        principals.clear()
+        revocations.clear()
+        denylist.clear()
+        get_store(self.app).flushdb()
+        response_cache.clear()
+
+    @contextmanager
+    def assertMaxQueries(self, maximum):
+        """Fail if the block runs more than a number of SQL queries."""
+        with QueryCounter(db.engine) as counter:
+            yield counter
+        if len(counter) > maximum:
+            self.fail('{count} queries executed, at most {maximum} '
+                      'expected:\n{statements}'.format(
+                          count=len(counter), maximum=maximum,
+                          statements='\n'.join(
+                              '{}. {}'.format(number, statement)
+                              for number, statement in enumerate(
+                                  counter.statements, 1))))
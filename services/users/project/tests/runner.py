@@ -0,0 +1,166 @@
+"""Run the test modules in parallel, each worker on its own database."""
+# services/users/project/tests/runner.py
+
+import copy
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
+
+from project import db
+from project.api import models  # noqa: F401 - registers the tables
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def discover(pattern=r'^test.*\.py$'):
+    """Return the dotted names of the test modules."""
+    return sorted(
+        'project.tests.' + name[:-3] for name in os.listdir(TESTS_DIR)
+        if re.match(pattern, name))
+
+
+def module_weight(module):
+    """Estimate the cost of a test module from its size."""
+    return os.path.getsize(
+        os.path.join(TESTS_DIR, module.rsplit('.', 1)[1] + '.py'))
+
+
+def partition(modules, workers, weight=module_weight):
+    """Split modules into at most workers groups of similar total weight.
+
+    The heaviest modules are placed first, each in the lightest group.
+    """
+    groups = [[] for _ in range(max(1, min(workers, len(modules))))]
+    loads = [0] * len(groups)
+    for module in sorted(modules, key=weight, reverse=True):
+        index = loads.index(min(loads))
+        groups[index].append(module)
+        loads[index] += weight(module)
+    return groups
+
+
+def is_sqlite_memory(url):
+    """Determine if a URL names an in-memory SQLite database."""
+    return url.drivername.startswith('sqlite') and \
+        url.database in (None, '', ':memory:')
+
+
+def worker_url(url, index):
+    """Return the URL of a worker's copy of a database."""
+    url = copy.copy(make_url(url))
+    if is_sqlite_memory(url):
+        return str(url)
+    if url.drivername.startswith('sqlite'):
+        root, ext = os.path.splitext(url.database)
+        url.database = '{0}_{1}{2}'.format(root, index, ext)
+    else:
+        url.database = '{0}_{1}'.format(url.database, index)
+    return str(url)
+
+
+def build_template(url):
+    """Create the schema in the database the workers are cloned from."""
+    engine = create_engine(url)
+    try:
+        db.metadata.drop_all(engine)
+        db.metadata.create_all(engine)
+    finally:
+        engine.dispose()
+
+
+def _postgres_admin(url):
+    """Return an autocommit engine on the server's maintenance database."""
+    url = copy.copy(make_url(url))
+    url.database = 'postgres'
+    return create_engine(url, isolation_level='AUTOCOMMIT')
+
+
+def clone_database(template, url):
+    """Copy a template database; returns False if there is nothing to copy.
+
+    SQLite files are copied. Postgres databases are created with the
+    template as TEMPLATE, which copies files rather than replaying DDL.
+    """
+    template, url = make_url(template), make_url(url)
+    if is_sqlite_memory(url):
+        return False
+    if url.drivername.startswith('sqlite'):
+        shutil.copyfile(template.database, url.database)
+        return True
+    engine = _postgres_admin(url)
+    quote = engine.dialect.identifier_preparer.quote
+    try:
+        engine.execute('DROP DATABASE IF EXISTS {0}'.format(
+            quote(url.database)))
+        engine.execute('CREATE DATABASE {0} TEMPLATE {1}'.format(
+            quote(url.database), quote(template.database)))
+    finally:
+        engine.dispose()
+    return True
+
+
+def drop_database(url):
+    """Remove a worker's database."""
+    url = make_url(url)
+    if is_sqlite_memory(url):
+        return
+    if url.drivername.startswith('sqlite'):
+        if os.path.exists(url.database):
+            os.remove(url.database)
+        return
+    engine = _postgres_admin(url)
+    try:
+        engine.execute('DROP DATABASE IF EXISTS {0}'.format(
+            engine.dialect.identifier_preparer.quote(url.database)))
+    finally:
+        engine.dispose()
+
+
+def run(url, workers, modules=None, verbosity=1):
+    """Run test modules in worker processes; returns True if all passed.
+
+    Each worker runs its share of the modules against its own clone of
+    the database at url, built once with the schema.
+    """
+    groups = partition(modules or discover(), workers)
+    build_template(url)
+    urls = [worker_url(url, index) for index in range(1, len(groups) + 1)]
+    processes = []
+    try:
+        for group, database in zip(groups, urls):
+            env = dict(os.environ, DATABASE_TEST_URL=database)
+            if clone_database(url, database):
+                env['TEST_SCHEMA_READY'] = '1'
+            output = tempfile.TemporaryFile(mode='w+')
+            command = [sys.executable, '-m', 'unittest',
+                       '--verbose' if verbosity > 1 else '--quiet'] + group
+            processes.append((group, output, subprocess.Popen(
+                command, env=env, stdout=output, stderr=subprocess.STDOUT,
+                universal_newlines=True)))
+        success = True
+        tests = 0
+        for index, (group, output, process) in enumerate(processes, 1):
+            process.wait()
+            output.seek(0)
+            text = output.read()
+            output.close()
+            print('worker {0}: {1}'.format(index, ' '.join(group)))
+            print(text)
+            ran = re.search(r'^Ran (\d+) tests?', text, re.MULTILINE)
+            tests += int(ran.group(1)) if ran else 0
+            success = success and process.returncode == 0
+        print('Ran {0} tests in {1} workers: {2}'.format(
+            tests, len(groups), 'OK' if success else 'FAILED'))
+        return success
+    finally:
+        for group, output, process in processes:
+            if process.poll() is None:
+                process.kill()
+        for database in urls:
+            drop_database(database)
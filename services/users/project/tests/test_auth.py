@@ -6,30 +6,13 @@ from flask import current_app
 
 from project import db
 from project.tests.base import BaseTestCase
-from project.tests.utils import add_user
+from project.tests.utils import add_user, get_token_header
 from project.api.models import User
 
 
 class TestAuthBlueprint(BaseTestCase):
     """Test authentication blueprint."""
 
-    def get_token_header(self, admin=True):
-        """Add user and login to get a token."""
-        user = add_user('admin', 'admin@admin.org', '123456')
-        if admin:
-            user.admin = True
-            db.session.commit()
-        resp_login = self.client.post(
-            '/auth/login',
-            data=json.dumps({
-                'email': 'admin@admin.org',
-                'password': '123456'
-            }),
-            content_type='application/json'
-        )
-        token = json.loads(resp_login.data.decode())['auth_token']
-        return {'Authorization': 'Bearer {token}'.format(token=token)}
-
     def test_user_registration(self):
         """Test user registration."""
         with self.client:
@@ -66,6 +49,7 @@ class TestAuthBlueprint(BaseTestCase):
             self.assertEqual(response.status_code, 400)
             self.assertIn(
                 'Sorry. That user already exists.', data['message'])
+            self.assertEqual(data['field'], 'email')
             self.assertIn('fail', data['status'])
 
     def test_user_registration_duplicate_username(self):
@@ -85,6 +69,7 @@ class TestAuthBlueprint(BaseTestCase):
             self.assertEqual(response.status_code, 400)
             self.assertIn(
                 'Sorry. That user already exists.', data['message'])
+            self.assertEqual(data['field'], 'username')
             self.assertIn('fail', data['status'])
 
     def test_user_registration_invalid_json(self):
@@ -151,7 +136,7 @@ class TestAuthBlueprint(BaseTestCase):
                     email='ben@test.org'
                 )),
                 content_type='application/json',
-                headers=self.get_token_header()
+                headers=get_token_header(self.client)
             )
             data = json.loads(response.data.decode())
             self.assertEqual(response.status_code, 400)
@@ -0,0 +1,46 @@
+"""Tests for the load benchmark helpers."""
+# services/users/project/tests/test_bench.py
+
+import unittest
+
+from benchmarks.load import compare
+from benchmarks.stats import percentile, summarize
+
+
+class TestBenchStats(unittest.TestCase):
+    """Test latency statistics and baseline comparison."""
+
+    def test_percentile(self):
+        """Ensure nearest-rank percentiles are returned."""
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 0.50), 50)
+        self.assertEqual(percentile(samples, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_summarize(self):
+        """Ensure throughput is computed from the elapsed time."""
+        result = summarize([0.01] * 10, 2.0, errors=1)
+        self.assertEqual(result['requests'], 10)
+        self.assertEqual(result['errors'], 1)
+        self.assertEqual(result['rps'], 5.0)
+        self.assertAlmostEqual(result['p95_ms'], 10.0)
+
+    def test_compare(self):
+        """Ensure only regressions beyond the tolerance are reported."""
+        baseline = {'results': {
+            'GET /users': {'rps': 100.0, 'p95_ms': 10.0},
+            'GET /users/<id>': {'rps': 100.0, 'p95_ms': 10.0},
+        }}
+        report = {'results': {
+            'GET /users': {'rps': 95.0, 'p95_ms': 10.5},
+            'GET /users/<id>': {'rps': 80.0, 'p95_ms': 12.0},
+            'GET /auth/status': {'rps': 1.0, 'p95_ms': 100.0},
+        }}
+        regressions = compare(report, baseline, tolerance=0.1)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(
+            all(r.startswith('GET /users/<id>') for r in regressions))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""Tests for bulk user import."""
+# services/users/project/tests/test_bulk.py
+
+import io
+import json
+import unittest
+
+from project.api import bulk, queries
+from project.api.models import User
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user, get_token_header
+
+
+class TestBulkImport(BaseTestCase):
+    """Tests for the bulk import endpoint and helpers."""
+
+    def test_bulk_ndjson(self):
+        """Ensure NDJSON rows are imported with per-row results."""
+        add_user('ben', 'ben@ben.org', '123456')
+        body = '\n'.join([
+            json.dumps({'username': 'jim', 'email': 'jim@bob.org',
+                        'password': '123456'}),
+            json.dumps({'username': 'ben2', 'email': 'ben@ben.org',
+                        'password': '123456'}),
+            '',
+            json.dumps({'username': 'sally', 'email': 'sally@sally.org'}),
+            'not json',
+            json.dumps({'username': 'jim', 'email': 'jim2@bob.org',
+                        'password': '123456'}),
+        ])
+        response = self.client.post(
+            '/users/bulk',
+            data=body,
+            content_type='application/x-ndjson',
+            headers=get_token_header(self.client)
+        )
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('success', data['status'])
+        self.assertEqual(data['data']['created'], 1)
+        self.assertEqual(data['data']['conflict'], 2)
+        self.assertEqual(data['data']['invalid'], 2)
+        results = data['data']['results']
+        self.assertEqual([result['row'] for result in results],
+                         [1, 2, 4, 5, 6])
+        self.assertEqual(results[0]['status'], 'created')
+        self.assertEqual(results[1]['field'], 'email')
+        self.assertEqual(results[2]['message'], 'Missing password.')
+        self.assertEqual(results[3]['message'], 'Invalid record.')
+        self.assertEqual(results[4]['field'], 'username')
+        user = User.query.get(results[0]['id'])
+        self.assertEqual(user.email, 'jim@bob.org')
+        self.assertTrue(user.active)
+        self.assertFalse(user.admin)
+
+    def test_bulk_non_string_fields(self):
+        """Ensure rows with non-string fields are reported as invalid."""
+        body = '\n'.join([
+            json.dumps({'username': 'jim', 'email': 'jim@bob.org',
+                        'password': 123456}),
+            json.dumps({'username': ['sally'], 'email': 'sally@sally.org',
+                        'password': '123456'}),
+        ])
+        response = self.client.post(
+            '/users/bulk',
+            data=body,
+            content_type='application/x-ndjson',
+            headers=get_token_header(self.client)
+        )
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['data']['invalid'], 2)
+        results = data['data']['results']
+        self.assertEqual(results[0]['message'], 'Invalid password.')
+        self.assertEqual(results[1]['message'], 'Invalid username.')
+        self.assertEqual(User.query.count(), 1)
+
+    def test_bulk_csv(self):
+        """Ensure CSV rows are imported."""
+        body = ('username,email,password\n'
+                'ben,ben@ben.org,123456\n'
+                'jim,jim@bob.org,123456\n')
+        response = self.client.post(
+            '/users/bulk',
+            data=body,
+            content_type='text/csv',
+            headers=get_token_header(self.client)
+        )
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['data']['created'], 2)
+        self.assertEqual(User.query.count(), 3)
+
+    def test_bulk_invalid_utf8(self):
+        """Ensure rows that are not UTF-8 are reported as invalid."""
+        body = (b'username,email,password\n'
+                b'ben,ben@ben.org,123456\n'
+                b'jim\xff,jim@bob.org,123456\n')
+        response = self.client.post(
+            '/users/bulk',
+            data=body,
+            content_type='text/csv',
+            headers=get_token_header(self.client)
+        )
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['data']['created'], 1)
+        self.assertEqual(data['data']['results'][1], {
+            'row': 2, 'status': 'invalid', 'message': 'Invalid username.'})
+        records = list(bulk.parse(io.BytesIO(
+            b'{"username": "jim\xff", "email": "j@b.org", "password": "1"}'
+        ), 'ndjson'))
+        self.assertEqual(bulk.validate(records[0][1]), 'Invalid username.')
+
+    def test_bulk_unsupported_content_type(self):
+        """Ensure an unsupported body format is rejected."""
+        response = self.client.post(
+            '/users/bulk',
+            data=json.dumps([]),
+            content_type='application/json',
+            headers=get_token_header(self.client)
+        )
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 415)
+        self.assertIn('Unsupported content type.', data['message'])
+
+    def test_bulk_not_admin(self):
+        """Ensure only administrators can import users."""
+        response = self.client.post(
+            '/users/bulk',
+            data='',
+            content_type='text/csv',
+            headers=get_token_header(self.client, admin=False)
+        )
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            data['message'], 'You do not have permission to do that.')
+
+    def test_import_users_batches(self):
+        """Ensure records are imported across several batches."""
+        records = bulk.parse(io.BytesIO(b'\n'.join(
+            json.dumps({
+                'username': 'user{}'.format(i),
+                'email': 'user{}@example.com'.format(i),
+                'password': '123456'
+            }).encode()
+            for i in range(5)
+        )), 'ndjson')
+        results = list(bulk.import_users(records, batch_size=2))
+        self.assertEqual(bulk.summarize(results)['created'], 5)
+        self.assertEqual(User.query.count(), 5)
+
+    def test_insert_users_duplicates_in_batch(self):
+        """Ensure duplicates within one batch are reported as conflicts."""
+        rows = [
+            {'username': 'ben', 'email': 'ben@ben.org', 'password': 'x'},
+            {'username': 'ben', 'email': 'ben2@ben.org', 'password': 'x'},
+            {'username': 'ben3', 'email': 'ben@ben.org', 'password': 'x'},
+        ]
+        results = queries.insert_users(rows)
+        self.assertIsInstance(results[0], int)
+        self.assertEqual(results[1:], ['username', 'email'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+"""Tests for the response cache."""
+# services/users/project/tests/test_cache.py
+
+import json
+import unittest
+
+from project import db
+from project.api import bulk
+from project.api.cache import ResponseCache, response_cache
+from project.cache import InMemoryStore, LRUBackend, SharedBackend
+from project.tests.base import BaseTestCase
+from project.tests.utils import FakeTimer, add_user, get_token_header
+
+
+class TestBackends(unittest.TestCase):
+    """Test the cache backends."""
+
+    def test_lru_eviction(self):
+        """Ensure the least recently used entry is evicted."""
+        cache = LRUBackend(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), [1, None, 3])
+
+    def test_lru_expiry(self):
+        """Ensure entries expire after their TTL."""
+        timer = FakeTimer()
+        cache = LRUBackend(timer=timer)
+        cache.set('a', 1, ttl=10)
+        timer.now = 10
+        self.assertIsNone(cache.get('a'))
+
+    def test_shared_backend(self):
+        """Ensure the shared backend round-trips values through a store."""
+        store = InMemoryStore()
+        cache = SharedBackend(store)
+        cache.set('a', (b'body', 200, [('ETag', '"x"')]))
+        self.assertEqual(cache.get('a'), (b'body', 200, [('ETag', '"x"')]))
+        self.assertEqual(cache.incr('n'), 1)
+        self.assertEqual(cache.incr('n'), 2)
+        self.assertEqual(cache.get_many(['n', 'missing']), [2, None])
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+
+    def test_shared_backend_is_shared(self):
+        """Ensure an invalidation through one cache is seen by another."""
+        store = InMemoryStore()
+        first = ResponseCache(SharedBackend(store))
+        second = ResponseCache(SharedBackend(store))
+        key = first.key('users', '/users?')
+        self.assertEqual(second.key('users', '/users?'), key)
+        first.invalidate('users')
+        self.assertNotEqual(second.key('users', '/users?'), key)
+
+    def test_store_expiry(self):
+        """Ensure keys set with ex expire."""
+        timer = FakeTimer()
+        store = InMemoryStore(timer=timer)
+        store.set('a', b'1', ex=5)
+        timer.now = 5
+        self.assertIsNone(store.get('a'))
+
+
+class TestResponseCache(BaseTestCase):
+    """Test caching of the user read endpoints."""
+
+    def usernames(self):
+        """Return the usernames listed by GET /users."""
+        response = self.client.get('/users')
+        data = json.loads(response.data.decode())
+        return [user['username'] for user in data['data']['users']]
+
+    def test_hit_runs_no_queries(self):
+        """Ensure a cached listing is served without touching the db."""
+        add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        first = self.client.get('/users')
+        with self.assertMaxQueries(0):
+            second = self.client.get('/users')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+
+    def test_hit_honours_conditional_get(self):
+        """Ensure a cached entry answers If-None-Match with 304."""
+        add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        etag = self.client.get('/users').headers['ETag']
+        with self.assertMaxQueries(0):
+            response = self.client.get(
+                '/users', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_single_user_cached(self):
+        """Ensure a single user is cached and invalidated on update."""
+        user = add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        url = '/users/{user_id}'.format(user_id=user.id)
+        self.client.get(url)
+        with self.assertMaxQueries(0):
+            self.client.get(url)
+        user.username = 'fletcher'
+        db.session.commit()
+        response = self.client.get(url)
+        data = json.loads(response.data.decode())
+        self.assertEqual(data['data']['username'], 'fletcher')
+
+    def test_add_user_invalidates(self):
+        """Ensure POST /users invalidates the cached listing."""
+        headers = get_token_header(self.client)
+        self.assertEqual(self.usernames(), ['admin'])
+        self.client.post(
+            '/users',
+            data=json.dumps({
+                'username': 'michael',
+                'email': 'michael@mherman.org',
+                'password': 'greaterthaneight'
+            }),
+            content_type='application/json',
+            headers=headers
+        )
+        self.assertEqual(self.usernames(), ['admin', 'michael'])
+
+    def test_register_invalidates(self):
+        """Ensure registering a user invalidates the cached listing."""
+        self.assertEqual(self.usernames(), [])
+        self.client.post(
+            '/auth/register',
+            data=json.dumps({
+                'username': 'michael',
+                'email': 'michael@mherman.org',
+                'password': '123456'
+            }),
+            content_type='application/json'
+        )
+        self.assertEqual(self.usernames(), ['michael'])
+
+    def test_index_post_invalidates(self):
+        """Ensure the index form invalidates the cached listings."""
+        self.client.get('/')
+        self.assertEqual(self.usernames(), [])
+        response = self.client.post(
+            '/',
+            data=dict(username='michael', email='michael@sonotreal.com',
+                      password='greaterthaneight'),
+            follow_redirects=True
+        )
+        self.assertIn(b'michael', response.data)
+        self.assertIn(b'michael', self.client.get('/').data)
+        self.assertEqual(self.usernames(), ['michael'])
+
+    def test_bulk_import_invalidates(self):
+        """Ensure a bulk import invalidates the cached listing."""
+        self.assertEqual(self.usernames(), [])
+        list(bulk.import_users(enumerate([{
+            'username': 'michael',
+            'email': 'michael@mherman.org',
+            'password': 'greaterthaneight'
+        }], 1)))
+        self.assertEqual(self.usernames(), ['michael'])
+
+    def test_rollback_keeps_cache(self):
+        """Ensure rolled back writes do not invalidate."""
+        user = add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        key = response_cache.key('users', '/users?')
+        user.username = 'changed'
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(response_cache.key('users', '/users?'), key)
+
+    def test_shared_backend_endpoints(self):
+        """Ensure the endpoints work on the shared backend."""
+        backend = response_cache.backend
+        response_cache.backend = SharedBackend(InMemoryStore())
+        try:
+            add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+            self.assertEqual(self.usernames(), ['michael'])
+            with self.assertMaxQueries(0):
+                self.assertEqual(self.usernames(), ['michael'])
+            add_user('fletcher', 'fletcher@notreal.com', 'greaterthaneight')
+            self.assertEqual(self.usernames(), ['michael', 'fletcher'])
+        finally:
+            response_cache.backend = backend
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -82,6 +82,17 @@ class TestProductionConfig(TestCase):
         self.assertTrue(app.config['BCRYPT_LOG_ROUNDS'] == 13)
         self.assertTrue(app.config['TOKEN_EXPIRATION_DAYS'] == 30)
         self.assertTrue(app.config['TOKEN_EXPIRATION_SECONDS'] == 0)
+        self.assertTrue(app.config['GUNICORN_WORKERS'] >= 1)
+        self.assertTrue(app.config['GUNICORN_THREADS'] >= 1)
+        if app.config['GUNICORN_WORKER_CLASS'] == 'gthread':
+            self.assertLess(
+                max(app.config['PASSWORD_POOL_SIZE'], 1) +
+                app.config['PASSWORD_POOL_MAX_PENDING'],
+                max(app.config['GUNICORN_THREADS'], 2))
+        self.assertTrue(
+            app.config['GUNICORN_WORKER_CLASS'] ==
+            os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+        )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,93 @@
+"""Tests for connection pool configuration and statistics."""
+# services/users/project/tests/test_database.py
+
+import json
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import NullPool
+
+from project import db
+from project.database import TimedQueuePool, pool_stats
+from project.tests.base import BaseTestCase
+from project.tests.utils import get_token_header
+
+
+class TestTimedQueuePool(unittest.TestCase):
+    """Test the instrumented queue pool."""
+
+    def test_pool_stats(self):
+        """Ensure checkouts and waits are recorded."""
+        engine = create_engine(
+            'sqlite://', poolclass=TimedQueuePool, pool_size=1,
+            max_overflow=0, pool_timeout=0.01)
+        connection = engine.connect()
+        stats = pool_stats(engine)
+        self.assertEqual(stats['pool'], 'TimedQueuePool')
+        self.assertEqual(stats['checked_out'], 1)
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertRaises(TimeoutError, engine.connect)
+        connection.close()
+        stats = pool_stats(engine)
+        self.assertEqual(stats['checked_out'], 0)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreater(stats['max_wait_seconds'], 0)
+
+    def test_pool_stats_null_pool(self):
+        """Ensure pools without a queue still report their class."""
+        engine = create_engine('sqlite://', poolclass=NullPool)
+        self.assertEqual(pool_stats(engine), {'pool': 'NullPool'})
+
+
+class TestPoolOptions(BaseTestCase):
+    """Test the engine options chosen from the configuration."""
+
+    def engine_options(self, uri):
+        """Return the create_engine options for a database URI."""
+        options = {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10}
+        db.apply_driver_hacks(self.app, make_url(uri), options)
+        return options
+
+    def test_postgres_options(self):
+        """Ensure Postgres gets an instrumented, pre-pinged queue pool."""
+        options = self.engine_options('postgres://user@localhost/users')
+        self.assertIs(options['poolclass'], TimedQueuePool)
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['pool_size'], 5)
+
+    def test_pgbouncer_options(self):
+        """Ensure PgBouncer mode leaves pooling to PgBouncer."""
+        self.app.config['SQLALCHEMY_PGBOUNCER'] = True
+        try:
+            options = self.engine_options('postgres://user@localhost/users')
+        finally:
+            self.app.config['SQLALCHEMY_PGBOUNCER'] = False
+        self.assertIs(options['poolclass'], NullPool)
+        self.assertNotIn('pool_size', options)
+        self.assertNotIn('max_overflow', options)
+
+    def test_pool_endpoint(self):
+        """Ensure the pool statistics route behaves correctly."""
+        response = self.client.get(
+            '/users/pool', headers=get_token_header(self.client))
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('success', data['status'])
+        self.assertIn('pool', data['data'])
+
+    def test_pool_endpoint_admin_only(self):
+        """Ensure pool statistics need an admin token."""
+        response = self.client.get('/users/pool')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(
+            '/users/pool', headers=get_token_header(self.client, admin=False))
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            data['message'], 'You do not have permission to do that.')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+"""Tests for the logout token denylist."""
+# services/users/project/tests/test_denylist.py
+
+import json
+import unittest
+
+from flask import Flask
+
+from project.api.denylist import BloomFilter, Denylist
+from project.api.models import User
+from project.cache import get_store
+from project.tests.base import BaseTestCase
+from project.tests.utils import FakeTimer, add_user
+
+
+class TestBloomFilter(unittest.TestCase):
+    """Test the bloom filter."""
+
+    def test_no_false_negatives(self):
+        """Ensure every added key is reported present."""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = ['key-{0}'.format(i) for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        """Ensure the false positive rate is near the configured one."""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add('key-{0}'.format(i))
+        false_positives = sum(
+            'other-{0}'.format(i) in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestDenylist(BaseTestCase):
+    """Test revoking tokens."""
+
+    def setUp(self):
+        """Create denylists for two workers sharing the store."""
+        super().setUp()
+        self.timer = FakeTimer(now=1000)
+        self.worker = Denylist(sync_seconds=0, timer=self.timer)
+        self.other_worker = Denylist(sync_seconds=0, timer=self.timer)
+
+    def test_revoke(self):
+        """Ensure a revoked id is denied until it expires."""
+        self.worker.revoke('abc', 1060)
+        self.assertTrue(self.worker.is_revoked('abc'))
+        self.assertFalse(self.worker.is_revoked('def'))
+        self.assertFalse(self.worker.is_revoked(None))
+        self.timer.now = 1060
+        self.assertFalse(self.worker.is_revoked('abc'))
+
+    def test_synchronized_across_workers(self):
+        """Ensure a revocation in one worker reaches the others."""
+        self.worker.revoke('abc', 1060)
+        self.assertTrue(self.other_worker.is_revoked('abc'))
+        self.other_worker.revoke('def', 1060)
+        self.assertTrue(self.worker.is_revoked('def'))
+
+    def test_sync_interval(self):
+        """Ensure other workers only read the store every sync_seconds."""
+        other_worker = Denylist(sync_seconds=1, timer=self.timer)
+        self.assertFalse(other_worker.is_revoked('abc'))
+        self.worker.revoke('abc', 1060)
+        self.assertFalse(other_worker.is_revoked('abc'))
+        self.timer.now += 1
+        self.assertTrue(other_worker.is_revoked('abc'))
+
+    def test_entry_written_after_number(self):
+        """Ensure a numbered entry not yet written is read on a later sync."""
+        self.worker.revoke('def', 1060)
+        self.assertTrue(self.other_worker.is_revoked('def'))
+        store = get_store(self.app)
+        seq = store.incr('denylist:seq')
+        self.assertFalse(self.other_worker.is_revoked('abc'))
+        store.set('denylist:{0}'.format(seq), b'abc 1060')
+        self.timer.now += 1
+        self.assertTrue(self.other_worker.is_revoked('abc'))
+
+    def test_missing_entry_given_up(self):
+        """Ensure a number whose entry never appears is dropped in time."""
+        self.worker.revoke('def', 1060)
+        self.other_worker.sync()
+        get_store(self.app).incr('denylist:seq')
+        self.other_worker.sync()
+        self.assertEqual(list(self.other_worker._pending), [2])
+        self.timer.now += self.other_worker.pending_seconds
+        self.other_worker.sync()
+        self.assertEqual(self.other_worker._pending, {})
+
+    def test_cold_worker_reads_live_set(self):
+        """Ensure a new worker loads live revocations, not the whole log."""
+        self.worker.revoke('abc', 1060)
+        self.worker.revoke('def', 1010)
+        store = get_store(self.app)
+        store.delete('denylist:1', 'denylist:2')
+        self.timer.now = 1020
+        worker = Denylist(sync_seconds=0, timer=self.timer)
+        self.assertTrue(worker.is_revoked('abc'))
+        self.assertFalse(worker.is_revoked('def'))
+        self.assertEqual(len(worker), 1)
+        self.assertEqual(worker._pending, {})
+
+    def test_expired_entries_pruned(self):
+        """Ensure entries are dropped once their tokens expire."""
+        denylist = Denylist(
+            sync_seconds=0, prune_seconds=0, timer=self.timer)
+        for i in range(100):
+            denylist.revoke('id-{0}'.format(i), 1010 + i)
+        self.assertEqual(len(denylist), 100)
+        self.timer.now = 1060
+        denylist.sync()
+        self.assertEqual(len(denylist), 49)
+        self.assertFalse(denylist.is_revoked('id-50'))
+        self.assertTrue(denylist.is_revoked('id-99'))
+
+    def test_expired_token_not_stored(self):
+        """Ensure a token that has already expired is not recorded."""
+        self.worker.revoke('abc', 999)
+        self.assertEqual(len(self.worker), 0)
+        self.assertFalse(self.other_worker.is_revoked('abc'))
+
+    def test_logout_denies_token(self):
+        """Ensure a logged out token is refused without database access."""
+        add_user('ben', 'ben@ben.org', '123456')
+        tokens = []
+        for _ in range(2):
+            resp_login = self.client.post(
+                '/auth/login',
+                data=json.dumps({
+                    'email': 'ben@ben.org',
+                    'password': '123456'
+                }),
+                content_type='application/json'
+            )
+            tokens.append(json.loads(resp_login.data.decode())['auth_token'])
+        self.assertNotEqual(
+            User.decode_auth_payload(tokens[0])['jti'],
+            User.decode_auth_payload(tokens[1])['jti'])
+        headers = [{'Authorization': 'Bearer {token}'.format(token=token)}
+                   for token in tokens]
+        response = self.client.get('/auth/logout', headers=headers[0])
+        self.assertEqual(response.status_code, 200)
+        with self.assertMaxQueries(0):
+            response = self.client.get('/auth/status', headers=headers[0])
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            data['message'], 'Token revoked. Please log in again.')
+        response = self.client.get('/auth/status', headers=headers[1])
+        self.assertEqual(response.status_code, 200)
+
+
+class TestDenylistConfig(unittest.TestCase):
+    """Test the settings the denylist depends on."""
+
+    def test_shared_store_required(self):
+        """Ensure a required shared store cannot be the in-memory one."""
+        app = Flask(__name__)
+        app.config['SHARED_STORE_REQUIRED'] = True
+        app.config['SHARED_STORE_URL'] = 'memory://'
+        self.assertRaises(RuntimeError, Denylist().init_app, app)
+        app.config['SHARED_STORE_URL'] = 'redis://redis:6379/0'
+        Denylist().init_app(app)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Tests for the JSON encoder and response compression."""
+# services/users/project/tests/test_encoding.py
+
+import datetime
+import gzip
+import json
+import unittest
+
+from flask import json as flask_json
+
+from project import compression, db
+from project.api.models import User
+from project.encoding import BACKENDS, FastJSONEncoder, load_backend
+from project.tests.base import BaseTestCase
+
+
+class TestFastJSONEncoder(BaseTestCase):
+    """Test the pluggable JSON encoder."""
+
+    value = {
+        'b': [1, 2.5, None, True],
+        'a': 'café "quoted"',
+        'when': datetime.datetime(2026, 10, 18, 12, 0, 0)
+    }
+
+    def test_backends_match_stdlib(self):
+        """Ensure every installed backend decodes to the stdlib result."""
+        expected = json.loads(flask_json.dumps(
+            self.value, cls=FastJSONEncoder))
+        for name in BACKENDS:
+            try:
+                backend = load_backend(name)
+            except ImportError:
+                continue
+            encoder = type('Encoder', (FastJSONEncoder,), {
+                'backend': staticmethod(backend)})
+            encoded = flask_json.dumps(self.value, cls=encoder)
+            self.assertEqual(json.loads(encoded), expected, name)
+
+    def test_app_encoder(self):
+        """Ensure the app encodes with its configured encoder."""
+        self.assertTrue(issubclass(self.app.json_encoder, FastJSONEncoder))
+        self.assertEqual(
+            json.loads(flask_json.dumps(self.value))['when'],
+            'Sun, 18 Oct 2026 12:00:00 GMT')
+
+    def test_pretty_print_uses_stdlib(self):
+        """Ensure indented output falls back to the standard encoder."""
+        encoded = flask_json.dumps({'a': 1}, indent=2)
+        self.assertEqual(encoded, '{\n  "a": 1\n}')
+
+    def test_stdlib_backend(self):
+        """Ensure the stdlib backend disables the fast path."""
+        self.assertIsNone(load_backend('stdlib'))
+
+
+class TestCompression(BaseTestCase):
+    """Test negotiated response compression."""
+
+    def setUp(self):
+        """Add enough users for the listing to be compressed."""
+        super().setUp()
+        db.session.execute(User.__table__.insert(), [
+            {
+                'username': 'user{}'.format(i),
+                'email': 'user{}@example.com'.format(i),
+                'password': 'x',
+                'active': True,
+                'admin': False
+            }
+            for i in range(50)
+        ])
+        db.session.commit()
+
+    def test_gzip(self):
+        """Ensure large responses are gzipped for clients that accept it."""
+        plain = self.client.get('/users')
+        response = self.client.get(
+            '/users', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+
+    def test_identity(self):
+        """Ensure clients that do not ask get the plain body."""
+        response = self.client.get('/users')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        json.loads(response.data.decode())
+        response = self.client.get(
+            '/users', headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_small_responses_not_compressed(self):
+        """Ensure responses below the size threshold are left alone."""
+        response = self.client.get(
+            '/users/ping', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_weak_etag(self):
+        """Ensure compressed responses carry a weak, still usable ETag."""
+        response = self.client.get(
+            '/users', headers={'Accept-Encoding': 'gzip'})
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        response = self.client.get(
+            '/users',
+            headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    @unittest.skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        """Ensure brotli is preferred when the client accepts it."""
+        plain = self.client.get('/users')
+        response = self.client.get(
+            '/users', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(
+            compression.brotli.decompress(response.data), plain.data)
+        response = self.client.get(
+            '/users', headers={'Accept-Encoding': 'gzip, br;q=0.5'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""Tests for the streaming user export."""
+# services/users/project/tests/test_export.py
+
+import csv
+import gzip
+import io
+import json
+import unittest
+
+from project import db
+from project.api import export
+from project.api.models import User
+from project.tests.base import BaseTestCase
+from project.tests.utils import get_token_header
+
+
+class TestExport(BaseTestCase):
+    """Tests for GET /users/export."""
+
+    def setUp(self):
+        """Add users to export."""
+        super().setUp()
+        db.session.execute(User.__table__.insert(), [
+            {
+                'username': 'user{}'.format(i),
+                'email': 'user{}@example.com'.format(i),
+                'password': 'x',
+                'active': True,
+                'admin': False
+            }
+            for i in range(25)
+        ])
+        db.session.commit()
+
+    def test_ndjson(self):
+        """Ensure every user is streamed as one JSON object per line."""
+        response = self.client.get(
+            '/users/export', headers=get_token_header(self.client))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        users = [json.loads(line)
+                 for line in response.data.decode().splitlines()]
+        self.assertEqual(len(users), 26)
+        self.assertEqual(users[0]['username'], 'user0')
+        self.assertEqual(
+            sorted(users[0]), sorted(export.EXPORT_COLUMNS))
+        self.assertNotIn('password', users[0])
+
+    def test_csv(self):
+        """Ensure CSV has a header and a row for every user."""
+        response = self.client.get(
+            '/users/export?format=csv', headers=get_token_header(self.client))
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn('users.csv', response.headers['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+        self.assertEqual(len(rows), 26)
+        self.assertEqual(rows[-1]['email'], 'admin@admin.org')
+        self.assertEqual(rows[-1]['admin'], 'True')
+
+    def test_gzip(self):
+        """Ensure the export is gzipped on the fly when accepted."""
+        headers = get_token_header(self.client)
+        plain = self.client.get('/users/export', headers=headers)
+        headers['Accept-Encoding'] = 'gzip'
+        response = self.client.get('/users/export', headers=headers)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+
+    def test_not_admin(self):
+        """Ensure only admins may export."""
+        response = self.client.get(
+            '/users/export',
+            headers=get_token_header(self.client, admin=False))
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            data['message'], 'You do not have permission to do that.')
+
+    def test_no_token(self):
+        """Ensure the export requires a token."""
+        response = self.client.get('/users/export')
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_format(self):
+        """Ensure unknown formats are refused."""
+        response = self.client.get(
+            '/users/export?format=xml', headers=get_token_header(self.client))
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['message'], 'Invalid export format.')
+
+    def test_batches(self):
+        """Ensure rows are written a batch at a time."""
+        chunks = list(export.export_users('ndjson', batch_size=10))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [10, 10, 5])
+        chunks = list(export.export_users('csv', batch_size=10))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [11, 10, 5])
+
+    def test_empty(self):
+        """Ensure an empty table exports only the CSV header."""
+        db.session.execute(User.__table__.delete())
+        self.assertEqual(''.join(export.export_users('csv')),
+                         ','.join(export.EXPORT_COLUMNS) + '\n')
+        self.assertEqual(''.join(export.export_users('ndjson')), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
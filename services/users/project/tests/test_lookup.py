@@ -0,0 +1,109 @@
+"""Tests for the batch user lookup endpoints."""
+# services/users/project/tests/test_lookup.py
+
+import json
+import unittest
+
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+
+class TestUserLookup(BaseTestCase):
+    """Tests for GET /users?ids= and POST /users/lookup."""
+
+    def setUp(self):
+        """Add users to look up."""
+        super().setUp()
+        self.ids = [
+            add_user('michael', 'michael@mherman.org', 'greaterthaneight').id,
+            add_user('fletcher', 'fletcher@notreal.com', 'greaterthaneight').id
+        ]
+
+    def get(self, ids):
+        """Look up ids given as a query string value."""
+        response = self.client.get('/users?ids=' + ids)
+        return response, json.loads(response.data.decode())
+
+    def post(self, body):
+        """Look up ids given in a JSON body."""
+        response = self.client.post(
+            '/users/lookup',
+            data=json.dumps(body),
+            content_type='application/json'
+        )
+        return response, json.loads(response.data.decode())
+
+    def usernames(self, data):
+        """Return the username at each position, or None if missing."""
+        return [user and user['username'] for user in data['data']['users']]
+
+    def test_get_request_order(self):
+        """Ensure users come back in the order asked for."""
+        first, second = self.ids
+        response, data = self.get('{0},{1}'.format(second, first))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(self.usernames(data), ['fletcher', 'michael'])
+        self.assertEqual(data['data']['missing'], [])
+        self.assertNotIn('password', data['data']['users'][0])
+
+    def test_get_missing(self):
+        """Ensure unknown ids keep their place and are listed as missing."""
+        first, second = self.ids
+        response, data = self.get('999,{0},{0}'.format(first))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.usernames(data), [None, 'michael', 'michael'])
+        self.assertEqual(data['data']['missing'], [999])
+
+    def test_get_invalid(self):
+        """Ensure ids that are not integers are refused."""
+        for ids in ('', 'a,b', '1,,x', '0', '-1', '99999999999'):
+            response, data = self.get(ids)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data['message'], 'Invalid ids.')
+
+    def test_post(self):
+        """Ensure a JSON body of ids resolves like the query string."""
+        first, second = self.ids
+        response, data = self.post({'ids': [second, 999, first]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.usernames(data), ['fletcher', None, 'michael'])
+        self.assertEqual(data['data']['missing'], [999])
+
+    def test_post_invalid(self):
+        """Ensure a body without a list of integer ids is refused."""
+        for body in ({}, {'ids': []}, {'ids': '1,2'}, {'ids': [1, 'a']},
+                     {'ids': [True]}, [1, 2], {'ids': [1, 2 ** 31]},
+                     {'ids': [0]}):
+            response, data = self.post(body)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data['message'], 'Invalid ids.')
+
+    def test_limit(self):
+        """Ensure a request for more than the limit is refused."""
+        max_ids = self.app.config['USERS_LOOKUP_MAX']
+        response, data = self.post({'ids': list(range(1, max_ids + 2))})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            data['message'],
+            'Too many ids; at most {0} per request.'.format(max_ids))
+        response, data = self.post({'ids': list(range(1, max_ids + 1))})
+        self.assertEqual(response.status_code, 200)
+
+    def test_single_query(self):
+        """Ensure any number of ids is resolved with one query."""
+        with self.assertMaxQueries(1):
+            response, data = self.post({'ids': list(range(1, 501))})
+        self.assertEqual(len(data['data']['users']), 500)
+        self.assertEqual(len(data['data']['missing']), 498)
+
+    def test_get_reflects_changes(self):
+        """Ensure a cached lookup is invalidated when a user is added."""
+        self.get('3')
+        add_user('ross100', 'ross@100percent.com', 'greaterthaneight')
+        response, data = self.get('3')
+        self.assertEqual(self.usernames(data), ['ross100'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""Tests for the Prometheus metrics endpoint."""
+# services/users/project/tests/test_metrics.py
+
+import json
+import unittest
+
+from prometheus_client import REGISTRY
+
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+
+def sample(name, **labels):
+    """Return the current value of a sample in the default registry."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(BaseTestCase):
+    """Tests for request, database, bcrypt and JWT metrics."""
+
+    def test_metrics_endpoint(self):
+        """Ensure metrics are served in the Prometheus text format."""
+        self.client.get('/users/ping')
+        response = self.client.get('/users/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('text/plain', response.content_type)
+        body = response.data.decode()
+        self.assertIn('users_http_requests_total{', body)
+        self.assertIn('endpoint="users.ping_pong"', body)
+        self.assertIn('users_http_request_duration_seconds_bucket{', body)
+
+    def test_request_counts(self):
+        """Ensure requests are counted by route and status."""
+        before = sample('users_http_requests_total',
+                        endpoint='users.get_single_user', method='GET',
+                        status='404')
+        self.client.get('/users/999')
+        self.assertEqual(
+            sample('users_http_requests_total',
+                   endpoint='users.get_single_user', method='GET',
+                   status='404'),
+            before + 1)
+
+    def test_unhandled_exception_counted(self):
+        """Ensure a request that raises is counted as a 500."""
+        def fail():
+            raise RuntimeError('boom')
+        view = self.app.view_functions['users.ping_pong']
+        self.app.view_functions['users.ping_pong'] = fail
+        before = sample('users_http_requests_total',
+                        endpoint='users.ping_pong', method='GET',
+                        status='500')
+        try:
+            with self.assertRaises(RuntimeError):
+                self.client.get('/users/ping')
+        finally:
+            self.app.view_functions['users.ping_pong'] = view
+        self.assertEqual(
+            sample('users_http_requests_total',
+                   endpoint='users.ping_pong', method='GET', status='500'),
+            before + 1)
+
+    def test_db_queries_per_request(self):
+        """Ensure database queries are counted per request."""
+        before = sample('users_db_queries_per_request_sum',
+                        endpoint='users.get_all_users')
+        self.client.get('/users')
+        self.assertEqual(
+            sample('users_db_queries_per_request_sum',
+                   endpoint='users.get_all_users'),
+            before + 2)
+
+    def test_bcrypt_durations(self):
+        """Ensure bcrypt hashing and verification are timed."""
+        hashes = sample('users_bcrypt_duration_seconds_count',
+                        operation='hash')
+        verifies = sample('users_bcrypt_duration_seconds_count',
+                          operation='verify')
+        add_user('ben', 'ben@ben.org', '123456')
+        self.client.post(
+            '/auth/login',
+            data=json.dumps({'email': 'ben@ben.org', 'password': '123456'}),
+            content_type='application/json'
+        )
+        self.assertEqual(
+            sample('users_bcrypt_duration_seconds_count', operation='hash'),
+            hashes + 1)
+        self.assertEqual(
+            sample('users_bcrypt_duration_seconds_count',
+                   operation='verify'),
+            verifies + 1)
+
+    def test_jwt_failures(self):
+        """Ensure JWT decode failures are counted by reason."""
+        before = sample('users_jwt_decode_failures_total',
+                        reason='DecodeError')
+        self.client.get(
+            '/auth/status', headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(
+            sample('users_jwt_decode_failures_total', reason='DecodeError'),
+            before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
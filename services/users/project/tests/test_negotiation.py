@@ -0,0 +1,113 @@
+"""Tests for MessagePack response negotiation."""
+# services/users/project/tests/test_negotiation.py
+
+import gzip
+import json
+import unittest
+
+from project import db, negotiation
+from project.api.models import User
+from project.tests.base import BaseTestCase
+
+MSGPACK = {'Accept': 'application/msgpack'}
+
+
+class TestMessagePack(BaseTestCase):
+    """Test answering in MessagePack for clients that ask for it."""
+
+    def setUp(self):
+        """Add users to list."""
+        super().setUp()
+        db.session.execute(User.__table__.insert(), [
+            {
+                'username': 'user{}'.format(i),
+                'email': 'user{}@example.com'.format(i),
+                'password': 'x',
+                'active': True,
+                'admin': False
+            }
+            for i in range(50)
+        ])
+        db.session.commit()
+
+    def unpack(self, response):
+        """Decode a MessagePack response body."""
+        self.assertEqual(response.mimetype, 'application/msgpack')
+        return negotiation.msgpack.unpackb(response.data, raw=False)
+
+    def test_listing(self):
+        """Ensure the listing has the same envelope in both formats."""
+        expected = json.loads(self.client.get('/users').data.decode())
+        response = self.client.get('/users', headers=MSGPACK)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.unpack(response), expected)
+        self.assertIn('Accept', response.headers['Vary'])
+
+    def test_pages_and_lookups(self):
+        """Ensure packed pages and lookups match their JSON bodies."""
+        for path in ('/users?limit=10&after=5', '/users?ids=3,999,1',
+                     '/users/2'):
+            expected = json.loads(self.client.get(path).data.decode())
+            response = self.client.get(path, headers=MSGPACK)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(self.unpack(response), expected, path)
+            self.assertIn('Accept', response.headers['Vary'])
+
+    def test_json_preferred(self):
+        """Ensure JSON is kept unless MessagePack is preferred."""
+        for accept in ('*/*', 'application/json',
+                       'application/json, application/msgpack;q=0.5'):
+            response = self.client.get('/users', headers={'Accept': accept})
+            self.assertEqual(response.mimetype, 'application/json', accept)
+        response = self.client.get('/users', headers={
+            'Accept': 'application/json;q=0.5, application/x-msgpack'})
+        self.assertEqual(response.mimetype, 'application/msgpack')
+
+    def test_auth_error(self):
+        """Ensure error envelopes from auth routes are re-encoded too."""
+        response = self.client.post(
+            '/auth/login',
+            data=json.dumps({'email': 'nobody@example.com', 'password': 'x'}),
+            content_type='application/json',
+            headers=MSGPACK
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.unpack(response), {
+            'status': 'fail',
+            'message': 'User does not exist.'
+        })
+
+    def test_etag_per_format(self):
+        """Ensure each format has its own ETag and cached entry."""
+        json_response = self.client.get('/users/1')
+        response = self.client.get('/users/1', headers=MSGPACK)
+        self.assertEqual(self.unpack(response)['data']['username'], 'user0')
+        self.assertNotEqual(response.headers['ETag'],
+                            json_response.headers['ETag'])
+        response = self.client.get('/users/1', headers=dict(
+            MSGPACK, **{'If-None-Match': response.headers['ETag']}))
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/users/1', headers=dict(
+            MSGPACK, **{'If-None-Match': json_response.headers['ETag']}))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/users/1')
+        self.assertEqual(response.mimetype, 'application/json')
+
+    def test_compressed(self):
+        """Ensure MessagePack bodies are compressed like JSON ones."""
+        plain = self.client.get('/users', headers=MSGPACK)
+        response = self.client.get('/users', headers=dict(
+            MSGPACK, **{'Accept-Encoding': 'gzip'}))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+
+    def test_stream_stays_json(self):
+        """Ensure a streamed listing is still sent as JSON."""
+        response = self.client.get('/users?stream=1', headers=MSGPACK)
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(
+            len(json.loads(response.data.decode())['data']['users']), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+"""Tests for the password hashing pool."""
+# services/users/project/tests/test_passwords.py
+
+import json
+import unittest
+
+from project import db
+from project.api.auth import rehash_password
+from project.api.models import User
+from project.api.passwords import (
+    PasswordPool, PoolSaturated, bulk_pool, calibrate, hash_rounds,
+    password_pool
+)
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+
+class TestPasswordPool(unittest.TestCase):
+    """Test hashing and verification through the pool."""
+
+    def test_inline_hash_and_check(self):
+        """Ensure an inline pool hashes and verifies passwords."""
+        pool = PasswordPool(size=0)
+        pw_hash = pool.hash('123456', 4)
+        self.assertTrue(pw_hash.startswith('$2b$04$'))
+        self.assertTrue(pool.check(pw_hash, '123456'))
+        self.assertFalse(pool.check(pw_hash, '654321'))
+
+    def test_process_pool_hash_and_check(self):
+        """Ensure work submitted to pool processes returns results."""
+        pool = PasswordPool(size=1)
+        try:
+            pw_hash = pool.hash('123456', 4)
+            self.assertTrue(pool.check(pw_hash, '123456'))
+        finally:
+            pool.shutdown()
+
+    def test_empty_password(self):
+        """Ensure an empty password is refused."""
+        pool = PasswordPool()
+        self.assertRaises(ValueError, pool.hash, '', 4)
+        self.assertRaises(ValueError, pool.hash, None, 4)
+        self.assertFalse(pool.check('$2b$04$', None))
+
+    def test_saturated(self):
+        """Ensure work beyond the pending limit is rejected."""
+        pool = PasswordPool(size=0, max_pending=0)
+        pool._slots.acquire()
+        self.assertRaises(PoolSaturated, pool.hash, '123456', 4)
+        pool._slots.release()
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+    def test_timeout_holds_slot(self):
+        """Ensure a timed-out task keeps its slot until it finishes."""
+        pool = PasswordPool(size=1, max_pending=0, timeout=0.001)
+        try:
+            self.assertRaises(PoolSaturated, pool.hash, '123456', 12)
+            self.assertRaises(PoolSaturated, pool.hash, '123456', 4)
+            self.assertEqual(pool.stats()['rejected'], 2)
+            self.assertTrue(pool._slots.acquire(timeout=30))
+            pool._slots.release()
+        finally:
+            pool.shutdown()
+
+    def test_hash_many(self):
+        """Ensure a batch is hashed across the pool processes in order."""
+        pool = PasswordPool(size=2)
+        try:
+            hashes = pool.hash_many(['a', 'b', 'c'], 4)
+            self.assertEqual(len(hashes), 3)
+            self.assertTrue(pool.check(hashes[2], 'c'))
+            self.assertFalse(pool.check(hashes[2], 'a'))
+        finally:
+            pool.shutdown()
+
+    def test_hash_many_timeout(self):
+        """Ensure a batch that runs past the timeout is rejected."""
+        pool = PasswordPool(size=1, max_pending=0, timeout=0.001)
+        try:
+            self.assertRaises(
+                PoolSaturated, pool.hash_many, ['a', 'b'], 12)
+            self.assertRaises(PoolSaturated, pool.hash_many, ['a'], 4)
+            self.assertTrue(pool._slots.acquire(timeout=30))
+            pool._slots.release()
+        finally:
+            pool.shutdown()
+
+    def test_bulk_pool_is_separate(self):
+        """Ensure bulk imports do not take slots from logins."""
+        self.assertIsNot(bulk_pool, password_pool)
+
+    def test_stats(self):
+        """Ensure timings are recorded for each kind of work."""
+        pool = PasswordPool()
+        pw_hash = pool.hash('123456', 4)
+        pool.check(pw_hash, '123456')
+        stats = pool.stats()
+        self.assertEqual(stats['hash']['count'], 1)
+        self.assertEqual(stats['verify']['count'], 1)
+        self.assertGreater(stats['hash']['seconds'], 0)
+        self.assertGreaterEqual(
+            stats['hash']['max_seconds'], stats['hash']['seconds'])
+
+
+class TestPasswordPoolRoutes(BaseTestCase):
+    """Test how routes behave when the pool is saturated."""
+
+    def setUp(self):
+        """Saturate the application's password pool."""
+        super().setUp()
+        self.slots = password_pool.max_pending + 1
+        for _ in range(self.slots):
+            password_pool._slots.acquire()
+
+    def tearDown(self):
+        """Release the password pool."""
+        for _ in range(self.slots):
+            password_pool._slots.release()
+        super().tearDown()
+
+    def test_register_saturated(self):
+        """Ensure registration is rejected with 503 when saturated."""
+        response = self.client.post(
+            '/auth/register',
+            data=json.dumps({
+                'username': 'ben',
+                'email': 'ben@ben.org',
+                'password': '123456'
+            }),
+            content_type='application/json'
+        )
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertIn('fail', data['status'])
+
+    def test_ping_not_blocked(self):
+        """Ensure cheap endpoints still answer when saturated."""
+        response = self.client.get('/users/ping')
+        self.assertEqual(response.status_code, 200)
+
+
+class TestCalibration(unittest.TestCase):
+    """Test choosing and reading the bcrypt cost."""
+
+    def test_hash_rounds(self):
+        """Ensure the cost is read from a stored hash."""
+        self.assertEqual(hash_rounds(PasswordPool().hash('123456', 5)), 5)
+        self.assertEqual(hash_rounds('$2b$12$' + 'x' * 53), 12)
+        self.assertIsNone(hash_rounds('not a hash'))
+        self.assertIsNone(hash_rounds(None))
+
+    def test_calibrate(self):
+        """Ensure the cost chosen is the last one within the target."""
+        rounds, timings = calibrate(60, max_rounds=6)
+        self.assertEqual(rounds, 6)
+        self.assertEqual(sorted(timings), [4, 5, 6])
+        rounds, timings = calibrate(0, max_rounds=6)
+        self.assertEqual(rounds, 4)
+        self.assertEqual(sorted(timings), [4])
+
+
+class TestRehashOnLogin(BaseTestCase):
+    """Test upgrading stored hashes when the configured cost changes."""
+
+    def setUp(self):
+        """Add a user hashed with the old cost."""
+        super().setUp()
+        add_user('test', 'test@test.com', 'test')
+        self.rounds = self.app.config['BCRYPT_LOG_ROUNDS']
+        self.app.config['BCRYPT_LOG_ROUNDS'] = self.rounds + 1
+
+    def tearDown(self):
+        """Restore the configured cost."""
+        self.app.config['BCRYPT_LOG_ROUNDS'] = self.rounds
+        super().tearDown()
+
+    def login(self, password='test'):
+        """Log the user in."""
+        return self.client.post(
+            '/auth/login',
+            data=json.dumps({'email': 'test@test.com', 'password': password}),
+            content_type='application/json'
+        )
+
+    def stored_rounds(self):
+        """Return the cost of the stored hash."""
+        db.session.remove()
+        return hash_rounds(User.query.first().password)
+
+    def test_rehash(self):
+        """Ensure a successful login stores the hash with the new cost."""
+        self.assertEqual(self.stored_rounds(), self.rounds)
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.stored_rounds(), self.rounds + 1)
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_no_rehash_on_failed_login(self):
+        """Ensure a wrong password leaves the hash alone."""
+        self.assertEqual(self.login('wrong').status_code, 404)
+        self.assertEqual(self.stored_rounds(), self.rounds)
+
+    def test_no_rehash_when_saturated(self):
+        """Ensure a saturated pool skips the rehash instead of failing."""
+        user = User.query.first()
+        slots = password_pool.max_pending + 1
+        for _ in range(slots):
+            password_pool._slots.acquire()
+        try:
+            rehash_password(user, 'test')
+        finally:
+            for _ in range(slots):
+                password_pool._slots.release()
+        self.assertEqual(self.stored_rounds(), self.rounds)
+
+    def test_no_write_at_configured_cost(self):
+        """Ensure a hash already at the configured cost is not rewritten."""
+        self.login()
+        with self.assertMaxQueries(1):
+            self.assertEqual(self.login().status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
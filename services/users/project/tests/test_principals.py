@@ -0,0 +1,250 @@
+"""Tests for the principal cache."""
+# services/users/project/tests/test_principals.py
+
+import json
+import unittest
+
+from project import db
+from project.api.models import User
+from project.api.principals import (
+    Principal, PrincipalCache, RevocationView, get_principal, principals,
+    revocations
+)
+from project.tests.base import BaseTestCase
+from project.tests.utils import FakeTimer, add_user
+
+
+class TestPrincipalCache(unittest.TestCase):
+    """Test the LRU/TTL behaviour of the cache."""
+
+    def test_get_set(self):
+        """Ensure a cached principal is returned."""
+        cache = PrincipalCache()
+        cache.set(Principal(1, True, False))
+        self.assertEqual(cache.get(1), Principal(1, True, False))
+        self.assertIsNone(cache.get(2))
+
+    def test_expiry(self):
+        """Ensure entries expire after the TTL."""
+        timer = FakeTimer()
+        cache = PrincipalCache(ttl=10, timer=timer)
+        cache.set(Principal(1, True, False))
+        timer.now = 9
+        self.assertIsNotNone(cache.get(1))
+        timer.now = 10
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        """Ensure the least recently used entry is evicted."""
+        cache = PrincipalCache(maxsize=2)
+        cache.set(Principal(1, True, False))
+        cache.set(Principal(2, True, False))
+        cache.get(1)
+        cache.set(Principal(3, True, False))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(3))
+
+    def test_invalidate(self):
+        """Ensure an entry can be invalidated."""
+        cache = PrincipalCache()
+        cache.set(Principal(1, True, False))
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1))
+
+
+class TestGetPrincipal(BaseTestCase):
+    """Test loading principals through the cache."""
+
+    def test_get_principal(self):
+        """Ensure a principal is loaded and cached."""
+        user = add_user('ben', 'ben@ben.org', '123456')
+        self.assertIsNone(principals.get(user.id))
+        principal = get_principal(user.id)
+        self.assertEqual(principal, Principal(user.id, True, False))
+        self.assertEqual(
+            principals.get(user.id, principals.generation(user.id)),
+            principal)
+
+    def test_get_principal_missing(self):
+        """Ensure a missing user is not cached."""
+        self.assertIsNone(get_principal(999))
+        self.assertEqual(len(principals), 0)
+
+    def test_update_invalidates(self):
+        """Ensure changing a user row invalidates the cached principal."""
+        user = add_user('ben', 'ben@ben.org', '123456')
+        get_principal(user.id)
+        user.admin = True
+        db.session.commit()
+        self.assertIsNone(principals.get(user.id))
+        self.assertTrue(get_principal(user.id).admin)
+
+    def test_invalidation_reaches_other_workers(self):
+        """Ensure a change in one worker invalidates every worker's cache."""
+        other_worker = PrincipalCache(store=principals.store)
+        user = add_user('ben', 'ben@ben.org', '123456')
+        other_worker.set(get_principal(user.id),
+                         other_worker.generation(user.id))
+        user.active = False
+        db.session.commit()
+        self.assertIsNone(
+            other_worker.get(user.id, other_worker.generation(user.id)))
+        other_worker.set(get_principal(user.id),
+                         other_worker.generation(user.id))
+        principals.clear()
+        self.assertIsNone(
+            other_worker.get(user.id, other_worker.generation(user.id)))
+
+    def test_deactivated_user_is_rejected(self):
+        """Ensure a cached user that is deactivated loses access."""
+        add_user('ben', 'ben@ben.org', '123456')
+        resp_login = self.client.post(
+            '/auth/login',
+            data=json.dumps({'email': 'ben@ben.org', 'password': '123456'}),
+            content_type='application/json'
+        )
+        token = json.loads(resp_login.data.decode())['auth_token']
+        headers = {'Authorization': 'Bearer {token}'.format(token=token)}
+        response = self.client.get('/auth/status', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        user = User.query.filter_by(email='ben@ben.org').first()
+        user.active = False
+        db.session.commit()
+        response = self.client.get('/auth/status', headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+
+class TestRevocationView(BaseTestCase):
+    """Test the view of revoked token generations."""
+
+    def test_generation_bumped_on_role_change(self):
+        """Ensure changing active or admin bumps the token generation."""
+        user = add_user('ben', 'ben@ben.org', '123456')
+        self.assertEqual(user.token_generation, 0)
+        user.username = 'benjamin'
+        db.session.commit()
+        self.assertEqual(user.token_generation, 0)
+        user.admin = True
+        db.session.commit()
+        self.assertEqual(user.token_generation, 1)
+        user.active = False
+        db.session.commit()
+        self.assertEqual(user.token_generation, 2)
+        self.assertEqual(revocations.generation(user.id), 2)
+
+    def test_refresh(self):
+        """Ensure the view only holds revoked users and reloads."""
+        timer = FakeTimer()
+        view = RevocationView(refresh_seconds=5, timer=timer)
+        first = add_user('ben', 'ben@ben.org', '123456')
+        second = add_user('jim', 'jim@jim.org', '123456')
+        self.assertEqual(view.generation(first.id), 0)
+        self.assertEqual(len(view), 0)
+        db.session.execute(
+            User.__table__.update().where(User.__table__.c.id == second.id)
+            .values(token_generation=3))
+        db.session.commit()
+        self.assertEqual(view.generation(second.id), 0)
+        timer.now = 5
+        self.assertEqual(view.generation(second.id), 3)
+        self.assertEqual(len(view), 1)
+
+
+class TestStatelessClaims(BaseTestCase):
+    """Test authorizing from the claims in stateless tokens."""
+
+    def setUp(self):
+        """Enable stateless claims."""
+        super().setUp()
+        self.app.config['JWT_STATELESS_CLAIMS'] = True
+
+    def tearDown(self):
+        """Disable stateless claims."""
+        self.app.config['JWT_STATELESS_CLAIMS'] = False
+        super().tearDown()
+
+    def login(self, admin=False):
+        """Add a user, log in and return the auth headers."""
+        user = add_user('ben', 'ben@ben.org', '123456')
+        if admin:
+            user.admin = True
+            db.session.commit()
+        resp_login = self.client.post(
+            '/auth/login',
+            data=json.dumps({'email': 'ben@ben.org', 'password': '123456'}),
+            content_type='application/json'
+        )
+        token = json.loads(resp_login.data.decode())['auth_token']
+        return {'Authorization': 'Bearer {token}'.format(token=token)}
+
+    def test_token_claims(self):
+        """Ensure tokens carry the admin, active and generation claims."""
+        self.login(admin=True)
+        user = User.query.filter_by(email='ben@ben.org').first()
+        token = User.encode_auth_token(
+            user.id, user.admin, user.active, user.token_generation)
+        payload = User.decode_auth_payload(token)
+        self.assertEqual(payload['sub'], user.id)
+        self.assertTrue(payload['adm'])
+        self.assertTrue(payload['act'])
+        self.assertEqual(payload['gen'], 1)
+
+    def add_user(self, headers):
+        """POST an incomplete user, which only needs authorization."""
+        return self.client.post(
+            '/users',
+            data=json.dumps({'username': 'jim', 'email': 'jim@jim.org'}),
+            content_type='application/json',
+            headers=headers
+        )
+
+    def test_authorize_without_queries(self):
+        """Ensure protected routes authorize with no database access."""
+        headers = self.login(admin=True)
+        revocations.generation(0)
+        with self.assertMaxQueries(0):
+            response = self.add_user(headers)
+        self.assertEqual(response.status_code, 400)
+        with self.assertMaxQueries(0):
+            response = self.client.get('/auth/logout', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(principals), 0)
+
+    def test_role_change_revokes(self):
+        """Ensure demoting or deactivating a user revokes their tokens."""
+        headers = self.login(admin=True)
+        self.assertEqual(self.add_user(headers).status_code, 400)
+        user = User.query.filter_by(email='ben@ben.org').first()
+        user.admin = False
+        db.session.commit()
+        response = self.add_user(headers)
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data['message'], 'Provide a valid auth token.')
+
+    def test_revoked_in_other_worker(self):
+        """Ensure a bump made elsewhere applies once the view refreshes."""
+        headers = self.login()
+        revocations.generation(0)
+        db.session.execute(User.__table__.update().values(token_generation=1))
+        db.session.commit()
+        response = self.client.get('/auth/status', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        revocations.clear()
+        response = self.client.get('/auth/status', headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+    def test_stateful_tokens_still_accepted(self):
+        """Ensure tokens without claims fall back to the database."""
+        self.app.config['JWT_STATELESS_CLAIMS'] = False
+        headers = self.login()
+        self.app.config['JWT_STATELESS_CLAIMS'] = True
+        response = self.client.get('/auth/logout', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(principals), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
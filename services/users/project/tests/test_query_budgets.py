@@ -0,0 +1,148 @@
+"""Per-endpoint SQL query budgets."""
+# services/users/project/tests/test_query_budgets.py
+
+import json
+import unittest
+
+from project.api.principals import principals
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user, get_token_header
+
+
+class TestQueryBudgets(BaseTestCase):
+    """Lock in the number of database round trips for every route."""
+
+    def post_json(self, url, data, headers=None):
+        """POST a JSON body."""
+        return self.client.post(
+            url, data=json.dumps(data), content_type='application/json',
+            headers=headers)
+
+    def test_ping(self):
+        """GET /users/ping never touches the database."""
+        with self.assertMaxQueries(0):
+            self.client.get('/users/ping')
+
+    def test_pool_stats(self):
+        """GET /users/pool only loads the principal."""
+        headers = get_token_header(self.client)
+        principals.clear()
+        with self.assertMaxQueries(1):
+            self.client.get('/users/pool', headers=headers)
+
+    def test_all_users(self):
+        """GET /users is a version check plus one query for the rows."""
+        for i in range(5):
+            add_user('user{}'.format(i), 'user{}@ben.org'.format(i), '1')
+        with self.assertMaxQueries(2):
+            response = self.client.get('/users')
+        with self.assertMaxQueries(2):
+            self.client.get('/users?limit=2&after=1')
+        # Revalidating an unchanged listing only runs the version check
+        with self.assertMaxQueries(1):
+            self.client.get(
+                '/users', headers={'If-None-Match': response.headers['ETag']})
+
+    def test_single_user(self):
+        """GET /users/<id> is one query."""
+        url = '/users/{}'.format(add_user('ben', 'ben@ben.org', '1').id)
+        with self.assertMaxQueries(1):
+            self.client.get(url)
+
+    def test_add_user(self):
+        """POST /users loads the principal once and inserts once."""
+        headers = get_token_header(self.client)
+        principals.clear()
+        with self.assertMaxQueries(2):
+            response = self.post_json('/users', {
+                'username': 'ben',
+                'email': 'ben@ben.org',
+                'password': '123456'
+            }, headers)
+        self.assertEqual(response.status_code, 201)
+        # The principal is now cached
+        with self.assertMaxQueries(1):
+            self.post_json('/users', {
+                'username': 'jim',
+                'email': 'jim@ben.org',
+                'password': '123456'
+            }, headers)
+
+    def test_bulk_add_users(self):
+        """POST /users/bulk costs a fixed number of queries per batch."""
+        headers = get_token_header(self.client)
+        principals.clear()
+        body = '\n'.join(json.dumps({
+            'username': 'user{}'.format(i),
+            'email': 'user{}@ben.org'.format(i),
+            'password': '123456'
+        }) for i in range(10))
+        with self.assertMaxQueries(4):
+            self.client.post(
+                '/users/bulk', data=body,
+                content_type='application/x-ndjson', headers=headers)
+
+    def test_index(self):
+        """GET / is one query; the form POST adds one insert."""
+        with self.assertMaxQueries(1):
+            self.client.get('/')
+        with self.assertMaxQueries(2):
+            self.client.post('/', data=dict(
+                username='ben', email='ben@ben.org', password='123'))
+
+    def test_register(self):
+        """POST /auth/register is a single insert."""
+        with self.assertMaxQueries(1):
+            response = self.post_json('/auth/register', {
+                'username': 'ben',
+                'email': 'ben@ben.org',
+                'password': '123456'
+            })
+        self.assertEqual(response.status_code, 201)
+        # A conflict costs one more query to name the column
+        with self.assertMaxQueries(2):
+            self.post_json('/auth/register', {
+                'username': 'ben',
+                'email': 'ben@ben.org',
+                'password': '123456'
+            })
+
+    def test_login(self):
+        """POST /auth/login is one query."""
+        add_user('ben', 'ben@ben.org', '123456')
+        with self.assertMaxQueries(1):
+            self.post_json('/auth/login', {
+                'email': 'ben@ben.org',
+                'password': '123456'
+            })
+
+    def test_logout(self):
+        """GET /auth/logout only loads the principal."""
+        headers = get_token_header(self.client, admin=False)
+        principals.clear()
+        with self.assertMaxQueries(1):
+            self.client.get('/auth/logout', headers=headers)
+        with self.assertMaxQueries(0):
+            response = self.client.get('/auth/logout', headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+    def test_status(self):
+        """GET /auth/status loads the principal and the user."""
+        headers = get_token_header(self.client, admin=False)
+        principals.clear()
+        with self.assertMaxQueries(2):
+            self.client.get('/auth/status', headers=headers)
+        with self.assertMaxQueries(1):
+            self.client.get('/auth/status', headers=headers)
+
+    def test_budget_failure_lists_sql(self):
+        """Ensure an exceeded budget fails with the offending SQL."""
+        with self.assertRaises(AssertionError) as context:
+            with self.assertMaxQueries(0):
+                self.client.get('/users')
+        self.assertIn('2 queries executed, at most 0', str(context.exception))
+        self.assertIn('FROM users', str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
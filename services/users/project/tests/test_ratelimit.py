@@ -0,0 +1,164 @@
+"""Tests for the password endpoint rate limits."""
+# services/users/project/tests/test_ratelimit.py
+
+import json
+import unittest
+
+from flask import Flask
+
+from project.api import ratelimit
+from project.api.ratelimit import take
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+
+class TestTake(unittest.TestCase):
+    """Test the token bucket arithmetic."""
+
+    def test_full_bucket(self):
+        """Ensure a new bucket allows a burst and then refuses."""
+        state = None
+        for _ in range(3):
+            allowed, state, retry_after = take(state, 100, 1.0, 3)
+            self.assertTrue(allowed)
+            self.assertEqual(retry_after, 0)
+        allowed, state, retry_after = take(state, 100, 1.0, 3)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 1)
+
+    def test_refill(self):
+        """Ensure tokens come back at the rate, up to the burst."""
+        allowed, state, retry_after = take((0, 100), 105, 0.1, 5)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 5)
+        allowed, state, retry_after = take((0, 100), 110, 0.1, 5)
+        self.assertTrue(allowed)
+        allowed, state, retry_after = take((0, 100), 1000, 0.1, 5)
+        self.assertEqual(state, (4, 1000))
+
+    def test_check_only(self):
+        """Ensure a cost of zero checks the bucket without taking."""
+        allowed, state, retry_after = take((1, 100), 100, 1.0, 3, cost=0)
+        self.assertTrue(allowed)
+        self.assertEqual(state, (1, 100))
+        allowed, state, retry_after = take((0, 100), 100, 1.0, 3, cost=0)
+        self.assertFalse(allowed)
+
+    def test_shared_store_required(self):
+        """Ensure limits refuse a store private to one worker."""
+        app = Flask(__name__)
+        app.config.update(RATELIMIT_ENABLED=True, SHARED_STORE_REQUIRED=True,
+                          SHARED_STORE_URL='memory://')
+        self.assertRaises(RuntimeError, ratelimit.init_app, app)
+        app.config['RATELIMIT_ENABLED'] = False
+        ratelimit.init_app(app)
+
+
+class TestRateLimit(BaseTestCase):
+    """Test limiting /auth/login and /auth/register."""
+
+    def setUp(self):
+        """Use small buckets."""
+        super().setUp()
+        self.saved = {key: value for key, value in self.app.config.items()
+                      if key.startswith('RATELIMIT_')}
+        self.app.config.update(
+            RATELIMIT_IP_RATE=0.01, RATELIMIT_IP_BURST=3,
+            RATELIMIT_ACCOUNT_RATE=0.01, RATELIMIT_ACCOUNT_BURST=2)
+        add_user('test', 'test@test.com', 'test')
+
+    def tearDown(self):
+        """Restore the configured limits."""
+        self.app.config.update(self.saved)
+        super().tearDown()
+
+    def login(self, email='test@test.com', **headers):
+        """Post a login with a wrong password."""
+        return self.client.post(
+            '/auth/login',
+            data=json.dumps({'email': email, 'password': 'wrong'}),
+            content_type='application/json',
+            headers=headers
+        )
+
+    def test_account_limit(self):
+        """Ensure an account is limited across client addresses."""
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            self.assertEqual(self.login(**{'X-Real-IP': ip}).status_code, 404)
+        response = self.login(**{'X-Real-IP': '10.0.0.3'})
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(data['status'], 'fail')
+        self.assertEqual(
+            data['message'], 'Too many requests. Please try again later.')
+        self.assertEqual(response.headers['Retry-After'], '100')
+
+    def test_successful_logins_not_charged(self):
+        """Ensure an account's own logins do not lock it out."""
+        for i in range(3):
+            response = self.client.post(
+                '/auth/login',
+                data=json.dumps({'email': 'test@test.com',
+                                 'password': 'test'}),
+                content_type='application/json',
+                headers={'X-Real-IP': '10.0.0.{0}'.format(i)}
+            )
+            self.assertEqual(response.status_code, 200)
+        self.login()
+        self.login()
+        self.assertEqual(self.login().status_code, 429)
+
+    def test_account_limit_ignores_case(self):
+        """Ensure changing the email case does not get a new bucket."""
+        self.login('test@test.com')
+        self.login('TEST@test.com')
+        self.assertEqual(self.login('Test@Test.com').status_code, 429)
+
+    def test_ip_limit(self):
+        """Ensure a client address is limited across accounts."""
+        for i in range(3):
+            response = self.login('user{0}@test.com'.format(i))
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.login('user9@test.com').status_code, 429)
+        response = self.login(
+            'user9@test.com', **{'X-Real-IP': '10.0.0.1'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_forwarded_for_uses_last_address(self):
+        """Ensure a spoofed X-Forwarded-For entry does not escape a limit."""
+        for i in range(3):
+            self.login('user{0}@test.com'.format(i), **{
+                'X-Forwarded-For': '1.1.1.{0}, 10.0.0.1'.format(i)})
+        response = self.login('user9@test.com', **{
+            'X-Forwarded-For': '1.1.1.9, 10.0.0.1'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_register_limit(self):
+        """Ensure registration shares the client address bucket."""
+        for i in range(3):
+            self.login('user{0}@test.com'.format(i))
+        response = self.client.post(
+            '/auth/register',
+            data=json.dumps({'username': 'new', 'email': 'new@test.com',
+                             'password': 'new'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 429)
+
+    def test_rejection_runs_no_queries(self):
+        """Ensure a rejected login does not touch the database."""
+        self.login()
+        self.login()
+        with self.assertMaxQueries(0):
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+
+    def test_disabled(self):
+        """Ensure RATELIMIT_ENABLED turns the limits off."""
+        self.app.config['RATELIMIT_ENABLED'] = False
+        for _ in range(5):
+            self.assertEqual(self.login().status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
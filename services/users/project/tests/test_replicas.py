@@ -0,0 +1,187 @@
+"""Tests for read replica routing."""
+# services/users/project/tests/test_replicas.py
+
+import json
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+from sqlalchemy import create_engine
+
+from project import db
+from project.api import replicas
+from project.api.cache import response_cache
+from project.api.models import User
+from project.database import ReplicaSet
+from project.tests.base import BaseTestCase
+from project.tests.utils import FakeTimer, add_user, get_token_header
+
+
+class TestReplicaSet(unittest.TestCase):
+    """Test choosing among replicas."""
+
+    def setUp(self):
+        """Create two replica engines."""
+        self.engines = [create_engine('sqlite://'), create_engine('sqlite://')]
+        self.timer = FakeTimer()
+        self.replicas = ReplicaSet(
+            ['a', 'b'], self.engines, retry_seconds=10, timer=self.timer)
+
+    def test_round_robin(self):
+        """Ensure replicas are used in turn."""
+        chosen = [self.replicas.choose() for _ in range(4)]
+        self.assertEqual(chosen, self.engines * 2)
+
+    def test_unhealthy_replica_skipped(self):
+        """Ensure a failed replica is skipped until its retry time."""
+        self.replicas.mark_down(self.engines[0])
+        self.assertEqual(
+            [self.replicas.choose() for _ in range(2)], [self.engines[1]] * 2)
+        self.timer.now = 10
+        self.assertIn(self.engines[0],
+                      [self.replicas.choose() for _ in range(2)])
+
+    def test_all_down(self):
+        """Ensure no replica is chosen when all are down."""
+        for engine in self.engines:
+            self.replicas.mark_down(engine)
+        self.assertIsNone(self.replicas.choose())
+        self.assertFalse(any(
+            replica['healthy'] for replica in self.replicas.stats()))
+
+    def test_connection_error_marks_down(self):
+        """Ensure a replica that cannot be reached is marked down."""
+        engine = create_engine('sqlite:////nonexistent/dir/replica.db')
+        replicas = ReplicaSet(['a'], [engine], timer=self.timer)
+        with self.assertRaises(Exception):
+            engine.execute('SELECT 1')
+        self.assertIsNone(replicas.choose())
+
+
+class TestReplicaRouting(BaseTestCase):
+    """Test routing reads to a replica, simulated by a second database."""
+
+    def setUp(self):
+        """Create the replica database."""
+        super().setUp()
+        handle, self.replica_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.app.config['DATABASE_REPLICA_URLS'] = (
+            'sqlite:///' + self.replica_path)
+        self.replica = db.get_replicas().engines[0]
+        db.Model.metadata.create_all(self.replica)
+        self.replica.execute(User.__table__.insert().values(
+            username='replicated', email='replicated@replica.org',
+            password='x', active=True, admin=False))
+
+    def tearDown(self):
+        """Remove the replica database."""
+        self.replica.dispose()
+        self.app.config['DATABASE_REPLICA_URLS'] = None
+        os.remove(self.replica_path)
+        super().tearDown()
+
+    def usernames(self):
+        """Return the usernames listed by GET /users."""
+        response = self.client.get('/users')
+        data = json.loads(response.data.decode())
+        return [user['username'] for user in data['data']['users']]
+
+    def test_reads_use_replica(self):
+        """Ensure GET /users and GET /users/<id> read the replica."""
+        self.assertEqual(self.usernames(), ['replicated'])
+        response = self.client.get('/users/1')
+        data = json.loads(response.data.decode())
+        self.assertEqual(data['data']['username'], 'replicated')
+
+    def test_stream_uses_replica(self):
+        """Ensure a streamed listing reads its rows from the replica."""
+        add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        response = self.client.get('/users?stream=1')
+        data = json.loads(response.data.decode())
+        self.assertEqual(
+            [user['username'] for user in data['data']['users']],
+            ['replicated'])
+
+    def test_writes_use_primary_and_pin(self):
+        """Ensure a client that registered reads its user from the primary."""
+        response = self.client.post(
+            '/auth/register',
+            data=json.dumps({
+                'username': 'michael',
+                'email': 'michael@mherman.org',
+                'password': '123456'
+            }),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('users_primary', response.headers['Set-Cookie'])
+        self.assertEqual(
+            User.query.filter_by(username='michael').count(), 1)
+        self.assertEqual(self.usernames(), ['michael'])
+
+    def test_status_pinned_by_user(self):
+        """Ensure /auth/status finds a new user without the pin cookie."""
+        response = self.client.post(
+            '/auth/register',
+            data=json.dumps({
+                'username': 'michael',
+                'email': 'michael@mherman.org',
+                'password': '123456'
+            }),
+            content_type='application/json'
+        )
+        token = json.loads(response.data.decode())['auth_token']
+        self.client.cookie_jar.clear()
+        response = self.client.get(
+            '/auth/status',
+            headers={'Authorization': 'Bearer {token}'.format(token=token)})
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['data']['username'], 'michael')
+        self.assertEqual(self.usernames(), ['replicated'])
+
+    def test_unhealthy_replica_falls_back(self):
+        """Ensure reads go to the primary when the replica is down."""
+        add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        db.get_replicas().mark_down(self.replica)
+        self.assertEqual(self.usernames(), ['michael'])
+        response = self.client.get(
+            '/users/pool', headers=get_token_header(self.client))
+        data = json.loads(response.data.decode())
+        self.assertFalse(data['data']['replicas'][0]['healthy'])
+
+    def test_failed_replica_read_retried_on_primary(self):
+        """Ensure a read that fails on the replica is rerun on the primary."""
+        add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        self.app.config['DATABASE_REPLICA_URLS'] = (
+            'sqlite:////nonexistent/dir/replica.db')
+        self.assertEqual(self.usernames(), ['michael'])
+        self.assertFalse(db.get_replicas().stats()[0]['healthy'])
+
+    def test_replica_responses_cached_briefly(self):
+        """Ensure responses read from a replica expire with the pin."""
+        backend = response_cache.backend
+        self.assertEqual(self.usernames(), ['replicated'])
+        _, expires = backend._entries[response_cache.key('users', '/users?')]
+        self.assertLessEqual(
+            expires - backend.timer(),
+            self.app.config['DATABASE_REPLICA_PIN_SECONDS'])
+
+
+class TestReplicaConfig(unittest.TestCase):
+    """Test the settings replicas depend on."""
+
+    def test_shared_store_required(self):
+        """Ensure replicas refuse a store private to one worker."""
+        app = Flask(__name__)
+        app.config['DATABASE_REPLICA_URLS'] = 'postgres://replica/users'
+        app.config['SHARED_STORE_URL'] = 'memory://'
+        self.assertRaises(RuntimeError, replicas.init_app, app)
+        app.config['SHARED_STORE_URL'] = 'redis://redis:6379/0'
+        replicas.init_app(app)
+
+
+if __name__ == '__main__':
+    unittest.main()
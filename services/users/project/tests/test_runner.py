@@ -0,0 +1,90 @@
+"""Tests for the transactional fixtures and the parallel test runner."""
+# services/users/project/tests/test_runner.py
+
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, inspect
+
+from project import db
+from project.api.models import User
+from project.tests import runner
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+
+class TestTransactionalFixtures(BaseTestCase):
+    """Test that tests can commit and roll back as the app does."""
+
+    def test_rollback_keeps_committed_rows(self):
+        """Ensure a rollback only undoes work since the last commit."""
+        add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        db.session.add(User('fletcher', 'fletcher@notreal.com', 'password'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(
+            [user.username for user in User.query.all()], ['michael'])
+
+    def test_ids_start_at_one(self):
+        """Ensure ids are not carried over from earlier tests."""
+        user = add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        self.assertEqual(user.id, 1)
+
+    def test_fresh_session(self):
+        """Ensure a removed session is replaced by one in the transaction."""
+        add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        db.session.remove()
+        add_user('fletcher', 'fletcher@notreal.com', 'greaterthaneight')
+        db.session.rollback()
+        self.assertEqual(User.query.count(), 2)
+
+
+class TestRunner(unittest.TestCase):
+    """Test splitting the suite across workers and their databases."""
+
+    def test_partition(self):
+        """Ensure modules are spread so the groups weigh about the same."""
+        weights = {'a': 8, 'b': 5, 'c': 4, 'd': 3, 'e': 1}
+        groups = runner.partition(list(weights), 2, weights.get)
+        self.assertEqual(sorted(map(sorted, groups)),
+                         [['a', 'd'], ['b', 'c', 'e']])
+        self.assertEqual(len(runner.partition(['a'], 4, weights.get)), 1)
+
+    def test_discover(self):
+        """Ensure every test module is found."""
+        modules = runner.discover()
+        self.assertIn('project.tests.test_runner', modules)
+        self.assertNotIn('project.tests.base', modules)
+
+    def test_worker_url(self):
+        """Ensure each worker gets its own database name."""
+        self.assertEqual(
+            runner.worker_url('postgres://user@db:5432/users_test', 2),
+            'postgres://user@db:5432/users_test_2')
+        self.assertEqual(
+            runner.worker_url('sqlite:////tmp/test.db', 3),
+            'sqlite:////tmp/test_3.db')
+        self.assertEqual(runner.worker_url('sqlite://', 3), 'sqlite://')
+
+    def test_clone_sqlite(self):
+        """Ensure a SQLite template is copied with its schema and dropped."""
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        template = 'sqlite:///' + path
+        clone = runner.worker_url(template, 1)
+        try:
+            runner.build_template(template)
+            self.assertTrue(runner.clone_database(template, clone))
+            engine = create_engine(clone)
+            self.assertIn('users', inspect(engine).get_table_names())
+            engine.dispose()
+        finally:
+            runner.drop_database(clone)
+            os.remove(path)
+        self.assertFalse(os.path.exists(clone[len('sqlite:///'):]))
+        self.assertFalse(runner.clone_database('sqlite://', 'sqlite://'))
+
+
+if __name__ == '__main__':
+    unittest.main()
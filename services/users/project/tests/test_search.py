@@ -0,0 +1,107 @@
+"""Tests for the user search endpoint."""
+# services/users/project/tests/test_search.py
+
+import json
+import unittest
+
+from project import db
+from project.api import queries
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+
+class TestUserSearch(BaseTestCase):
+    """Tests for GET /users/search."""
+
+    def setUp(self):
+        """Add users to search."""
+        super().setUp()
+        add_user('michael', 'michael@mherman.org', 'greaterthaneight')
+        add_user('fletcher', 'fletcher@notreal.com', 'greaterthaneight')
+        add_user('Mike_Ross', 'mross@pearson.com', 'greaterthaneight')
+        add_user('ross100', 'ross@100percent.com', 'greaterthaneight')
+
+    def search(self, query):
+        """Return the status code and data of a search."""
+        response = self.client.get('/users/search?' + query)
+        return response, json.loads(response.data.decode())
+
+    def usernames(self, data):
+        """Return the usernames in a search result."""
+        return [user['username'] for user in data['data']['users']]
+
+    def test_substring(self):
+        """Ensure substrings of usernames and emails match."""
+        response, data = self.search('q=ross')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.usernames(data), ['Mike_Ross', 'ross100'])
+        response, data = self.search('q=notreal')
+        self.assertEqual(self.usernames(data), ['fletcher'])
+
+    def test_case_insensitive(self):
+        """Ensure matching ignores case."""
+        response, data = self.search('q=MIKE')
+        self.assertEqual(self.usernames(data), ['Mike_Ross'])
+
+    def test_prefix(self):
+        """Ensure prefix matching only matches at the start."""
+        response, data = self.search('q=ross&match=prefix')
+        self.assertEqual(self.usernames(data), ['ross100'])
+
+    def test_wildcards_are_literal(self):
+        """Ensure LIKE wildcards in the term are matched literally."""
+        response, data = self.search('q=e_r')
+        self.assertEqual(self.usernames(data), ['Mike_Ross'])
+        response, data = self.search('q=100%25')
+        self.assertEqual(self.usernames(data), [])
+        response, data = self.search('q=%25')
+        self.assertEqual(self.usernames(data), [])
+
+    def test_paginated(self):
+        """Ensure results are paginated with a next link."""
+        response, data = self.search('q=e&limit=2')
+        self.assertEqual(self.usernames(data), ['michael', 'fletcher'])
+        self.assertIn('rel="next"', response.headers['Link'])
+        response = self.client.get(data['data']['next'])
+        data = json.loads(response.data.decode())
+        self.assertEqual(self.usernames(data), ['Mike_Ross', 'ross100'])
+        self.assertIsNone(data['data']['next'])
+
+    def test_limit_capped(self):
+        """Ensure the page size is capped."""
+        self.app.config['USERS_SEARCH_PAGE_SIZE_MAX'] = 1
+        try:
+            response, data = self.search('q=e&limit=50')
+        finally:
+            self.app.config['USERS_SEARCH_PAGE_SIZE_MAX'] = 100
+        self.assertEqual(len(data['data']['users']), 1)
+
+    def test_invalid_parameters(self):
+        """Ensure missing terms and bad parameters are rejected."""
+        for query in ('', 'q=', 'q=%20', 'q=a&match=fuzzy', 'q=a&limit=x'):
+            response, data = self.search(query)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('fail', data['status'])
+
+    def test_explain_uses_indexes(self):
+        """Ensure Postgres plans searches with the search indexes."""
+        if db.engine.dialect.name != 'postgresql':
+            self.skipTest('search indexes are Postgres only')
+        # Tiny tables would always be scanned sequentially
+        db.session.execute('SET LOCAL enable_seqscan = off')
+        for prefix in (True, False):
+            query = queries.search_query('ross', prefix=prefix)
+            compiled = query.compile(
+                dialect=db.engine.dialect,
+                compile_kwargs={'literal_binds': True})
+            plan = '\n'.join(row[0] for row in db.session.execute(
+                'EXPLAIN {0}'.format(compiled)))
+            self.assertNotIn('Seq Scan', plan)
+            suffix = 'lower' if prefix else 'trgm'
+            self.assertIn('ix_users_username_' + suffix, plan)
+            self.assertIn('ix_users_email_' + suffix, plan)
+        db.session.rollback()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""Tests for the bulk user serializers."""
+# services/users/project/tests/test_serializers.py
+
+import json
+import unittest
+
+from project.api import queries
+from project.api.serializers import dump_envelope, dump_user, dump_users
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+
+class TestSerializers(BaseTestCase):
+    """Test serializing Core user rows."""
+
+    def test_dump_users_matches_to_json(self):
+        """Ensure bulk output matches the ORM to_json output."""
+        users = [
+            add_user('ben', 'ben@ben.org', '123456'),
+            add_user('jim"bob', 'jim\\bob@bob.org', '123456'),
+            add_user('zoë', 'zoë@bob.org', '123456'),
+        ]
+        rows = queries.fetch_users()
+        self.assertEqual(
+            json.loads(dump_users(rows)), [user.to_json() for user in users])
+
+    def test_dump_users_empty(self):
+        """Ensure an empty listing is an empty JSON array."""
+        self.assertEqual(dump_users([]), '[]')
+
+    def test_dump_user_columns(self):
+        """Ensure only the requested columns are serialized."""
+        user = add_user('ben', 'ben@ben.org', '123456')
+        row = queries.fetch_user(user.id)
+        data = json.loads(dump_user(row, queries.SINGLE_USER_COLUMNS))
+        self.assertEqual(data, {
+            'id': user.id,
+            'username': 'ben',
+            'email': 'ben@ben.org',
+            'active': True
+        })
+
+    def test_dump_envelope(self):
+        """Ensure pre-serialized data is wrapped in the envelope."""
+        data = json.loads(dump_envelope('{"users": []}'))
+        self.assertEqual(data, {'status': 'success', 'data': {'users': []}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,30 +6,14 @@ import unittest
 
 from project import db
 from project.tests.base import BaseTestCase
-from project.tests.utils import add_user
+from project.tests.utils import add_user, get_token_header
+from project.api import queries
 from project.api.models import User
 
 
 class TestUserService(BaseTestCase):
     """Tests for the Users Service."""
 
-    def get_token_header(self, admin=True):
-        """Add user and login to get a token."""
-        user = add_user('admin', 'admin@admin.org', '123456')
-        if admin:
-            user.admin = True
-            db.session.commit()
-        resp_login = self.client.post(
-            '/auth/login',
-            data=json.dumps({
-                'email': 'admin@admin.org',
-                'password': '123456'
-            }),
-            content_type='application/json'
-        )
-        token = json.loads(resp_login.data.decode())['auth_token']
-        return {'Authorization': 'Bearer {token}'.format(token=token)}
-
     def test_users(self):
         """Ensure the /ping route behaves correctly."""
         response = self.client.get('/users/ping')
@@ -49,7 +33,7 @@ class TestUserService(BaseTestCase):
                     'password': '123456'
                 }),
                 content_type='application/json',
-                headers=self.get_token_header()
+                headers=get_token_header(self.client)
             )
             data = json.loads(response.data.decode())
             self.assertEqual(response.status_code, 201)
@@ -63,7 +47,7 @@ class TestUserService(BaseTestCase):
                 '/users',
                 data=json.dumps({}),
                 content_type='application/json',
-                headers=self.get_token_header()
+                headers=get_token_header(self.client)
             )
             data = json.loads(response.data.decode())
             self.assertEqual(response.status_code, 400)
@@ -77,7 +61,7 @@ class TestUserService(BaseTestCase):
                 '/users',
                 data=json.dumps({'email': 'ben@ben.org'}),
                 content_type='application/json',
-                headers=self.get_token_header()
+                headers=get_token_header(self.client)
             )
             data = json.loads(response.data.decode())
             self.assertEqual(response.status_code, 400)
@@ -86,7 +70,7 @@ class TestUserService(BaseTestCase):
 
     def test_add_user_duplicate_email(self):
         """Ensure error is thrown if the email already exists."""
-        headers = self.get_token_header()
+        headers = get_token_header(self.client)
         with self.client:
             response = self.client.post(
                 '/users',
@@ -114,6 +98,27 @@ class TestUserService(BaseTestCase):
                 'Sorry. That email already exists.', data['message'])
             self.assertIn('fail', data['status'])
 
+    def test_add_user_duplicate_username(self):
+        """Ensure the conflicting column is reported for a username."""
+        add_user('ben', 'ben@ben.org', '123456')
+        with self.client:
+            response = self.client.post(
+                '/users',
+                data=json.dumps({
+                    'username': 'ben',
+                    'email': 'ben@ben2.org',
+                    'password': '123456'
+                }),
+                content_type='application/json',
+                headers=get_token_header(self.client)
+            )
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(
+                'Sorry. That username already exists.', data['message'])
+            self.assertEqual(data['field'], 'username')
+            self.assertIn('fail', data['status'])
+
     def test_single_user(self):
         """Ensure get single user behaves correctly."""
         user = add_user('ben', 'ben@ben.org', '123456')
@@ -160,6 +165,118 @@ class TestUserService(BaseTestCase):
             self.assertFalse(data['data']['users'][1]['admin'])
             self.assertIn('success', data['status'])
 
+    def test_all_users_paginated(self):
+        """Ensure users can be fetched one keyset page at a time."""
+        add_user('ben', 'ben@ben.org', '123456')
+        add_user('jimbob', 'jim@bob.org.uk', '123456')
+        add_user('sally', 'sally@sally.org', '123456')
+        with self.client:
+            response = self.client.get('/users?limit=2')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(data['data']['users']), 2)
+            self.assertIn('ben', data['data']['users'][0]['username'])
+            self.assertIn('jimbob', data['data']['users'][1]['username'])
+            self.assertIn('rel="next"', response.headers['Link'])
+            response = self.client.get(data['data']['next'])
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(data['data']['users']), 1)
+            self.assertIn('sally', data['data']['users'][0]['username'])
+            self.assertIsNone(data['data']['next'])
+            self.assertNotIn('Link', response.headers)
+
+    def test_all_users_invalid_pagination(self):
+        """Ensure error is thrown for invalid pagination parameters."""
+        with self.client:
+            for query in ('limit=blah', 'limit=0', 'after=-1'):
+                response = self.client.get('/users?{}'.format(query))
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(
+                    'Invalid pagination parameters.', data['message'])
+                self.assertIn('fail', data['status'])
+
+    def test_all_users_streamed(self):
+        """Ensure a streamed listing returns the same users."""
+        add_user('ben', 'ben@ben.org', '123456')
+        add_user('jimbob', 'jim@bob.org.uk', '123456')
+        response = self.client.get('/users?stream=true')
+        self.assertNotIn('Content-Length', response.headers)
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data['data']['users']), 2)
+        self.assertIn('ben', data['data']['users'][0]['username'])
+        self.assertIn('jimbob', data['data']['users'][1]['username'])
+        self.assertIn('success', data['status'])
+
+    def test_all_users_stream_false(self):
+        """Ensure stream=false and stream=0 return a buffered listing."""
+        for value in ('false', '0', 'no'):
+            response = self.client.get('/users?stream=' + value)
+            self.assertIn('Content-Length', response.headers, value)
+            self.assertEqual(response.status_code, 200)
+
+    def test_all_users_not_modified(self):
+        """Ensure an unchanged listing is revalidated with a 304."""
+        add_user('ben', 'ben@ben.org', '123456')
+        with self.client:
+            response = self.client.get('/users')
+            etag = response.headers['ETag']
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers['Last-Modified'])
+            response = self.client.get(
+                '/users', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+            self.assertEqual(response.headers['ETag'], etag)
+            add_user('jimbob', 'jim@bob.org.uk', '123456')
+            response = self.client.get(
+                '/users', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_users_version(self):
+        """Ensure every write to users bumps the collection version."""
+        version, _ = queries.users_version()
+        user = add_user('ben', 'ben@ben.org', '123456')
+        self.assertEqual(queries.users_version()[0], version + 1)
+        db.session.execute(User.__table__.update().values(active=False))
+        self.assertEqual(queries.users_version()[0], version + 2)
+        db.session.delete(user)
+        db.session.commit()
+        self.assertEqual(queries.users_version()[0], version + 3)
+
+    def test_all_users_etag_per_page(self):
+        """Ensure every keyset page has its own ETag."""
+        add_user('ben', 'ben@ben.org', '123456')
+        add_user('jimbob', 'jim@bob.org.uk', '123456')
+        with self.client:
+            first = self.client.get('/users?limit=1')
+            second = self.client.get('/users?limit=1&after=1')
+            self.assertNotEqual(
+                first.headers['ETag'], second.headers['ETag'])
+
+    def test_single_user_not_modified(self):
+        """Ensure a single user is revalidated with ETag and date."""
+        user = add_user('ben', 'ben@ben.org', '123456')
+        url = '/users/{}'.format(user.id)
+        with self.client:
+            response = self.client.get(url)
+            etag = response.headers['ETag']
+            last_modified = response.headers['Last-Modified']
+            response = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(
+                url, headers={'If-Modified-Since': last_modified})
+            self.assertEqual(response.status_code, 304)
+            user.username = 'benjamin'
+            db.session.commit()
+            response = self.client.get(url, headers={'If-None-Match': etag})
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(data['data']['username'], 'benjamin')
+
     def test_main_no_users(self):
         """Ensure the main route behaves correctly when no users have been
         added to the database."""
@@ -194,6 +311,18 @@ class TestUserService(BaseTestCase):
             self.assertNotIn(b'<p>No users!</p>', response.data)
             self.assertIn(b'ben', response.data)
 
+    def test_main_add_duplicate_user(self):
+        """Ensure a duplicate user posted to the main page is ignored."""
+        add_user('ben', 'ben@ben.org', '123456')
+        with self.client:
+            response = self.client.post(
+                '/',
+                data=dict(username='ben', email='ben@ben.org', password='1'),
+                follow_redirects=True
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data.count(b'<li> ben </li>'), 1)
+
     def test_add_user_invalid_json_keys_no_password(self):
         """
         Ensure error is thrown if the JSON object does
@@ -207,7 +336,7 @@ class TestUserService(BaseTestCase):
                     email='ben@test.org'
                 )),
                 content_type='application/json',
-                headers=self.get_token_header()
+                headers=get_token_header(self.client)
             )
             data = json.loads(response.data.decode())
             self.assertEqual(response.status_code, 400)
@@ -216,7 +345,7 @@ class TestUserService(BaseTestCase):
 
     def test_add_user_inactive(self):
         """Test an inactive user adding a user."""
-        headers = self.get_token_header()
+        headers = get_token_header(self.client)
         user = User.query.filter_by(email='admin@admin.org').first()
         user.active = False
         db.session.commit()
@@ -247,7 +376,7 @@ class TestUserService(BaseTestCase):
                     'password': '123456'
                 }),
                 content_type='application/json',
-                headers=self.get_token_header(admin=False)
+                headers=get_token_header(self.client, admin=False)
             )
         data = json.loads(response.data.decode())
         self.assertTrue(data['status'] == 'fail')
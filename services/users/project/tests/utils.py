@@ -1,13 +1,45 @@
 """Utilities for testing."""
 # services/users/project/tests/utils.py
 
+import json
+
 from project import db
 from project.api.models import User
 
 
+class FakeTimer:
+    """Clock that only moves when told to."""
+
+    def __init__(self, now=0):
+        """Initialize object."""
+        self.now = now
+
+    def __call__(self):
+        """Return the current fake time."""
+        return self.now
+
+
 def add_user(username, email, password):
     """Add a user."""
     user = User(username=username, email=email, password=password)
     db.session.add(user)
     db.session.commit()
     return user
+
+
+def get_token_header(client, admin=True):
+    """Add user and login to get a token."""
+    user = add_user('admin', 'admin@admin.org', '123456')
+    if admin:
+        user.admin = True
+        db.session.commit()
+    resp_login = client.post(
+        '/auth/login',
+        data=json.dumps({
+            'email': 'admin@admin.org',
+            'password': '123456'
+        }),
+        content_type='application/json'
+    )
+    token = json.loads(resp_login.data.decode())['auth_token']
+    return {'Authorization': 'Bearer {token}'.format(token=token)}
@@ -0,0 +1,6 @@
+"""WSGI entry point for production servers."""
+# services/users/wsgi.py
+
+from project import create_app
+
+app = create_app()
@@ -22,7 +22,7 @@ inspect() {
     fi
 }
 
-docker-compose -f $file run users python manage.py test
+docker-compose -f $file run users python manage.py test --workers 4
 inspect $? users
 docker-compose -f $file run users flake8 project
 inspect $? users-lint